@@ -1,109 +1,514 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from flask_cors import CORS
+import hmac
+import json
 import os
 import sys
+from itertools import islice
 
 # Add current directory to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from model_service import predict_disease
-from firebase_service import FirebaseService
+from model_service import (PRIMARY_SLOT, batch_json, inference_stats, model_readiness, predict_batch,
+                           predict_disease, prediction_cache, prediction_json, registry, resolve_model_file,
+                           validate_slot)
+from firebase_service import FirebaseService, firebase_session, upstream_gate, validate_device
+from instrumentation import begin_request, end_request, register_collector, render_metrics, stage
+from sensor_ingest import INGEST_ENABLED, device_worker, ingest_worker, predict_payload
+from sensor_store import STORE_ENABLED, EntryEncoder, classify, get_store
+from sensor_rollups import downsample
+from sleep_summary import DEFAULT_USER, summary_engine
+from sleep_pipeline import EPOCH_SECONDS, WINDOW_SECONDS, analyze_night, arrays_from_entries
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+@app.before_request
+def _start_request_timer():
+    rule = request.url_rule
+    g.request_trace = begin_request(request.method, rule.rule if rule is not None else "unmatched")
+
+@app.after_request
+def _record_request_time(response):
+    # Streamed bodies are still being sent: this is time to the response headers
+    end_request(g.pop('request_trace', None), response.status_code)
+    return response
+
+# Token the model admin routes (reload, split, unload) require in X-Admin-Token; unset disables them
+MODEL_ADMIN_TOKEN = os.environ.get("MODEL_ADMIN_TOKEN")
+
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({"status": "healthy", "service": "sleep-monitoring-backend"})
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """503 until the model has loaded, with load progress (see MODEL_PRELOAD)"""
+    status = model_readiness()
+    return jsonify(status), 200 if status["ready"] else 503
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request, stage, model, cache and Firebase metrics in Prometheus text format"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/predict', methods=['POST'])
 def predict():
     try:
-        data = request.json
+        with stage("parse"):
+            data = request.json
         if not data:
             return jsonify({"error": "No data provided"}), 400
             
-        result = predict_disease(data)
-        return jsonify(result)
+        with stage("predict"):
+            result = predict_disease(data)
+        with stage("serialize"):
+            return Response(prediction_json(result), mimetype='application/json')
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch_route():
+    """Score many readings in one model call (JSON array or columnar arrays)"""
+    try:
+        data = request.json
+        if not data:
+            return jsonify({"error": "No data provided"}), 400
+
+        # Allow { "readings": [...] } as well as a bare array / columnar object
+        if isinstance(data, dict) and "readings" in data:
+            data = data["readings"]
+
+        with stage("predict"):
+            try:
+                result = predict_batch(data)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        with stage("serialize"):
+            return Response(batch_json(result), mimetype='application/json')
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/model/cache', methods=['GET'])
+def prediction_cache_stats():
+    """Prediction cache hit/miss/eviction counters"""
+    return jsonify(prediction_cache.stats())
+
+@app.route('/api/model/inference', methods=['GET'])
+def inference_backend_stats():
+    """Inference backend in use, with worker-pool batch counters"""
+    return jsonify(inference_stats())
+
+@app.route('/api/model/registry', methods=['GET'])
+def model_registry_stats():
+    """Model slots with per-model latency and class counters, traffic split and last load"""
+    return jsonify(registry.stats())
+
+def _admin_denied():
+    """Error response unless the request carries MODEL_ADMIN_TOKEN, else None"""
+    if not MODEL_ADMIN_TOKEN:
+        return jsonify({"success": False, "error": "Model admin routes are disabled (set MODEL_ADMIN_TOKEN)"}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), MODEL_ADMIN_TOKEN):
+        return jsonify({"success": False, "error": "Invalid admin token"}), 403
+    return None
+
+@app.route('/api/model/reload', methods=['POST'])
+def reload_model():
+    """
+    Load a model file from the model directory into a slot in the background
+    Body: { "slot": "primary", "file": "model.forest" } (file defaults to the configured model)
+    """
+    denied = _admin_denied()
+    if denied:
+        return denied
+    try:
+        data = request.get_json(silent=True) or {}
+        slot = validate_slot(data.get('slot', PRIMARY_SLOT))
+        path = resolve_model_file(data['file']) if data.get('file') else None
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    registry.load_async(slot, path)
+    return jsonify({"success": True, "slot": slot, "file": data.get('file'), "status": "/api/model/registry"}), 202
+
+@app.route('/api/model/split', methods=['POST'])
+def split_model_traffic():
+    """Route a percentage of predictions to a slot. Body: { "slot": "candidate", "percent": 10 }"""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    try:
+        data = request.get_json(silent=True) or {}
+        registry.set_split(validate_slot(data.get('slot')), data.get('percent', 0))
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, "split_percent": registry.split()})
+
+@app.route('/api/model/unload', methods=['POST'])
+def unload_model():
+    """Remove a non-primary slot. Body: { "slot": "candidate" }"""
+    denied = _admin_denied()
+    if denied:
+        return denied
+    try:
+        data = request.get_json(silent=True) or {}
+        registry.unload(validate_slot(data.get('slot')))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True})
+
 # Firebase Sensor Data Endpoints
 
+def _firebase_failure(result, status=404):
+    """Response for a failed Firebase call; 503 when the upstream budget was exhausted"""
+    if result.get('overloaded'):
+        return jsonify(result), 503, {"Retry-After": "1"}
+    return jsonify(result), status
+
+def _freshness(result, extra=None):
+    """Extra response fields, plus the age of a stale result served while Firebase was over budget"""
+    if not result.get('stale'):
+        return extra
+    return dict(extra or {}, stale=True, stale_age=result['stale_age'])
+
 @app.route('/api/sensor/latest', methods=['GET'])
 def get_latest_sensor():
-    """Get the latest sensor reading from Firebase and run prediction"""
+    """Get the latest sensor reading and its prediction"""
     try:
-        # 1. Fetch data from Firebase
+        # Serve from the background ingestion buffer when it is up to date
+        if INGEST_ENABLED:
+            ingest_worker.start()
+            with stage("ring_buffer"):
+                buffered = ingest_worker.latest_response()
+            if buffered is not None:
+                with stage("serialize"):
+                    return jsonify(buffered), 200
+
+        # Fall back to fetching from Firebase directly
         result = FirebaseService.get_latest_sensor_data()
         
         if result.get('success'):
-            data = result.get('data', {})
-            
-            # 2. Extract features for prediction
-            # Mapping: bvp -> Heart Rate (bpm), acc_x/y/z -> Gyro x/y/z, temp -> constant
-            try:
-                bpm = float(data.get('MAX30102', {}).get('bpm', 0))
-                gyro = data.get('MPU6050', {}).get('gyro', {})
-                acc_x = float(gyro.get('x', 0))
-                acc_y = float(gyro.get('y', 0))
-                acc_z = float(gyro.get('z', 0))
-                
-                # Extract temperature from DHT sensor (default to 36.5 if missing)
-                temp = float(data.get('DHT', {}).get('temperature', 36.5))
-                
-                prediction_input = {
-                    "bvp": bpm,
-                    "acc_x": acc_x,
-                    "acc_y": acc_y,
-                    "acc_z": acc_z,
-                    "temp": temp
-                }
-                
-                # 3. Predict
-                prediction_result = predict_disease(prediction_input)
-                
-                # 4. Attach prediction to result
-                result['prediction'] = prediction_result
-                
-            except Exception as e:
-                print(f"Prediction pre-processing error: {e}")
-                result['prediction'] = {"error": "Failed to process data for prediction"}
-            
-            return jsonify(result), 200
+            result['prediction'] = predict_payload(result.get('data', {}))
+            with stage("serialize"):
+                return jsonify(result), 200
         else:
-            return jsonify(result), 404
+            return _firebase_failure(result)
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/api/sensor/stream', methods=['GET'])
+def stream_sensor():
+    """Push each new reading and its prediction as Server-Sent Events"""
+    if not INGEST_ENABLED:
+        return jsonify({"success": False, "message": "Streaming requires SENSOR_INGEST to be enabled"}), 503
+
+    ingest_worker.start()
+    stream = ingest_worker.broadcaster.subscribe(request.headers.get('Last-Event-ID'))
+    if stream is None:
+        return jsonify({"success": False, "message": "Too many stream subscribers"}), 503
+
+    return Response(stream, mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+# Largest page a client may request with ?page_size=
+MAX_PAGE_SIZE = 1000
+# Largest ?max_points= a downsampled range may ask for
+MAX_POINTS = 10000
+
+def _paging_args():
+    """Read ?after=<key>&page_size=<n>&format=json|ndjson"""
+    after = request.args.get('after')
+    page_size = request.args.get('page_size', type=int)
+    if page_size is not None:
+        page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    fmt = request.args.get('format', default='json').lower()
+    return after, page_size, fmt
+
+def _firebase_rows(result):
+    """(key, payload_json) rows from a FirebaseService list response"""
+    for entry in result.get('data', []):
+        entry = dict(entry)
+        key = entry.pop('timestamp')
+        yield key, json.dumps(entry, separators=(",", ":"))
+
+def _page_rows(result, start_key, exclusive, page_size, end_time=None):
+    """Cursor page rows from a FirebaseService.get_sensor_entries result"""
+    data = result['data']
+    if exclusive:
+        data.pop(start_key, None)
+    keys = [k for k in sorted(data) if end_time is None or k <= end_time][:page_size]
+    return ((k, json.dumps(data[k], separators=(",", ":"))) for k in keys)
+
+def _firebase_page(start_key, exclusive, page_size, end_time=None, device=None):
+    """One cursor page straight from Firebase (used when the local store is unavailable)"""
+    result = FirebaseService.get_sensor_entries(start_key, page_size + 1, device)
+    if not result.get('success'):
+        return result, None
+    return result, _page_rows(result, start_key, exclusive, page_size, end_time)
+
+def _stream_entries(rows, fmt, page_size, empty_message, extra=None):
+    """
+    Stream (key, payload_json) rows as a JSON document or NDJSON, one row
+    at a time, so memory stays flat regardless of how many rows match
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return jsonify({"success": False, "message": empty_message}), 404
+
+    encoder = EntryEncoder(fmt, page_size, extra)
+
+    def generate():
+        yield encoder.row(*first)
+        for key, payload in rows:
+            yield encoder.row(key, payload)
+        tail = encoder.close()
+        if tail:
+            yield tail
+
+    return Response(stream_with_context(generate()), mimetype=encoder.mimetype)
+
+def _local_store():
+    """The local history store, or None when it is disabled or unusable"""
+    if not STORE_ENABLED:
+        return None
+    store = get_store()
+    store.sync_if_stale()
+    # Nothing stored locally and Firebase unreachable: report the upstream error instead
+    if store.last_sync_error and store.is_empty():
+        return None
+    return store
+
 @app.route('/api/sensor/history', methods=['GET'])
 def get_sensor_history():
-    """Get historical sensor data from Firebase"""
+    """Get historical sensor data (cursor-paginated, optionally streamed as NDJSON)"""
     try:
         limit = request.args.get('limit', default=100, type=int)
-        result = FirebaseService.get_sensor_history(limit=limit)
-        if result.get('success'):
-            return jsonify(result), 200
-        else:
-            return jsonify(result), 404
+        after, page_size, fmt = _paging_args()
+        empty_message = "No historical data available"
+
+        store = _local_store()
+        if store is not None:
+            rows = store.iter_history(limit=limit, after=after, page_size=page_size)
+            return _stream_entries(rows, fmt, page_size, empty_message)
+
+        if after is None:
+            result = FirebaseService.get_sensor_history(limit=limit)
+            if not result.get('success'):
+                return _firebase_failure(result)
+            rows = islice(_firebase_rows(result), page_size)
+            return _stream_entries(rows, fmt, page_size, empty_message, _freshness(result))
+
+        result, rows = _firebase_page(after, True, min(page_size or MAX_PAGE_SIZE, limit))
+        if rows is None:
+            return _firebase_failure(result)
+        return _stream_entries(rows, fmt, page_size, empty_message, _freshness(result))
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route('/api/sensor/range', methods=['GET'])
 def get_sensor_range():
-    """Get sensor data within a specific time range"""
+    """Get sensor data within a specific time range (cursor-paginated, optionally streamed as NDJSON)"""
     try:
         start_time = request.args.get('start')
         end_time = request.args.get('end')
-        
-        result = FirebaseService.get_sensor_data_by_range(start_time, end_time)
-        if result.get('success'):
+        after, page_size, fmt = _paging_args()
+        empty_message = "No data available in the specified range"
+        extra = {"range": {"start": start_time, "end": end_time}}
+
+        max_points = request.args.get('max_points', type=int)
+        if max_points is not None and after is None:
+            return _downsampled_range(start_time, end_time, max(1, min(max_points, MAX_POINTS)), fmt, extra)
+
+        store = _local_store()
+        if store is not None:
+            rows = store.iter_range(start_time, end_time, after=after, page_size=page_size)
+            return _stream_entries(rows, fmt, page_size, empty_message, extra)
+
+        if after is None and page_size is None:
+            result = FirebaseService.get_sensor_data_by_range(start_time, end_time)
+            if not result.get('success'):
+                return _firebase_failure(result)
+            return _stream_entries(_firebase_rows(result), fmt, None, empty_message, _freshness(result, extra))
+
+        if after is not None and (not start_time or after >= start_time):
+            result, rows = _firebase_page(after, True, page_size or MAX_PAGE_SIZE, end_time)
+        else:
+            result, rows = _firebase_page(start_time, False, page_size or MAX_PAGE_SIZE, end_time)
+        if rows is None:
+            return _firebase_failure(result)
+        return _stream_entries(rows, fmt, page_size, empty_message, _freshness(result, extra))
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/devices', methods=['GET'])
+def list_devices():
+    """Devices under FIREBASE_DEVICES_PATH, with buffer and poll status while ingestion runs"""
+    try:
+        if INGEST_ENABLED:
+            device_worker.start()
+            if device_worker.last_discovery is not None:
+                feeds = list(device_worker.feeds.values())
+                return jsonify({"success": True, "count": len(feeds), "devices": [feed.status() for feed in feeds]}), 200
+
+        result = FirebaseService.list_devices()
+        if not result.get('success'):
+            return _firebase_failure(result)
+        result['devices'] = [{"device": device} for device in result['devices']]
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+def _device_or_error(device):
+    """None for a valid device id, else a 400 response"""
+    try:
+        validate_device(device)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return None
+
+@app.route('/api/devices/<device>/latest', methods=['GET'])
+def get_device_latest(device):
+    """Latest reading of one device and its prediction"""
+    invalid = _device_or_error(device)
+    if invalid is not None:
+        return invalid
+    try:
+        if INGEST_ENABLED:
+            device_worker.start()
+            with stage("ring_buffer"):
+                buffered = device_worker.latest_response(device)
+            if buffered is not None:
+                with stage("serialize"):
+                    return jsonify(buffered), 200
+
+        result = FirebaseService.get_latest_sensor_data(device)
+        if not result.get('success'):
+            return _firebase_failure(result)
+        result['device'] = device
+        result['prediction'] = predict_payload(result.get('data', {}))
+        with stage("serialize"):
             return jsonify(result), 200
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/devices/<device>/history', methods=['GET'])
+def get_device_history(device):
+    """Historical readings of one device (cursor-paginated, optionally streamed as NDJSON)"""
+    invalid = _device_or_error(device)
+    if invalid is not None:
+        return invalid
+    try:
+        limit = request.args.get('limit', default=100, type=int)
+        after, page_size, fmt = _paging_args()
+        empty_message = "No historical data available"
+        extra = {"device": device}
+
+        if after is None:
+            result = FirebaseService.get_sensor_history(limit=limit, device=device)
+            if not result.get('success'):
+                return _firebase_failure(result)
+            rows = islice(_firebase_rows(result), page_size)
+            return _stream_entries(rows, fmt, page_size, empty_message, _freshness(result, extra))
+
+        result, rows = _firebase_page(after, True, min(page_size or MAX_PAGE_SIZE, limit), device=device)
+        if rows is None:
+            return _firebase_failure(result)
+        return _stream_entries(rows, fmt, page_size, empty_message, _freshness(result, extra))
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+def _raw_extra(extra, stride):
+    """Response fields for raw readings served by _downsampled_range (every stride-th one)"""
+    return dict(extra, resolution="raw", stride=stride) if stride > 1 else dict(extra, resolution="raw")
+
+def _downsampled_range(start_time, end_time, max_points, fmt, extra):
+    """
+    A range as at most max_points points: raw readings when few enough,
+    otherwise per-bucket min/max/mean and dominant condition from the
+    finest rollup tier that fits. Readings whose keys are not timestamps
+    cannot be bucketed by time, so every stride-th one is served instead.
+    """
+    empty_message = "No data available in the specified range"
+    store = _local_store()
+    if store is not None:
+        with stage("store_query"):
+            tier, seconds, buckets = store.downsampled_range(start_time, end_time, max_points)
+        if tier is None:
+            rows = islice(store.iter_range(start_time, end_time), 0, None, seconds)
+            return _stream_entries(rows, fmt, None, empty_message, _raw_extra(extra, seconds))
+    else:
+        result = FirebaseService.get_sensor_data_by_range(start_time, end_time)
+        if not result.get('success'):
+            return _firebase_failure(result)
+        if len(result['data']) <= max_points:
+            return _stream_entries(_firebase_rows(result), fmt, None, empty_message,
+                                   _freshness(result, _raw_extra(extra, 1)))
+        with stage("features"):
+            ts, values = arrays_from_entries(result['data'])
+        with stage("rollup"):
+            tier, seconds, buckets = downsample(ts, values, classify(values), max_points)
+        if not buckets:
+            stride = -(-len(result['data']) // max_points)
+            return _stream_entries(islice(_firebase_rows(result), 0, None, stride), fmt, None, empty_message,
+                                   _freshness(result, _raw_extra(extra, stride)))
+
+    if not buckets:
+        return jsonify({"success": False, "message": empty_message}), 404
+    with stage("serialize"):
+        points = [bucket.to_point() for bucket in buckets]
+        if fmt == "ndjson":
+            body = "".join(json.dumps(point, separators=(",", ":")) + "\n" for point in points)
+            return Response(body, mimetype="application/x-ndjson")
+        body = {"success": True, "resolution": tier, "bucket_seconds": seconds, "count": len(points), "data": points}
+        body.update(extra)
+        return jsonify(body), 200
+
+@app.route('/api/sleep/analysis', methods=['GET'])
+def sleep_analysis():
+    """Epoch-by-epoch hypnogram and summary for a night of sensor data"""
+    try:
+        start_time = request.args.get('start')
+        end_time = request.args.get('end')
+        epoch = max(1, request.args.get('epoch', default=EPOCH_SECONDS, type=int))
+        window = max(epoch, request.args.get('window', default=WINDOW_SECONDS, type=int))
+
+        store = _local_store()
+        if store is not None:
+            with stage("store_query"):
+                ts, values = store.range_arrays(start_time, end_time)
         else:
+            result = FirebaseService.get_sensor_data_by_range(start_time, end_time)
+            if not result.get('success'):
+                return _firebase_failure(result)
+            with stage("features"):
+                ts, values = arrays_from_entries(result['data'])
+
+        with stage("analyze"):
+            result = analyze_night(ts, values, epoch_seconds=epoch, window_seconds=window)
+        if not result.get('success'):
             return jsonify(result), 404
+        result["range"] = {"start": start_time, "end": end_time}
+        return jsonify(result), 200
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/api/sleep/summary', methods=['GET'])
+def sleep_summary():
+    """Running summary of a night, maintained as readings are ingested"""
+    user = request.args.get('user', default=DEFAULT_USER)
+    night = request.args.get('night')
+    summary = summary_engine.summary(user, night)
+    if summary is None:
+        return jsonify({
+            "success": False,
+            "message": "No summary available for this night",
+            "nights": summary_engine.nights(user)
+        }), 404
+    return jsonify({"success": True, "summary": summary}), 200
+
 @app.route('/api/firebase/test', methods=['GET'])
 def test_firebase_connection():
     """Test Firebase connection"""
@@ -112,10 +517,17 @@ def test_firebase_connection():
         if result.get('success'):
             return jsonify(result), 200
         else:
-            return jsonify(result), 500
+            return _firebase_failure(result, 500)
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/api/firebase/stats', methods=['GET'])
+def firebase_stats():
+    """Connection reuse, latency and upstream budget statistics for Firebase calls"""
+    stats = firebase_session.stats()
+    stats["upstream"] = upstream_gate.stats()
+    return jsonify(stats)
+
 @app.route('/api/diet-recommendation', methods=['POST'])
 def diet_recommendation():
     try:
@@ -124,7 +536,7 @@ def diet_recommendation():
         disorder = data.get('disorder', 'Unknown')
         
         # Look up diet from matrix
-        from diet_matrix import DIET_MATRIX, SLEEP_STATE_MAP
+        from diet_matrix import DIET_MATRIX, DIET_RESPONSE_FRAGMENTS, SLEEP_STATE_MAP
         
         # Normalize inputs
         dosha = dosha.capitalize() if dosha else "Vata"
@@ -135,20 +547,77 @@ def diet_recommendation():
         # Default to 0 (Normal) if unknown
         sleep_state_index = SLEEP_STATE_MAP.get(disorder, 0)
         
-        # Retrieve recommendation
-        recommendation = DIET_MATRIX[dosha].get(sleep_state_index, DIET_MATRIX["Vata"][0])
+        # Retrieve the pre-serialized food lists and splice in the per-request text
+        foods = DIET_RESPONSE_FRAGMENTS.get((dosha, sleep_state_index), DIET_RESPONSE_FRAGMENTS[("Vata", 0)])
+        condition = json.dumps(f"{disorder} ({dosha})")
+        text = json.dumps(f"Based on your {dosha} Dosha and {disorder} pattern, we recommend these specific dietary adjustments.")
+        body = b'{"condition":' + condition.encode() + b',' + foods + b',"recommendation_text":' + text.encode() + b'}'
         
-        return jsonify({
-            "condition": f"{disorder} ({dosha})",
-            "foods_to_eat": recommendation["eat"],
-            "foods_to_avoid": recommendation["avoid"],
-            "recommendation_text": f"Based on your {dosha} Dosha and {disorder} pattern, we recommend these specific dietary adjustments."
-        })
+        return Response(body, mimetype='application/json')
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def _collect_service_metrics(out):
+    """Expose the counters the service modules already keep"""
+    for label, histogram in list(firebase_session.latency.items()):
+        out.histogram("firebase_request_duration_seconds", "Firebase REST call latency including retries",
+                      histogram, {"client": "sync", "call": label})
+    out.counter("firebase_errors_total", "Firebase calls that raised", firebase_session.errors.value, {"client": "sync"})
+    upstream = upstream_gate.stats()
+    out.gauge("firebase_in_flight", "Firebase requests in progress", upstream["in_flight"])
+    out.counter("firebase_admitted_total", "Firebase requests admitted under the in-flight budget", upstream["admitted"])
+    out.counter("firebase_coalesced_total", "Calls that shared an identical in-flight request", upstream["coalesced"])
+    out.counter("firebase_shed_total", "Calls refused over the in-flight budget with no stale result",
+                upstream["shed"])
+    out.counter("firebase_stale_served_total", "Calls over the in-flight budget answered with a stale result",
+                upstream["stale_served"])
+
+    cache = prediction_cache.stats()
+    for name in ("hits", "misses", "evictions", "expirations"):
+        out.counter(f"prediction_cache_{name}_total", f"Prediction cache {name}", cache[name])
+    out.gauge("prediction_cache_entries", "Entries in the prediction cache", cache["size"])
+
+    split = registry.split()
+    for slot, version in registry.versions():
+        labels = {"slot": slot, "model": version.id}
+        out.gauge("model_traffic_percent", "Share of predictions routed to the slot",
+                  split.get(slot, 0.0) if slot != PRIMARY_SLOT else 100.0 - sum(split.values()), labels)
+        out.gauge("model_in_flight", "Requests holding the model", version.in_flight, labels)
+        out.counter("model_requests_total", "Requests routed to the model", version.requests.value, labels)
+        out.counter("model_rows_total", "Rows evaluated by the model", version.rows.value, labels)
+        out.counter("model_errors_total", "Model evaluations that raised", version.errors.value, labels)
+        out.histogram("model_inference_duration_seconds", "Model evaluation time per call", version.latency, labels)
+        for label, counter in list(version.classes.items()):
+            out.counter("model_predictions_total", "Predictions served per class", counter.value,
+                        dict(labels, prediction=label))
+        if version.scheduler is not None:
+            out.histogram("inference_batch_rows", "Rows per micro-batch", version.scheduler.batch_rows, labels)
+            out.histogram("inference_queue_wait_seconds", "Time a request waited for its micro-batch",
+                          version.scheduler.queue_wait, labels)
+        if version.pool is not None:
+            out.counter("inference_pool_batches_total", "Batches sent to worker processes", version.pool.batches.value, labels)
+            out.counter("inference_pool_rows_total", "Rows sent to worker processes", version.pool.rows.value, labels)
+
+    devices = device_worker.stats()
+    out.gauge("ingest_devices", "Devices followed by the device ingest worker", devices["devices"])
+    out.counter("ingest_device_readings_total", "New device readings scored", devices["readings"])
+    out.counter("ingest_device_fetch_errors_total", "Device fetches that failed", devices["errors"])
+    out.histogram("ingest_device_poll_seconds", "Time to fetch and score every device once", device_worker.poll_seconds)
+    out.histogram("ingest_device_fetch_seconds", "Time to fetch every device once", device_worker.fetch_seconds)
+    out.histogram("ingest_device_batch_rows", "Readings scored per device poll", device_worker.batch_rows)
+
+register_collector(_collect_service_metrics)
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 10000))
-    app.run(host="0.0.0.0", port=port)
+    if os.environ.get("SERVER_MODE", "sync") == "async":
+        # Async handlers for the I/O-bound routes; see asgi_app.py
+        import uvicorn
+        uvicorn.run("asgi_app:app", host="0.0.0.0", port=port)
+    else:
+        if INGEST_ENABLED:
+            ingest_worker.start()
+            device_worker.start()
+        app.run(host="0.0.0.0", port=port)
 
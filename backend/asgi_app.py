@@ -0,0 +1,512 @@
+"""
+ASGI Application
+Async serving mode: the I/O-bound /api/sensor/* and /api/firebase/* routes
+and the prediction routes run as async handlers, so a request waiting on
+Firebase holds no thread. Model inference runs on a bounded thread pool.
+Every other route is served by the Flask app, mounted underneath.
+
+Run with:
+    SERVER_MODE=async python app.py
+    uvicorn asgi_app:app --port 10000
+"""
+
+import asyncio
+import contextvars
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from itertools import islice
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+from app import (MAX_PAGE_SIZE, MAX_POINTS, _firebase_rows, _freshness, _local_store, _page_rows, _raw_extra,
+                 app as flask_app)
+from firebase_async import AsyncFirebaseService, async_firebase_session
+from firebase_service import firebase_session, upstream_gate
+from instrumentation import begin_request, end_request, register_collector, stage
+from model_service import batch_json, predict_batch, predict_disease, prediction_json
+from sensor_ingest import INGEST_ENABLED, device_worker, ingest_worker, predict_payload
+from sensor_rollups import downsample
+from sensor_store import EntryEncoder, classify
+from sleep_pipeline import arrays_from_entries
+
+# Threads running model inference
+INFERENCE_WORKERS = int(os.environ.get("ASYNC_INFERENCE_WORKERS", min(4, os.cpu_count() or 1)))
+# Inference calls admitted to the pool at once; further requests wait on the event loop
+INFERENCE_QUEUE = int(os.environ.get("ASYNC_INFERENCE_QUEUE", INFERENCE_WORKERS * 8))
+# Rows read from the local store per worker-thread hop while streaming
+STORE_CHUNK = 256
+
+_executor = ThreadPoolExecutor(INFERENCE_WORKERS, thread_name_prefix="inference")
+_inference_slots = asyncio.Semaphore(INFERENCE_QUEUE)
+
+
+async def run_inference(fn, *args):
+    """Run a model call on the inference pool without blocking the event loop"""
+    async with _inference_slots:
+        # Carry the request context over, so stages inside fn count toward this route
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(_executor, context.run, fn, *args)
+
+
+def _json(body, status=200, headers=None):
+    return Response(json.dumps(body, separators=(",", ":")), status_code=status, media_type="application/json",
+                    headers=headers)
+
+
+def _firebase_failure(result, status=404):
+    """Response for a failed Firebase call; 503 when the upstream budget was exhausted"""
+    if result.get('overloaded'):
+        return _json(result, 503, {"Retry-After": "1"})
+    return _json(result, status)
+
+
+def _int_arg(request, name, default=None):
+    """Query parameter as int, falling back to default like Flask's type=int"""
+    try:
+        return int(request.query_params[name])
+    except (KeyError, ValueError):
+        return default
+
+
+async def _read_json(request):
+    body = await request.body()
+    return json.loads(body) if body else None
+
+
+# Prediction Endpoints
+
+async def health_check(request):
+    return _json({"status": "healthy", "service": "sleep-monitoring-backend"})
+
+
+async def predict(request):
+    try:
+        data = await _read_json(request)
+        if not data:
+            return _json({"error": "No data provided"}, 400)
+
+        with stage("predict"):
+            result = await run_inference(predict_disease, data)
+        with stage("serialize"):
+            return Response(prediction_json(result), media_type="application/json")
+    except Exception as e:
+        return _json({"error": str(e)}, 500)
+
+
+async def predict_batch_route(request):
+    try:
+        data = await _read_json(request)
+        if not data:
+            return _json({"error": "No data provided"}, 400)
+
+        if isinstance(data, dict) and "readings" in data:
+            data = data["readings"]
+
+        with stage("predict"):
+            try:
+                result = await run_inference(predict_batch, data)
+            except ValueError as e:
+                return _json({"error": str(e)}, 400)
+        with stage("serialize"):
+            return Response(batch_json(result), media_type="application/json")
+    except Exception as e:
+        return _json({"error": str(e)}, 500)
+
+
+# Sensor Endpoints
+
+async def get_latest_sensor(request):
+    try:
+        if INGEST_ENABLED:
+            ingest_worker.start()
+            with stage("ring_buffer"):
+                buffered = ingest_worker.latest_response()
+            if buffered is not None:
+                with stage("serialize"):
+                    return _json(buffered)
+
+        result = await AsyncFirebaseService.get_latest_sensor_data()
+        if result.get('success'):
+            result['prediction'] = await run_inference(predict_payload, result.get('data', {}))
+            with stage("serialize"):
+                return _json(result)
+        return _firebase_failure(result)
+    except Exception as e:
+        return _json({"success": False, "error": str(e)}, 500)
+
+
+class _PublishNotifier:
+    """
+    Bridges SensorBroadcaster.publish (ingest thread) to the event loop:
+    each publish sets the current asyncio.Event and installs a fresh one
+    """
+
+    def __init__(self):
+        self.event = None
+        self._loop = None
+
+    def attach(self, broadcaster):
+        if self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+        broadcaster.add_listener(self._on_publish)
+
+    def detach(self, broadcaster):
+        broadcaster.remove_listener(self._on_publish)
+        self._loop = None
+
+    def _on_publish(self):
+        try:
+            self._loop.call_soon_threadsafe(self._fire)
+        except (AttributeError, RuntimeError):
+            # Loop already closed (server shutting down)
+            pass
+
+    def _fire(self):
+        event, self.event = self.event, asyncio.Event()
+        event.set()
+
+
+_notifier = _PublishNotifier()
+
+
+async def _sse_events(broadcaster, seen):
+    """Same byte stream as SensorBroadcaster._stream, waiting on the event loop instead of a thread"""
+    try:
+        yield b"retry: 3000\n\n"
+        while True:
+            wake = _notifier.event
+            seq, event = broadcaster.current()
+            if seq == seen:
+                try:
+                    await asyncio.wait_for(wake.wait(), broadcaster.keepalive)
+                except asyncio.TimeoutError:
+                    pass
+                seq, event = broadcaster.current()
+
+            if seq != seen and event is not None:
+                seen = seq
+                yield event
+            else:
+                yield b": keep-alive\n\n"
+    finally:
+        broadcaster.release()
+
+
+async def stream_sensor(request):
+    if not INGEST_ENABLED:
+        return _json({"success": False, "message": "Streaming requires SENSOR_INGEST to be enabled"}, 503)
+
+    ingest_worker.start()
+    broadcaster = ingest_worker.broadcaster
+    _notifier.attach(broadcaster)
+    seen = broadcaster.acquire(request.headers.get('last-event-id'))
+    if seen is None:
+        return _json({"success": False, "message": "Too many stream subscribers"}, 503)
+
+    return StreamingResponse(_sse_events(broadcaster, seen), media_type='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
+def _paging_args(request):
+    after = request.query_params.get('after')
+    page_size = _int_arg(request, 'page_size')
+    if page_size is not None:
+        page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    fmt = request.query_params.get('format', 'json').lower()
+    return after, page_size, fmt
+
+
+async def _iterate(rows):
+    for row in rows:
+        yield row
+
+
+async def _every(rows, stride):
+    """Every stride-th row of an async row iterator"""
+    i = 0
+    async for row in rows:
+        if i % stride == 0:
+            yield row
+        i += 1
+
+
+async def _store_rows(fetch, after, total):
+    """
+    Rows from the local store, fetched STORE_CHUNK at a time on a worker
+    thread. Each chunk is a fresh query from the last key, so no SQLite
+    cursor is ever shared between threads.
+
+    Args:
+        fetch (callable): fetch(after, count, first) -> list of (key, payload_json)
+        after (str): Cursor to start from (None for the route's default window)
+        total (int): Rows to yield, or None for all
+    """
+    remaining = total
+    first = True
+    while remaining is None or remaining > 0:
+        count = STORE_CHUNK if remaining is None else min(STORE_CHUNK, remaining)
+        rows = await run_in_threadpool(fetch, after, count, first)
+        for row in rows:
+            yield row
+        if len(rows) < count:
+            return
+        first = False
+        after = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+
+
+async def _stream_entries(rows, fmt, page_size, empty_message, extra=None):
+    """Async counterpart of app._stream_entries (identical output)"""
+    rows = rows.__aiter__()
+    first = await anext(rows, None)
+    if first is None:
+        return _json({"success": False, "message": empty_message}, 404)
+
+    encoder = EntryEncoder(fmt, page_size, extra)
+
+    async def generate():
+        # Each yield is a separate socket write, so send rows STORE_CHUNK at a time
+        parts = [encoder.row(*first)]
+        async for key, payload in rows:
+            parts.append(encoder.row(key, payload))
+            if len(parts) >= STORE_CHUNK:
+                yield "".join(parts)
+                parts = []
+        parts.append(encoder.close())
+        yield "".join(parts)
+
+    return StreamingResponse(generate(), media_type=encoder.mimetype)
+
+
+async def _firebase_page(start_key, exclusive, page_size, end_time=None):
+    result = await AsyncFirebaseService.get_sensor_entries(start_key, page_size + 1)
+    if not result.get('success'):
+        return result, None
+    return result, _page_rows(result, start_key, exclusive, page_size, end_time)
+
+
+async def get_sensor_history(request):
+    try:
+        limit = _int_arg(request, 'limit', 100)
+        after, page_size, fmt = _paging_args(request)
+        empty_message = "No historical data available"
+
+        store = await run_in_threadpool(_local_store)
+        if store is not None:
+            def fetch(cursor, count, first):
+                # The first chunk locates the history window; later ones page from the cursor
+                return list(store.iter_history(limit=limit if first else count, after=cursor, page_size=count))
+            total = limit if page_size is None else min(limit, page_size)
+            return await _stream_entries(_store_rows(fetch, after, total), fmt, page_size, empty_message)
+
+        if after is None:
+            result = await AsyncFirebaseService.get_sensor_history(limit=limit)
+            if not result.get('success'):
+                return _firebase_failure(result)
+            rows = islice(_firebase_rows(result), page_size)
+            return await _stream_entries(_iterate(rows), fmt, page_size, empty_message, _freshness(result))
+
+        result, rows = await _firebase_page(after, True, min(page_size or MAX_PAGE_SIZE, limit))
+        if rows is None:
+            return _firebase_failure(result)
+        return await _stream_entries(_iterate(rows), fmt, page_size, empty_message, _freshness(result))
+    except Exception as e:
+        return _json({"success": False, "error": str(e)}, 500)
+
+
+async def get_sensor_range(request):
+    try:
+        start_time = request.query_params.get('start')
+        end_time = request.query_params.get('end')
+        after, page_size, fmt = _paging_args(request)
+        empty_message = "No data available in the specified range"
+        extra = {"range": {"start": start_time, "end": end_time}}
+
+        max_points = _int_arg(request, 'max_points')
+        if max_points is not None and after is None:
+            return await _downsampled_range(start_time, end_time, max(1, min(max_points, MAX_POINTS)), fmt, extra)
+
+        store = await run_in_threadpool(_local_store)
+        if store is not None:
+            def fetch(cursor, count, first):
+                return list(store.iter_range(start_time, end_time, after=cursor, page_size=count))
+            return await _stream_entries(_store_rows(fetch, after, page_size), fmt, page_size, empty_message, extra)
+
+        if after is None and page_size is None:
+            result = await AsyncFirebaseService.get_sensor_data_by_range(start_time, end_time)
+            if not result.get('success'):
+                return _firebase_failure(result)
+            return await _stream_entries(_iterate(_firebase_rows(result)), fmt, None, empty_message, _freshness(result, extra))
+
+        if after is not None and (not start_time or after >= start_time):
+            result, rows = await _firebase_page(after, True, page_size or MAX_PAGE_SIZE, end_time)
+        else:
+            result, rows = await _firebase_page(start_time, False, page_size or MAX_PAGE_SIZE, end_time)
+        if rows is None:
+            return _firebase_failure(result)
+        return await _stream_entries(_iterate(rows), fmt, page_size, empty_message, _freshness(result, extra))
+    except Exception as e:
+        return _json({"success": False, "error": str(e)}, 500)
+
+
+def _rollup(entries, max_points):
+    """Bucket raw Firebase entries into at most max_points points (runs the model)"""
+    with stage("features"):
+        ts, values = arrays_from_entries(entries)
+    with stage("rollup"):
+        return downsample(ts, values, classify(values), max_points)
+
+
+async def _downsampled_range(start_time, end_time, max_points, fmt, extra):
+    """Async counterpart of app._downsampled_range (identical output)"""
+    empty_message = "No data available in the specified range"
+    store = await run_in_threadpool(_local_store)
+    if store is not None:
+        with stage("store_query"):
+            tier, seconds, buckets = await run_in_threadpool(store.downsampled_range, start_time, end_time, max_points)
+        if tier is None:
+            def fetch(cursor, count, first):
+                return list(store.iter_range(start_time, end_time, after=cursor, page_size=count))
+            rows = _store_rows(fetch, None, None)
+            if seconds > 1:
+                rows = _every(rows, seconds)
+            return await _stream_entries(rows, fmt, None, empty_message, _raw_extra(extra, seconds))
+    else:
+        result = await AsyncFirebaseService.get_sensor_data_by_range(start_time, end_time)
+        if not result.get('success'):
+            return _firebase_failure(result)
+        if len(result['data']) <= max_points:
+            return await _stream_entries(_iterate(_firebase_rows(result)), fmt, None, empty_message,
+                                         _freshness(result, _raw_extra(extra, 1)))
+        tier, seconds, buckets = await run_inference(_rollup, result['data'], max_points)
+        if not buckets:
+            stride = -(-len(result['data']) // max_points)
+            return await _stream_entries(_iterate(islice(_firebase_rows(result), 0, None, stride)), fmt, None,
+                                         empty_message, _freshness(result, _raw_extra(extra, stride)))
+
+    if not buckets:
+        return _json({"success": False, "message": empty_message}, 404)
+    with stage("serialize"):
+        points = [bucket.to_point() for bucket in buckets]
+        if fmt == "ndjson":
+            body = "".join(json.dumps(point, separators=(",", ":")) + "\n" for point in points)
+            return Response(body, media_type="application/x-ndjson")
+        body = {"success": True, "resolution": tier, "bucket_seconds": seconds, "count": len(points), "data": points}
+        body.update(extra)
+        return _json(body)
+
+
+# Firebase Endpoints
+
+async def test_firebase_connection(request):
+    try:
+        result = await AsyncFirebaseService.test_connection()
+        if not result.get('success'):
+            return _firebase_failure(result, 500)
+        return _json(result)
+    except Exception as e:
+        return _json({"success": False, "error": str(e)}, 500)
+
+
+async def firebase_stats(request):
+    stats = firebase_session.stats()
+    stats["async"] = async_firebase_session.stats()
+    stats["upstream"] = upstream_gate.stats()
+    return _json(stats)
+
+
+class RequestMetricsMiddleware:
+    """
+    Request timing for the native async routes, recorded when the response
+    headers are sent (the mounted Flask app times its own requests)
+    """
+
+    def __init__(self, app, paths):
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+
+        trace = begin_request(scope["method"], scope["path"])
+        finished = False
+
+        async def timed_send(message):
+            nonlocal finished
+            if message["type"] == "http.response.start" and not finished:
+                finished = True
+                end_request(trace, message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            if not finished:
+                end_request(trace, 500)
+
+
+def _collect_async_metrics(out):
+    for label, histogram in list(async_firebase_session.latency.items()):
+        out.histogram("firebase_request_duration_seconds", "Firebase REST call latency including retries",
+                      histogram, {"client": "async", "call": label})
+    out.counter("firebase_errors_total", "Firebase calls that raised", async_firebase_session.errors.value,
+                {"client": "async"})
+
+
+register_collector(_collect_async_metrics)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if INGEST_ENABLED:
+        ingest_worker.start()
+        device_worker.start()
+    yield
+    _notifier.detach(ingest_worker.broadcaster)
+    ingest_worker.stop(5)
+    device_worker.stop(5)
+    await async_firebase_session.close()
+    _executor.shutdown(wait=False)
+
+
+routes = [
+    Route('/health', health_check, methods=['GET']),
+    Route('/predict', predict, methods=['POST']),
+    Route('/predict/batch', predict_batch_route, methods=['POST']),
+    Route('/api/sensor/latest', get_latest_sensor, methods=['GET']),
+    Route('/api/sensor/stream', stream_sensor, methods=['GET']),
+    Route('/api/sensor/history', get_sensor_history, methods=['GET']),
+    Route('/api/sensor/range', get_sensor_range, methods=['GET']),
+    Route('/api/firebase/test', test_firebase_connection, methods=['GET']),
+    Route('/api/firebase/stats', firebase_stats, methods=['GET']),
+]
+
+app = Starlette(
+    routes=routes + [
+        # Everything else (sleep analysis, diet, cache stats, metrics) is served by Flask on a worker thread
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]),
+        Middleware(RequestMetricsMiddleware, paths=[route.path for route in routes]),
+    ],
+    lifespan=lifespan
+)
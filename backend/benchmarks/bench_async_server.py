@@ -0,0 +1,132 @@
+"""
+Load test: Flask dev server vs async (ASGI) server on the Firebase-bound routes
+
+Starts the Firebase stub with a fixed response latency, then runs each
+server mode in turn and drives it with N concurrent clients for a fixed
+duration. The ingest worker and local store are disabled so every request
+goes to Firebase.
+
+Usage:
+    python benchmarks/bench_async_server.py [concurrency,...] [seconds] [stub_latency]
+    e.g. python benchmarks/bench_async_server.py 10,50,200 10 0.05
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import aiohttp
+import numpy as np
+
+from common import BACKEND_DIR
+
+STUB_PORT = 9411
+SERVER_PORT = 9412
+ENDPOINTS = ["/api/sensor/latest", "/api/sensor/history?limit=50"]
+
+
+def wait_for(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def start_server(mode, stub_url, summary_path):
+    env = dict(
+        os.environ,
+        PORT=str(SERVER_PORT),
+        SERVER_MODE=mode,
+        FIREBASE_DATABASE_URL=stub_url,
+        SENSOR_INGEST="0",
+        SENSOR_STORE="0",
+        SLEEP_SUMMARY_PATH=summary_path,
+        PREDICTION_CACHE_SIZE="0",
+    )
+    proc = subprocess.Popen([sys.executable, "app.py"], cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for(f"http://127.0.0.1:{SERVER_PORT}/health")
+    return proc
+
+
+async def drive(base_url, concurrency, seconds):
+    """
+    Closed-loop load: each client sends its next request as soon as the last returns
+
+    Returns:
+        dict: requests/s, p50/p99 latency (ms) and error count
+    """
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=30)
+
+    async with aiohttp.ClientSession(base_url, connector=connector, timeout=timeout) as client:
+        async def worker(k):
+            nonlocal errors
+            i = k
+            while time.perf_counter() < deadline:
+                t0 = time.perf_counter()
+                try:
+                    async with client.get(ENDPOINTS[i % len(ENDPOINTS)]) as response:
+                        await response.read()
+                        if response.status != 200:
+                            errors += 1
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    errors += 1
+                latencies.append(time.perf_counter() - t0)
+                i += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(k) for k in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    samples = np.array(latencies) * 1000
+    return {
+        "requests": len(samples),
+        "rps": len(samples) / elapsed,
+        "p50_ms": float(np.percentile(samples, 50)) if len(samples) else None,
+        "p99_ms": float(np.percentile(samples, 99)) if len(samples) else None,
+        "errors": errors,
+    }
+
+
+def main():
+    levels = [int(c) for c in (sys.argv[1] if len(sys.argv) > 1 else "10,50,200").split(",")]
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+    latency = sys.argv[3] if len(sys.argv) > 3 else "0.05"
+
+    stub = subprocess.Popen([sys.executable, os.path.join(BACKEND_DIR, "benchmarks", "firebase_stub.py"),
+                             str(STUB_PORT), latency], stdout=subprocess.DEVNULL)
+    stub_url = f"http://127.0.0.1:{STUB_PORT}"
+    summary_path = os.path.join(tempfile.mkdtemp(), "summaries.json")
+    print(f"Firebase stub latency {float(latency) * 1000:.0f}ms, {seconds:.0f}s per run, endpoints {ENDPOINTS}")
+    print(f"{'mode':<8} {'clients':>8} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'errors':>8}")
+    try:
+        wait_for(f"{stub_url}/.json?shallow=true")
+        for mode in ("sync", "async"):
+            server = start_server(mode, stub_url, summary_path)
+            try:
+                for concurrency in levels:
+                    r = asyncio.run(drive(f"http://127.0.0.1:{SERVER_PORT}", concurrency, seconds))
+                    print(f"{mode:<8} {concurrency:>8} {r['rps']:>10.1f} {r['p50_ms']:>10.1f} "
+                          f"{r['p99_ms']:>10.1f} {r['errors']:>8}")
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Cold start: time from process launch to the first answered request
+
+Launches app.py as a fresh process per run and polls it, recording when
+  - /health first answers
+  - /api/diet-recommendation first answers
+  - /ready reports the model loaded (404 before readiness existed)
+  - the first /predict succeeds
+for synchronous model loading at import time and background preloading.
+The ingest worker and local store are disabled.
+
+Usage:
+    python benchmarks/bench_cold_start.py [runs] [sync|async]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+from common import BACKEND_DIR
+
+SERVER_PORT = 9413
+POLL_INTERVAL = 0.005
+PROBES = [
+    ("health", "GET", "/health", None),
+    ("diet", "POST", "/api/diet-recommendation", {"dosha": "Vata", "disorder": "Normal"}),
+    ("ready", "GET", "/ready", None),
+    ("predict", "POST", "/predict", {"bvp": 70, "acc_x": 0.1, "acc_y": 0.0, "acc_z": 0.9, "temp": 36.5}),
+]
+MODES = {
+    "preload=sync": {"MODEL_PRELOAD": "sync"},
+    "preload=background": {"MODEL_PRELOAD": "background"},
+    "background+warmup": {"MODEL_PRELOAD": "background", "MODEL_WARMUP": "1"},
+}
+
+
+def request(method, path, body):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(f"http://127.0.0.1:{SERVER_PORT}{path}", data=data, method=method,
+                                 headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=5) as response:
+        return response.status
+
+
+def cold_start(env, timeout=120):
+    """
+    Seconds from launch until each probe first succeeds (None if it never did)
+    """
+    proc = subprocess.Popen([sys.executable, "app.py"], cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    launched = time.perf_counter()
+    times = {}
+    try:
+        while len(times) < len(PROBES) and time.perf_counter() - launched < timeout:
+            for name, method, path, body in PROBES:
+                if name in times:
+                    continue
+                try:
+                    if request(method, path, body) == 200:
+                        times[name] = time.perf_counter() - launched
+                except urllib.error.HTTPError as e:
+                    if e.code == 404 and name == "ready":
+                        # No readiness route: the model was loaded before the server listened
+                        times[name] = None
+                except OSError:
+                    break
+            time.sleep(POLL_INTERVAL)
+    finally:
+        proc.terminate()
+        proc.wait()
+    return times
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    server_mode = sys.argv[2] if len(sys.argv) > 2 else "sync"
+    summary_path = os.path.join(tempfile.mkdtemp(), "summaries.json")
+    base_env = dict(os.environ, PORT=str(SERVER_PORT), SERVER_MODE=server_mode, SENSOR_INGEST="0",
+                    SENSOR_STORE="0", SLEEP_SUMMARY_PATH=summary_path)
+
+    print(f"{server_mode} server, median of {runs} launches (seconds from process start)")
+    print(f"{'mode':<20}" + "".join(f"{name:>10}" for name, _, _, _ in PROBES))
+    for mode, overrides in MODES.items():
+        samples = [cold_start(dict(base_env, **overrides)) for _ in range(runs)]
+        cells = []
+        for name, _, _, _ in PROBES:
+            values = [s[name] for s in samples if s.get(name) is not None]
+            cells.append(f"{np.median(values):>10.3f}" if values else f"{'-':>10}")
+        print(f"{mode:<20}" + "".join(cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Compiled forest vs stock sklearn: equivalence, latency and throughput
+
+Usage:
+    python benchmarks/bench_compiled_forest.py [probe_rows]
+"""
+
+import sys
+
+import numpy as np
+
+from common import ensure_model, measure, print_result, synthetic_readings
+
+
+def main():
+    probe_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    from compiled_forest import CompiledForest, probe_inputs, verify_equivalence
+
+    forest = ensure_model().model
+    compiled = CompiledForest.from_sklearn(forest)
+    print(f"{compiled.n_estimators} trees, {compiled.node_count} nodes, max depth {compiled.max_depth}")
+
+    # Equivalence: random rows, rows on split thresholds, realistic readings
+    probes = [
+        ("boundary probes", probe_inputs(compiled, probe_rows, seed=1)),
+        ("synthetic readings", synthetic_readings(probe_rows, seed=2)),
+    ]
+    for name, X in probes:
+        mismatches = verify_equivalence(forest, compiled, X)
+        proba_equal = np.array_equal(forest.predict_proba(X), compiled.predict_proba(X))
+        print(f"{name:<40} rows={len(X)} label mismatches={mismatches} proba identical={proba_equal}")
+        if mismatches:
+            sys.exit(1)
+
+    single = synthetic_readings(1, seed=3)
+    print_result("single row: sklearn", measure(lambda: forest.predict(single), 500))
+    print_result("single row: compiled", measure(lambda: compiled.predict(single), 500))
+
+    for rows in (100, 10000):
+        batch = synthetic_readings(rows, seed=4)
+        for name, estimator in (("sklearn", forest), ("compiled", compiled)):
+            stats = measure(lambda: estimator.predict(batch), 20, warmup=2, rows_per_call=rows)
+            print(f"{f'batch {rows}: {name}':<40} {stats['rows_per_sec']:.0f} rows/s (p50={stats['p50_ms']:.2f}ms)")
+
+
+if __name__ == "__main__":
+    main()
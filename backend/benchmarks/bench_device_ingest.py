@@ -0,0 +1,104 @@
+"""
+Multi-device ingestion: time per poll as the device count grows
+
+Runs the Firebase stub (in its own process, with a fixed response latency)
+serving 100 devices, then for 1..100 devices compares
+  - sequential: fetch each device's latest reading and score it on its own
+  - concurrent: DeviceIngestWorker.poll_once, which fetches every device at
+    once and scores all new readings in one batch
+Every poll rescores every device, as if each had sent a new reading.
+
+Usage:
+    python benchmarks/bench_device_ingest.py [devices,...] [polls] [stub_latency]
+    e.g. python benchmarks/bench_device_ingest.py 1,10,25,50,100 20 0.05
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from common import BACKEND_DIR, ensure_model
+
+STUB_PORT = 9413
+STUB_URL = f"http://127.0.0.1:{STUB_PORT}"
+# Set before the backend modules are imported; nightly summaries of the
+# synthetic devices go to a scratch file
+os.environ["FIREBASE_DATABASE_URL"] = STUB_URL
+os.environ["SLEEP_SUMMARY_PATH"] = os.path.join(tempfile.mkdtemp(), "summaries.json")
+
+from bench_async_server import wait_for
+
+
+def percentiles(samples):
+    samples = np.array(samples) * 1000
+    return float(np.percentile(samples, 50)), float(np.percentile(samples, 95))
+
+
+def sequential_poll(devices):
+    from firebase_service import FirebaseService
+    from sensor_ingest import predict_payload
+
+    for device in devices:
+        result = FirebaseService.get_latest_sensor_data(device)
+        predict_payload(result["data"])
+
+
+def main():
+    levels = [int(n) for n in (sys.argv[1] if len(sys.argv) > 1 else "1,10,25,50,100").split(",")]
+    polls = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    latency = sys.argv[3] if len(sys.argv) > 3 else "0.05"
+
+    stub = subprocess.Popen([sys.executable, os.path.join(BACKEND_DIR, "benchmarks", "firebase_stub.py"),
+                             str(STUB_PORT), latency, str(max(levels))], stdout=subprocess.DEVNULL)
+    try:
+        wait_for(f"{STUB_URL}/.json?shallow=true")
+        import model_service
+        from sensor_ingest import DeviceIngestWorker
+
+        if model_service.registry.get() is None:
+            ensure_model()
+
+        print(f"Firebase stub latency {float(latency) * 1000:.0f}ms, {polls} polls per level")
+        print(f"{'devices':>7} {'sequential p50 ms':>18} {'concurrent p50 ms':>18} {'p95 ms':>8} "
+              f"{'fetch ms':>9} {'score ms':>9} {'rows/poll':>10}")
+        for n in levels:
+            worker = DeviceIngestWorker(max_devices=n)
+            try:
+                worker.poll_once()  # discovery and connection setup
+                devices = sorted(worker.feeds)
+
+                sequential = []
+                for _ in range(max(1, min(polls, 100 // n))):
+                    started = time.perf_counter()
+                    sequential_poll(devices)
+                    sequential.append(time.perf_counter() - started)
+
+                concurrent, fetch, score, rows = [], [], [], []
+                for _ in range(polls):
+                    for feed in worker.feeds.values():
+                        feed.last_payload = None
+                    fetch_before = worker.fetch_seconds.snapshot()["sum"]
+                    score_before = worker.score_seconds.snapshot()["sum"]
+                    started = time.perf_counter()
+                    rows.append(worker.poll_once())
+                    concurrent.append(time.perf_counter() - started)
+                    fetch.append(worker.fetch_seconds.snapshot()["sum"] - fetch_before)
+                    score.append(worker.score_seconds.snapshot()["sum"] - score_before)
+            finally:
+                worker.close()
+
+            seq_p50, _ = percentiles(sequential)
+            p50, p95 = percentiles(concurrent)
+            print(f"{n:>7} {seq_p50:>18.1f} {p50:>18.1f} {p95:>8.1f} {np.median(fetch) * 1000:>9.1f} "
+                  f"{np.median(score) * 1000:>9.1f} {np.mean(rows):>10.0f}")
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Process-pool inference: throughput scaling and memory per worker
+
+For 1..N workers, measures
+  - single-row throughput with many concurrent request threads (micro-batched)
+  - bulk throughput of one large request split across the workers
+  - resident (RSS), proportional (PSS) and private memory of each worker
+for memory-mapped (compiled forest) and fork copy-on-write (sklearn forest)
+model sharing, compared with every worker loading its own copy.
+
+Usage:
+    python benchmarks/bench_inference_pool.py [max_workers] [seconds] [client_threads]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from common import ensure_model, synthetic_readings
+
+from compiled_forest import CompiledForest
+from inference_pool import InferencePool, process_memory
+
+
+def concurrent_rows_per_sec(predict, X, threads, seconds):
+    """Single-row predictions from `threads` request threads for `seconds`"""
+    done = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def client(k):
+        i = k
+        while time.perf_counter() < deadline:
+            predict(X[i % len(X):i % len(X) + 1])
+            done[k] += 1
+            i += threads
+
+    workers = [threading.Thread(target=client, args=(k,)) for k in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return sum(done) / (time.perf_counter() - started)
+
+
+def bulk_rows_per_sec(predict, X, repeats=3):
+    started = time.perf_counter()
+    for _ in range(repeats):
+        predict(X)
+    return repeats * len(X) / (time.perf_counter() - started)
+
+
+def memory_summary(pool):
+    stats = [process_memory(pid) for pid in pool.worker_pids()]
+    mean = lambda key: np.mean([s[key] for s in stats if s[key] is not None]) if stats else float("nan")
+    return mean("rss_mb"), mean("pss_mb"), mean("private_mb")
+
+
+def main():
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else (os.cpu_count() or 1)
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 64
+
+    model_service = ensure_model()
+    compiled = CompiledForest.from_sklearn(model_service.model)
+    # Arrays in FEATURE_ORDER, as the service passes them (no feature-name warnings)
+    forest = model_service._unnamed(model_service.model)
+    model_mb = sum(a.nbytes for a in vars(compiled).values() if isinstance(a, np.ndarray)) / 2 ** 20
+    X_single = synthetic_readings(1024, seed=1)
+    X_bulk = synthetic_readings(50000, seed=2)
+    path = os.path.join(tempfile.mkdtemp(), "shared_model.joblib")
+
+    print(f"{os.cpu_count()} CPUs, compiled model {model_mb:.1f} MB, {threads} client threads")
+    for name, predict in (("in-process sklearn", forest.predict), ("in-process compiled", compiled.predict)):
+        single = concurrent_rows_per_sec(predict, X_single, threads, seconds)
+        bulk = bulk_rows_per_sec(predict, X_bulk, repeats=1)
+        print(f"{name:<28} single-row {single:>9.0f} rows/s, bulk {bulk:>9.0f} rows/s")
+
+    print(f"{'workers':>7} {'share':>6} {'single rows/s':>14} {'bulk rows/s':>12} {'mean batch':>11} "
+          f"{'RSS MB':>8} {'PSS MB':>8} {'private MB':>11}")
+    for workers in range(1, max_workers + 1):
+        for share in ("mmap", "fork", "copy"):
+            if share == "copy" and workers != max_workers:
+                continue
+            model = forest if share == "fork" else compiled
+            pool = InferencePool(model, workers=workers, share=share, path=path)
+            try:
+                single = concurrent_rows_per_sec(pool.predict, X_single, threads, seconds)
+                mean_batch = pool.stats()["mean_batch_rows"]
+                bulk = bulk_rows_per_sec(pool.predict, X_bulk)
+                rss, pss, private = memory_summary(pool)
+            finally:
+                pool.stop()
+            print(f"{workers:>7} {share:>6} {single:>14.0f} {bulk:>12.0f} {mean_batch:>11.1f} "
+                  f"{rss:>8.1f} {pss:>8.1f} {private:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Request instrumentation overhead
+
+Drives cheap Flask routes in-process (test client) with request/stage
+timing enabled and disabled, alternating runs to cancel drift, and
+reports the latency each route pays for its metrics. The routes are the
+fastest the service has, so the relative overhead here is an upper bound.
+
+Usage:
+    python benchmarks/bench_instrumentation.py [iterations] [rounds]
+"""
+
+import os
+import sys
+
+os.environ.setdefault("SENSOR_INGEST", "0")
+os.environ.setdefault("SENSOR_STORE", "0")
+os.environ.setdefault("PREDICTION_CACHE_SIZE", "0")
+
+from common import ensure_model, measure
+
+import instrumentation
+import model_service
+from app import app
+
+READING = {"bpm": 72, "temperature": 36.5, "gyro_x": 0.1, "gyro_y": -0.2, "gyro_z": 0.05}
+REQUESTS = [
+    ("GET /health", lambda client: client.get("/health")),
+    ("POST /predict", lambda client: client.post("/predict", json=READING)),
+    ("POST /predict/batch (32)", lambda client: client.post("/predict/batch", json={"readings": [READING] * 32})),
+    ("POST /api/diet-recommendation",
+     lambda client: client.post("/api/diet-recommendation", json={"dosha": "vata", "disorder": "Insomnia"})),
+]
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    if model_service.registry.get() is None:
+        ensure_model()
+    client = app.test_client()
+
+    print(f"{iterations} requests x {rounds} rounds per setting, best round reported")
+    print(f"{'route':<32} {'off p50 ms':>11} {'on p50 ms':>11} {'overhead us':>12} {'overhead':>9}")
+    for name, send in REQUESTS:
+        best = {}
+        for _ in range(rounds):
+            for enabled in (False, True):
+                instrumentation.ENABLED = enabled
+                stats = measure(lambda: send(client), iterations=iterations, warmup=100)
+                if enabled not in best or stats["p50_ms"] < best[enabled]["p50_ms"]:
+                    best[enabled] = stats
+        off, on = best[False]["p50_ms"], best[True]["p50_ms"]
+        print(f"{name:<32} {off:>11.4f} {on:>11.4f} {(on - off) * 1000:>12.1f} {(on - off) / off:>8.1%}")
+
+    instrumentation.ENABLED = True
+    body = client.get("/metrics").get_data(as_text=True)
+    print(f"/metrics: {len(body.splitlines())} lines, {len(body) / 1024:.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Micro-batching scheduler: concurrent single-row /predict throughput and latency
+
+Runs predict_disease from N client threads with the prediction cache
+disabled, first evaluating every request on its own and then through
+InferenceScheduler, and reports rows/s, p50/p99 latency and the batch
+size and queue wait the scheduler saw.
+
+Usage:
+    python benchmarks/bench_micro_batching.py [threads,...] [seconds] [max_batch] [max_wait_ms]
+    e.g. python benchmarks/bench_micro_batching.py 1,16,64,128 5 64 2
+"""
+
+import sys
+import threading
+import time
+
+import numpy as np
+
+from common import FEATURES, ensure_model, synthetic_readings
+
+
+def drive(predict, payloads, threads, seconds):
+    """
+    Closed-loop load: each thread sends its next request as soon as the last returns
+
+    Returns:
+        dict: rows/s and p50/p99 latency (ms)
+    """
+    latencies = [[] for _ in range(threads)]
+    deadline = time.perf_counter() + seconds
+
+    def client(k):
+        i = k
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            predict(payloads[i % len(payloads)])
+            latencies[k].append(time.perf_counter() - t0)
+            i += threads
+
+    workers = [threading.Thread(target=client, args=(k,)) for k in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - started
+
+    samples = np.concatenate([np.array(l) for l in latencies]) * 1000
+    return {
+        "rows_per_sec": len(samples) / elapsed,
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p99_ms": float(np.percentile(samples, 99)),
+    }
+
+
+def main():
+    levels = [int(c) for c in (sys.argv[1] if len(sys.argv) > 1 else "1,16,64,128").split(",")]
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    max_batch = int(sys.argv[3]) if len(sys.argv) > 3 else 64
+    max_wait = (float(sys.argv[4]) if len(sys.argv) > 4 else 2.0) / 1000.0
+
+    model_service = ensure_model()
+    model_service.prediction_cache.max_size = 0
+    version = model_service.registry.get()
+    payloads = [dict(zip(FEATURES, map(float, row))) for row in synthetic_readings(4096, seed=3)]
+
+    print(f"{seconds:.0f}s per run, scheduler max_batch={max_batch} max_wait={max_wait * 1000:.1f}ms, "
+          f"engine {'compiled' if version.compiled is not None else 'sklearn'}")
+    print(f"{'mode':<10} {'threads':>8} {'rows/s':>10} {'p50 ms':>9} {'p99 ms':>9} "
+          f"{'mean batch':>11} {'wait p50 ms':>12} {'wait p99 ms':>12}")
+    for threads in levels:
+        for mode in ("unbatched", "batched"):
+            scheduler = None
+            if mode == "batched":
+                scheduler = model_service.InferenceScheduler(version.run, max_batch, max_wait)
+            version.scheduler = scheduler
+            r = drive(model_service.predict_disease, payloads, threads, seconds)
+
+            batch, wait_p50, wait_p99 = "-", "-", "-"
+            if scheduler is not None:
+                stats = scheduler.stats()
+                batch = f"{stats['mean_batch_rows']:.1f}"
+                wait = stats["queue_wait_seconds"]
+                wait_p50, wait_p99 = f"{wait['p50'] * 1000:.2f}", f"{wait['p99'] * 1000:.2f}"
+            print(f"{mode:<10} {threads:>8} {r['rows_per_sec']:>10.0f} {r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+                  f"{batch:>11} {wait_p50:>12} {wait_p99:>12}")
+    version.scheduler = None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Model artifact vs joblib pickle: file size, cold load time and equivalence
+
+Load times are measured in a fresh interpreter per run, so they include
+every import the format needs (sklearn for the pickle, only NumPy for the
+artifact). Exports an artifact next to the pickle if none exists.
+
+Usage:
+    python benchmarks/bench_model_artifact.py [runs]
+"""
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from common import BACKEND_DIR, ensure_model, synthetic_readings
+
+LOADERS = {
+    "pickle": "import joblib; joblib.load({path!r})",
+    "artifact": "from model_artifact import load_artifact; load_artifact({path!r})",
+    "artifact (no checksum)": "from model_artifact import load_artifact; load_artifact({path!r}, verify=False)",
+}
+TIMER = "import time; t = time.perf_counter(); {load}; print(time.perf_counter() - t)"
+
+
+def cold_load_seconds(load, runs):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", TIMER.format(load=load)], cwd=BACKEND_DIR,
+                             capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return float(np.median(samples))
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    from compiled_forest import CompiledForest, probe_inputs
+    from model_artifact import export_artifact, load_artifact
+
+    model_service = ensure_model()
+    forest = model_service.model
+    if not os.path.exists(model_service.MODEL_ARTIFACT_PATH):
+        export_artifact(forest, model_service.MODEL_ARTIFACT_PATH)
+    artifact = load_artifact(model_service.MODEL_ARTIFACT_PATH)
+
+    X = np.vstack([probe_inputs(CompiledForest.from_sklearn(forest), 50000, seed=5), synthetic_readings(50000, seed=6)])
+    identical = np.array_equal(forest.predict_proba(X), artifact.predict_proba(X))
+    print(f"{artifact.n_estimators} trees, {artifact.node_count} nodes; predict_proba identical on {len(X)} rows: {identical}")
+
+    paths = {"pickle": model_service.MODEL_PATH}
+    paths["artifact"] = paths["artifact (no checksum)"] = model_service.MODEL_ARTIFACT_PATH
+    print(f"{'format':<24} {'size MB':>9} {'cold load s':>12}")
+    for name, load in LOADERS.items():
+        if not os.path.exists(paths[name]):
+            continue
+        seconds = cold_load_seconds(load.format(path=paths[name]), runs)
+        print(f"{name:<24} {os.path.getsize(paths[name]) / 2 ** 20:>9.1f} {seconds:>12.3f}")
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
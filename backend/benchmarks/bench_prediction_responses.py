@@ -0,0 +1,49 @@
+"""
+Prediction response construction: the original in-place update of the shared
+recommendation dict + json.dumps vs the shared precomputed FrozenDict with
+pre-serialized bytes (tests/test_prediction_responses.py checks that shared
+responses stay intact under concurrency)
+
+Usage:
+    python benchmarks/bench_prediction_responses.py [iterations]
+"""
+
+import json
+import sys
+
+from common import ensure_model, measure, print_result, synthetic_readings
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    model_service = ensure_model()
+    from app import app
+
+    readings = [dict(zip(model_service.FEATURE_ORDER, x.tolist())) for x in synthetic_readings(64)]
+    prediction = model_service.predict_disease(readings[0])["raw_prediction"]
+
+    # Original implementation: the module-level recommendation dict was
+    # updated in place on every call (not thread-safe) and encoded per response
+    recommendations = json.loads(json.dumps(model_service.DIET_RECOMMENDATIONS))
+
+    def in_place_and_jsonify():
+        condition = model_service.CLASS_MAPPING[prediction]
+        result = recommendations[condition]
+        result["condition"] = condition
+        result["source"] = "ml_model"
+        result["raw_prediction"] = prediction
+        return json.dumps(result).encode()
+
+    def precomputed():
+        return model_service.prediction_json(model_service._build_result(prediction))
+
+    print_result("before: in-place update + json.dumps", measure(in_place_and_jsonify, iterations))
+    print_result("after: shared pre-serialized bytes", measure(precomputed, iterations))
+
+    client = app.test_client()
+    print_result("POST /predict", measure(lambda: client.post("/predict", json=readings[0]), 500))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Long-range queries: raw readings vs downsampled rollups
+
+Fills a scratch sensor store with 1 Hz readings (rolling them up as they
+are inserted, like a sync would), then requests /api/sensor/range over
+spans from an hour to the whole history, raw and with max_points.
+
+Usage:
+    python benchmarks/bench_rollups.py [days] [max_points] [iterations]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+os.environ["SENSOR_STORE_PATH"] = os.path.join(tempfile.mkdtemp(), "sensor_history.db")
+os.environ.setdefault("SENSOR_INGEST", "0")
+
+from common import ensure_model, measure
+from firebase_stub import synthetic_history
+
+import model_service
+import sensor_store
+from app import app
+
+START_TS = 1767225600
+INSERT_CHUNK = 20000
+
+
+def fill_store(store, seconds):
+    started = time.perf_counter()
+    for offset in range(0, seconds, INSERT_CHUNK):
+        n = min(INSERT_CHUNK, seconds - offset)
+        store.insert(synthetic_history(n, start_ts=START_TS + offset, seed=offset))
+    return time.perf_counter() - started
+
+
+def main():
+    days = float(sys.argv[1]) if len(sys.argv) > 1 else 7
+    max_points = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    iterations = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    if model_service.registry.get() is None:
+        ensure_model()
+    store = sensor_store.get_store()
+    seconds = int(days * 86400)
+    elapsed = fill_store(store, seconds)
+    print(f"Inserted and rolled up {seconds} readings in {elapsed:.1f}s "
+          f"({seconds / elapsed:.0f} readings/s)")
+    # Serve what is stored; there is no Firebase to sync from
+    store.sync_interval = float("inf")
+    store._last_attempt = time.time()
+    client = app.test_client()
+
+    print(f"{'span':>6} {'mode':>10} {'points':>8} {'resolution':>10} {'KB':>9} {'p50 ms':>9}")
+    for label, span in (("1h", 3600), ("1d", 86400), ("7d", 7 * 86400), ("all", seconds)):
+        if span > seconds:
+            continue
+        end = START_TS + seconds - 1
+        url = f"/api/sensor/range?start={end - span + 1}&end={end}"
+        for mode, query in (("raw", ""), ("max_points", f"&max_points={max_points}")):
+            response = client.get(url + query)
+            body = response.get_json()
+            stats = measure(lambda: client.get(url + query).get_data(), iterations=iterations, warmup=1)
+            print(f"{label:>6} {mode:>10} {body['count']:>8} {body.get('resolution', 'raw'):>10} "
+                  f"{len(response.get_data()) / 1024:>9.0f} {stats['p50_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+History/range query latency: local SQLite store vs Firebase REST path
+
+Runs both paths against a local Firebase stub holding 30 nights of readings.
+
+Usage:
+    python benchmarks/bench_sensor_store.py [sample_period_seconds]
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+from common import measure, print_result
+from firebase_stub import FirebaseStub, synthetic_history
+
+NIGHT = 8 * 3600
+START = 1767225600
+
+
+def entries(rows):
+    """Materialise store rows as the entry list a Firebase response parses into"""
+    out = []
+    for key, payload in rows:
+        entry = json.loads(payload)
+        entry["timestamp"] = key
+        out.append(entry)
+    return out
+
+
+def main():
+    period = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    nights = 30
+    per_night = NIGHT // period
+    history = {}
+    for night in range(nights):
+        history.update(synthetic_history(per_night, START + night * 86400, period, seed=night))
+    print(f"{len(history)} readings ({nights} nights at 1/{period} Hz)")
+
+    with FirebaseStub({"sensor_data": history}) as stub:
+        os.environ["FIREBASE_DATABASE_URL"] = stub.url
+        from firebase_service import FirebaseService
+        from sensor_store import SensorStore
+
+        store = SensorStore(os.path.join(tempfile.mkdtemp(), "bench.db"))
+        print(f"initial sync: {store.sync()}")
+
+        for label, span in (("1 night", NIGHT), ("30 nights", (nights - 1) * 86400 + NIGHT)):
+            start, end = str(START), str(START + span)
+            n = len(entries(store.iter_range(start, end)))
+            iterations = 5 if span > NIGHT else 50
+            print_result(f"{label} range: Firebase ({n} rows)",
+                         measure(lambda: FirebaseService.get_sensor_data_by_range(start, end), iterations, warmup=2))
+            print_result(f"{label} range: local store",
+                         measure(lambda: entries(store.iter_range(start, end)), iterations, warmup=2))
+
+        print_result("history limit=100: Firebase", measure(lambda: FirebaseService.get_sensor_history(100), 200))
+        print_result("history limit=100: local store", measure(lambda: entries(store.iter_history(100)), 200))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Single-row inference latency: DataFrame path vs preallocated NumPy path
+
+The prediction cache is disabled and both paths cycle through distinct
+readings, so every call evaluates the model.
+
+Usage:
+    python benchmarks/bench_single_row.py [iterations]
+"""
+
+import os
+import subprocess
+import sys
+
+os.environ["PREDICTION_CACHE_SIZE"] = "0"
+
+from common import ensure_model, measure, print_result, synthetic_readings
+
+
+def import_cost(module):
+    """Cold import time of a module in a fresh interpreter (ms)"""
+    code = f"import time; t = time.perf_counter(); import {module}; print((time.perf_counter() - t) * 1000)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return float(out.stdout.strip())
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    import pandas as pd
+
+    model_service = ensure_model()
+    model = model_service.model
+    readings = [dict(zip(model_service.FEATURE_ORDER, row)) for row in synthetic_readings(1024, seed=3).tolist()]
+    position = [0]
+
+    def next_reading():
+        position[0] = (position[0] + 1) % len(readings)
+        return readings[position[0]]
+
+    def dataframe_path():
+        # Previous implementation: one DataFrame per reading
+        reading = next_reading()
+        df = pd.DataFrame({name: [float(reading[name])] for name in model_service.FEATURE_ORDER})
+        return model.predict(df)[0]
+
+    def numpy_path():
+        return model_service.predict_disease(next_reading())
+
+    print_result("before: DataFrame + predict", measure(dataframe_path, iterations))
+    print_result("after: preallocated ndarray", measure(numpy_path, iterations))
+    print(f"{'cold import pandas':<40} {import_cost('pandas'):.1f}ms")
+    print(f"{'cold import numpy':<40} {import_cost('numpy'):.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Whole-night analysis latency: windowed features + one batched classification
+
+Usage:
+    python benchmarks/bench_sleep_pipeline.py [sample_rate_hz]
+"""
+
+import sys
+
+import numpy as np
+
+from common import ensure_model, measure, print_result, synthetic_readings
+
+NIGHT = 8 * 3600
+
+
+def main():
+    rate = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    ensure_model()
+    from sleep_pipeline import analyze_night
+
+    n = int(NIGHT * rate)
+    ts = 1767225600 + np.arange(n) / rate
+    values = synthetic_readings(n)
+    result = analyze_night(ts, values)
+    print(f"{n} samples at {rate} Hz -> {result['summary']['epochs']} epochs, "
+          f"dominant: {result['summary']['dominant_condition']}")
+    print_result("analyze_night (8 h)", measure(lambda: analyze_night(ts, values), 10, warmup=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Firebase upstream gate: request coalescing and load shedding
+
+Runs the server against the Firebase stub (fixed response latency) with
+the ingest worker and local store disabled, so every request goes to
+Firebase, and drives it with N concurrent dashboard clients.
+
+  - coalescing: every client polls the same latest/history URLs, with the
+    gate's coalescing off and on; reports upstream calls per request
+  - slow upstream: each client polls its own history limit (so nothing
+    coalesces) from a stub answering in `slow_latency`, with an unbounded
+    and a small in-flight budget; reports how fast callers get an answer
+    and how many were served stale or shed (clients retry immediately)
+
+Usage:
+    python benchmarks/bench_upstream_gate.py [concurrency] [seconds] [mode] [stub_latency] [slow_latency]
+    e.g. python benchmarks/bench_upstream_gate.py 50 10 async 0.05 1.0
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+
+import aiohttp
+import numpy as np
+
+from bench_async_server import wait_for
+from common import BACKEND_DIR
+from firebase_stub import FirebaseStub, synthetic_history
+
+SERVER_PORT = 9412
+SHARED = ["/api/sensor/latest", "/api/sensor/history?limit=100"]
+
+
+def start_server(mode, stub_url, scratch, **settings):
+    env = dict(
+        os.environ,
+        PORT=str(SERVER_PORT),
+        SERVER_MODE=mode,
+        FIREBASE_DATABASE_URL=stub_url,
+        SENSOR_INGEST="0",
+        SENSOR_STORE="0",
+        SLEEP_SUMMARY_PATH=os.path.join(scratch, "summaries.json"),
+        PREDICTION_CACHE_SIZE="0",
+        **settings,
+    )
+    proc = subprocess.Popen([sys.executable, "app.py"], cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for(f"http://127.0.0.1:{SERVER_PORT}/health")
+    return proc
+
+
+async def drive(base_url, paths, concurrency, seconds):
+    """Closed-loop clients, client i polling paths[i % len(paths)]"""
+    latencies, statuses = [], {}
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + seconds
+    async with aiohttp.ClientSession(base_url, connector=aiohttp.TCPConnector(limit=concurrency),
+                                     timeout=aiohttp.ClientTimeout(total=60)) as client:
+        async def worker(path):
+            while loop.time() < deadline:
+                start = loop.time()
+                async with client.get(path) as response:
+                    body = await response.read()
+                latencies.append(loop.time() - start)
+                status = "stale" if response.status == 200 and b'"stale":true' in body else response.status
+                statuses[status] = statuses.get(status, 0) + 1
+
+        await asyncio.gather(*(worker(paths[i % len(paths)]) for i in range(concurrency)))
+    return np.array(latencies) * 1000, statuses
+
+
+def run(stub, mode, scratch, paths, concurrency, seconds, **settings):
+    server = start_server(mode, stub.url, scratch, **settings)
+    try:
+        base_url = f"http://127.0.0.1:{SERVER_PORT}"
+        asyncio.run(drive(base_url, paths, min(concurrency, 4), 1.0))
+        before = stub.requests
+        ms, statuses = asyncio.run(drive(base_url, paths, concurrency, seconds))
+        upstream = stub.requests - before
+    finally:
+        server.terminate()
+        server.wait()
+    return ms, statuses, upstream
+
+
+def report(label, seconds, ms, statuses, upstream):
+    print(f"{label:<24} {len(ms) / seconds:>8.0f} {np.percentile(ms, 50):>8.1f} {np.percentile(ms, 99):>8.1f} "
+          f"{upstream / max(len(ms), 1):>10.3f}   {dict(sorted(statuses.items(), key=str))}")
+
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+    mode = sys.argv[3] if len(sys.argv) > 3 else "sync"
+    latency = float(sys.argv[4]) if len(sys.argv) > 4 else 0.05
+    slow_latency = float(sys.argv[5]) if len(sys.argv) > 5 else 1.0
+
+    history = synthetic_history(3600)
+    stub = FirebaseStub({"sensorData": history[max(history)], "sensor_data": history},
+                        port=9411, latency=latency).start()
+    scratch = tempfile.mkdtemp(prefix="bench-gate-")
+    header = f"{'':<24} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'upstream/req':>10}   responses"
+    try:
+        print(f"Coalescing: {concurrency} clients, {mode} server, stub latency {latency * 1000:.0f} ms")
+        print(header)
+        for coalesce in ("0", "1"):
+            results = run(stub, mode, scratch, SHARED, concurrency, seconds,
+                          FIREBASE_COALESCE=coalesce, FIREBASE_MAX_IN_FLIGHT="100000")
+            report(f"coalescing {'on' if coalesce == '1' else 'off'}", seconds, *results)
+
+        stub.latency = slow_latency
+        distinct = [f"/api/sensor/history?limit={n}" for n in range(10, 10 + concurrency)]
+        print(f"\nSlow upstream: {concurrency} clients on distinct URLs, stub latency {slow_latency * 1000:.0f} ms")
+        print(header)
+        for budget in ("100000", "8"):
+            results = run(stub, mode, scratch, distinct, concurrency, seconds, FIREBASE_MAX_IN_FLIGHT=budget)
+            report("unbounded" if budget == "100000" else f"budget {budget}", seconds, *results)
+    finally:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
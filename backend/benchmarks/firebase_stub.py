@@ -0,0 +1,218 @@
+"""
+Local stand-in for the Firebase Realtime Database REST API
+
+Serves an in-memory JSON tree over HTTP with the query parameters the
+backend uses: shallow, orderBy="$key", startAt, endAt, limitToFirst and
+limitToLast. Point the backend at it with FIREBASE_DATABASE_URL.
+
+Usage:
+    python benchmarks/firebase_stub.py [port] [latency_seconds] [devices]
+"""
+
+import bisect
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many clients connect at once under load; the default backlog of 5 drops SYNs
+    request_queue_size = 1024
+
+
+class FirebaseStub:
+    """In-memory database tree served by a background HTTP server"""
+
+    def __init__(self, tree=None, host="127.0.0.1", port=0, latency=0.0):
+        self.tree = tree if tree is not None else {}
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._sorted_keys = {}
+        self._server = _Server((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="firebase-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def node(self, path):
+        """Value stored at a slash-separated path (None if missing)"""
+        node = self.tree
+        for part in [p for p in path.split("/") if p]:
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+    def set(self, path, value):
+        """Write a value at a path, creating parents"""
+        parts = [p for p in path.split("/") if p]
+        with self._lock:
+            node = self.tree
+            for part in parts[:-1]:
+                node = node.setdefault(part, {})
+            if parts:
+                replaced = node.get(parts[-1])
+                node[parts[-1]] = value
+            else:
+                replaced, self.tree = self.tree, value
+            # Sorted keys are cached by node id; drop those of the replaced subtree.
+            # Parents that gained a key are re-sorted when their length no longer matches.
+            self._forget(replaced)
+
+    def _forget(self, node):
+        if isinstance(node, dict) and self._sorted_keys:
+            self._sorted_keys.pop(id(node), None)
+            for child in node.values():
+                self._forget(child)
+
+    def push(self, path, key, value):
+        """Add one child under a path (keeps the sorted-key index current)"""
+        self.push_many(path, [(key, value)])
+
+    def push_many(self, path, items):
+        """Add several (key, value) children under a path in one locked pass"""
+        with self._lock:
+            node = self.tree
+            for part in [p for p in path.split("/") if p]:
+                node = node.setdefault(part, {})
+            cached = self._sorted_keys.get(id(node))
+            for key, value in items:
+                if key not in node and cached is not None:
+                    bisect.insort(cached, key)
+                node[key] = value
+
+    def _keys(self, node):
+        with self._lock:
+            keys = self._sorted_keys.get(id(node))
+            if keys is None or len(keys) != len(node):
+                keys = self._sorted_keys[id(node)] = sorted(node)
+            return keys
+
+    def query(self, path, params):
+        """Apply Firebase REST query semantics to the node at path"""
+        node = self.node(path)
+        if params.get("shallow") == "true" and isinstance(node, dict):
+            return {k: True if isinstance(v, (dict, list)) else v for k, v in node.items()}
+        if not isinstance(node, dict) or "orderBy" not in params:
+            return node
+
+        keys = self._keys(node)
+        lo, hi = 0, len(keys)
+        if "startAt" in params:
+            lo = bisect.bisect_left(keys, json.loads(params["startAt"]))
+        if "endAt" in params:
+            hi = bisect.bisect_right(keys, json.loads(params["endAt"]))
+        if "limitToFirst" in params:
+            hi = min(hi, lo + int(params["limitToFirst"]))
+        if "limitToLast" in params:
+            lo = max(lo, hi - int(params["limitToLast"]))
+        return {k: node[k] for k in keys[lo:hi]}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; don't let Nagle hold back the body
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                parsed = urlparse(self.path)
+                path = parsed.path[:-len(".json")] if parsed.path.endswith(".json") else parsed.path
+                params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+                body = json.dumps(stub.query(path, params)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def sensor_payload(bpm=64.0, gx=0.0, gy=0.0, gz=0.0, temperature=36.5):
+    """One reading in the nested sensorData shape"""
+    return {
+        "MAX30102": {"bpm": round(bpm, 1)},
+        "MPU6050": {"gyro": {"x": round(gx, 3), "y": round(gy, 3), "z": round(gz, 3)}},
+        "DHT": {"temperature": round(temperature, 1)}
+    }
+
+
+def synthetic_history(n, start_ts=1767225600, period=1, seed=0):
+    """
+    n readings keyed by 10-digit epoch seconds, as stored under sensor_data
+
+    Returns:
+        dict: key -> nested payload
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    bpm = rng.normal(62, 6, n)
+    gyro = rng.normal(0, 0.3, (n, 3))
+    temp = rng.normal(36.4, 0.2, n)
+    return {
+        str(start_ts + i * period): sensor_payload(bpm[i], *gyro[i], temp[i])
+        for i in range(n)
+    }
+
+
+def synthetic_devices(n, readings=300):
+    """
+    n devices in the multi-device layout, each with its own history
+
+    Returns:
+        dict: device id -> {"sensorData": latest, "sensor_data": history}
+    """
+    devices = {}
+    for i in range(n):
+        history = synthetic_history(readings, seed=i + 1)
+        devices[f"bed-{i:03d}"] = {"sensorData": history[max(history)], "sensor_data": history}
+    return devices
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 9000
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    devices = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    history = synthetic_history(3600)
+    latest = history[max(history)]
+    tree = {"sensorData": latest, "sensor_data": history}
+    if devices:
+        tree["devices"] = synthetic_devices(devices)
+    stub = FirebaseStub(tree, port=port, latency=latency).start()
+    print(f"Firebase stub serving on {stub.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
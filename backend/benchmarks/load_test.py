@@ -0,0 +1,262 @@
+"""
+Load test of the sensor and prediction routes against simulated devices
+
+Starts the sensor simulator (a Firebase stub fed with live readings from
+--devices devices at --rate times real time) and the backend pointed at it,
+then drives a weighted mix of requests for --duration seconds at each
+concurrency level and reports throughput and tail latency per endpoint.
+
+Closed loop by default: each client sends its next request as soon as the
+last one returns. With --rps, requests are sent at a fixed rate instead and
+latency is measured from when each request was due, so a stalled server
+shows up in the tail rather than as fewer requests.
+
+Usage:
+    python benchmarks/load_test.py [--concurrency 10,50] [--duration 20] [--devices 10] [--rate 60]
+                                   [--mix latest=4,predict=4,history=1,range=1,device_latest=2]
+                                   [--mode sync|async] [--rps N] [--backend URL] [--output results.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+import numpy as np
+
+from bench_async_server import wait_for
+from common import BACKEND_DIR
+from run_suite import git_revision
+
+SIMULATOR_PORT = 9411
+SERVER_PORT = 9412
+BACKFILL = 3600
+DEFAULT_MIX = "latest=4,predict=4,history=1,range=1,device_latest=2"
+
+
+class RequestMix:
+    """Weighted endpoint choice; each request gets fresh parameters"""
+
+    def __init__(self, spec, devices, start_ts, seed=0):
+        self.weights = {}
+        for part in spec.split(","):
+            name, _, weight = part.partition("=")
+            if not hasattr(self, f"_{name}"):
+                raise ValueError(f"Unknown endpoint {name!r} in --mix")
+            self.weights[name] = float(weight or 1)
+        self.devices = devices
+        self.start_ts = start_ts
+        self.rng = random.Random(seed)
+
+    def next(self):
+        """(name, method, path, json body)"""
+        name = self.rng.choices(list(self.weights), weights=list(self.weights.values()))[0]
+        return (name,) + getattr(self, f"_{name}")()
+
+    def _device(self):
+        return f"bed-{self.rng.randrange(self.devices):03d}"
+
+    def _latest(self):
+        return "GET", "/api/sensor/latest", None
+
+    def _history(self):
+        return "GET", "/api/sensor/history?limit=100", None
+
+    def _range(self):
+        # A 10-minute window of the backfilled history
+        start = self.start_ts - self.rng.randrange(600, BACKFILL)
+        return "GET", f"/api/sensor/range?start={start}&end={start + 599}", None
+
+    def _chart(self):
+        return "GET", f"/api/sensor/range?start={self.start_ts - BACKFILL}&end={self.start_ts}&max_points=200", None
+
+    def _predict(self):
+        reading = {"bvp": self.rng.gauss(62, 8), "acc_x": self.rng.gauss(0, 0.3), "acc_y": self.rng.gauss(0, 0.3),
+                   "acc_z": self.rng.gauss(0, 0.3), "temp": self.rng.gauss(36.5, 0.3)}
+        return "POST", "/predict", reading
+
+    def _device_latest(self):
+        return "GET", f"/api/devices/{self._device()}/latest", None
+
+    def _device_history(self):
+        return "GET", f"/api/devices/{self._device()}/history?limit=50", None
+
+
+async def drive(base_url, mix, concurrency, seconds, rps=None):
+    """
+    Send requests for `seconds`
+
+    Returns:
+        dict: endpoint -> (latencies in seconds, error count)
+    """
+    samples = {name: ([], [0]) for name in mix.weights}
+    deadline = time.perf_counter() + seconds
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=30)
+
+    async with aiohttp.ClientSession(base_url, connector=connector, timeout=timeout) as client:
+        async def send(request, due):
+            name, method, path, body = request
+            latencies, errors = samples[name]
+            try:
+                async with client.request(method, path, json=body) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors[0] += 1
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                errors[0] += 1
+            latencies.append(time.perf_counter() - due)
+
+        if rps is None:
+            async def client_loop():
+                while time.perf_counter() < deadline:
+                    await send(mix.next(), time.perf_counter())
+
+            await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+        else:
+            slots = asyncio.Semaphore(concurrency)
+            pending = set()
+            started = time.perf_counter()
+
+            async def scheduled(request, due):
+                async with slots:
+                    await send(request, due)
+
+            k = 0
+            while True:
+                due = started + k / rps
+                if due >= deadline:
+                    break
+                await asyncio.sleep(max(0.0, due - time.perf_counter()))
+                task = asyncio.create_task(scheduled(mix.next(), due))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                k += 1
+            await asyncio.gather(*pending)
+    return samples
+
+
+def summarize(samples, seconds):
+    results = {}
+    for name, (latencies, errors) in list(samples.items()) + [("total", _combined(samples))]:
+        ms = np.array(latencies) * 1000
+        results[name] = {
+            "requests": len(ms),
+            "errors": errors[0],
+            "rps": round(len(ms) / seconds, 1),
+            "p50_ms": round(float(np.percentile(ms, 50)), 2) if len(ms) else None,
+            "p95_ms": round(float(np.percentile(ms, 95)), 2) if len(ms) else None,
+            "p99_ms": round(float(np.percentile(ms, 99)), 2) if len(ms) else None,
+            "max_ms": round(float(ms.max()), 2) if len(ms) else None,
+        }
+    return results
+
+
+def _combined(samples):
+    latencies = [x for values, _ in samples.values() for x in values]
+    return latencies, [sum(errors[0] for _, errors in samples.values())]
+
+
+def start_processes(args, start_ts, scratch):
+    log = open(os.path.join(scratch, "simulator.log"), "w")
+    simulator = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, "benchmarks", "sensor_simulator.py"),
+         "--port", str(SIMULATOR_PORT), "--devices", str(args.devices), "--rate", str(args.rate),
+         "--backfill", str(BACKFILL), "--start-ts", str(start_ts), "--latency", str(args.latency)]
+        + (["--replay", args.replay] if args.replay else []),
+        stdout=log, stderr=subprocess.STDOUT)
+    stub_url = f"http://127.0.0.1:{SIMULATOR_PORT}"
+    wait_for(f"{stub_url}/.json?shallow=true")
+
+    env = dict(
+        os.environ,
+        PORT=str(SERVER_PORT),
+        SERVER_MODE=args.mode,
+        FIREBASE_DATABASE_URL=stub_url,
+        SENSOR_STORE_PATH=os.path.join(scratch, "sensor_history.db"),
+        SLEEP_SUMMARY_PATH=os.path.join(scratch, "summaries.json"),
+        SENSOR_POLL_INTERVAL="1",
+    )
+    server = subprocess.Popen([sys.executable, "app.py"], cwd=BACKEND_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{SERVER_PORT}"
+    wait_for(f"{base_url}/ready", timeout=120)
+    return simulator, server, base_url, log.name
+
+
+def last_simulator_stats(path):
+    with open(path) as f:
+        lines = [line for line in f if line.startswith("[Simulator]")]
+    return lines[-1].split(" ", 1)[1].strip() if lines else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test against simulated sensor devices")
+    parser.add_argument("--concurrency", default="10,50", help="Comma-separated client counts")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per concurrency level")
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=60.0, help="Simulated seconds per real second")
+    parser.add_argument("--latency", type=float, default=0.0, help="Firebase stub response latency (seconds)")
+    parser.add_argument("--replay", help="Recorded night to replay instead of synthetic readings")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help="endpoint=weight list; endpoints: latest, history, range, chart, predict, "
+                             "device_latest, device_history")
+    parser.add_argument("--mode", default="sync", choices=("sync", "async"), help="Backend SERVER_MODE")
+    parser.add_argument("--rps", type=float, help="Open-loop request rate instead of closed-loop clients")
+    parser.add_argument("--backend", help="URL of an already running backend (skips starting one)")
+    parser.add_argument("--start-ts", type=int, help="Start of the live readings (with --backend)")
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="load-test-")
+    start_ts = args.start_ts or int(time.time())
+    processes, log_path = [], None
+    if args.backend:
+        base_url = args.backend
+    else:
+        simulator, server, base_url, log_path = start_processes(args, start_ts, scratch)
+        processes = [server, simulator]
+
+    runs = []
+    try:
+        # Warm up connections, model and ingest before measuring
+        asyncio.run(drive(base_url, RequestMix(args.mix, args.devices, start_ts), 4, 2.0))
+        print(f"{args.devices} devices at {args.rate:g}x, mode {args.mode}, mix {args.mix}"
+              + (f", {args.rps:g} req/s open loop" if args.rps else ""))
+        print(f"{'clients':>7} {'endpoint':<16} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'p99 ms':>8} {'max ms':>8} {'errors':>7}")
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            mix = RequestMix(args.mix, args.devices, start_ts, seed=concurrency)
+            samples = asyncio.run(drive(base_url, mix, concurrency, args.duration, args.rps))
+            results = summarize(samples, args.duration)
+            runs.append({"concurrency": concurrency, "endpoints": results})
+            for name, r in results.items():
+                if r["requests"]:
+                    print(f"{concurrency:>7} {name:<16} {r['requests']:>9} {r['rps']:>8.1f} {r['p50_ms']:>8.1f} "
+                          f"{r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['max_ms']:>8.1f} {r['errors']:>7}")
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    simulator_stats = last_simulator_stats(log_path) if log_path else None
+    if simulator_stats:
+        print(f"Simulator: {simulator_stats}")
+    if args.output:
+        commit, dirty = git_revision()
+        meta = {key: getattr(args, key) for key in ("devices", "rate", "mode", "mix", "duration", "rps", "replay")}
+        meta.update(commit=commit, dirty=dirty, timestamp=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    cpus=os.cpu_count(), simulator=simulator_stats)
+        with open(args.output, "w") as f:
+            json.dump({"meta": meta, "runs": runs}, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
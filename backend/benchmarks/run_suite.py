@@ -0,0 +1,184 @@
+"""
+Benchmark suite for the backend hot paths, with JSON results for comparing commits
+
+Cases:
+  - predict_disease on single readings and predict_batch on 32/512 rows
+  - GET /api/sensor/latest end-to-end against a local Firebase stub
+  - GET /api/sensor/history at several limits, from the local store and from Firebase
+  - POST /api/diet-recommendation
+Routes are driven in-process through the Flask test client; Firebase is a
+real HTTP stub seeded with a synthetic night. The model the service loads
+is used, or a synthetic forest of the production shape when it is absent.
+
+Each case reports p50/p95/p99 latency (ms) and ops/s. Results are written
+to data/benchmarks/<commit>.json unless --output is given, and --compare
+prints the change against an earlier results file.
+
+Usage:
+    python benchmarks/run_suite.py [--iterations N] [--only name,...] [--output path]
+                                   [--compare baseline.json] [--threshold 0.1]
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import BACKEND_DIR, ensure_model, measure, print_result, synthetic_readings
+from firebase_stub import FirebaseStub, synthetic_history
+
+HISTORY_READINGS = 3600
+HISTORY_LIMITS = (10, 100, 1000)
+RESULTS_DIR = os.path.join(BACKEND_DIR, 'data', 'benchmarks')
+
+
+def git_revision():
+    """Current commit and whether the tree has uncommitted changes"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIR,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", None
+    return commit, dirty
+
+
+def start_environment():
+    """
+    Start the Firebase stub and point the backend at it and at a scratch data
+    directory. Must run before the backend modules are imported.
+    """
+    history = synthetic_history(HISTORY_READINGS)
+    stub = FirebaseStub({"sensorData": history[max(history)], "sensor_data": history}).start()
+    scratch = tempfile.mkdtemp(prefix="bench-suite-")
+    os.environ.update(
+        FIREBASE_DATABASE_URL=stub.url,
+        SENSOR_INGEST="0",
+        SENSOR_STORE_PATH=os.path.join(scratch, "sensor_history.db"),
+        SLEEP_SUMMARY_PATH=os.path.join(scratch, "summaries.json"),
+        PREDICTION_CACHE_SIZE="0",
+    )
+    return stub
+
+
+def build_cases(model_service, app_module):
+    """Case name -> (callable, rows per call)"""
+    client = app_module.app.test_client()
+    readings = [dict(zip(model_service.FEATURE_ORDER, row)) for row in synthetic_readings(1024, seed=3).tolist()]
+    batch_32, batch_512 = readings[:32], readings[:512]
+    position = [0]
+
+    def single():
+        position[0] = (position[0] + 1) % len(readings)
+        return model_service.predict_disease(readings[position[0]])
+
+    def get(url, store):
+        def call():
+            app_module.STORE_ENABLED = store
+            response = client.get(url)
+            response.get_data()
+            if response.status_code != 200:
+                raise RuntimeError(f"GET {url} returned {response.status_code}")
+        return call
+
+    def diet():
+        response = client.post("/api/diet-recommendation", json={"dosha": "pitta", "disorder": "Insomnia"})
+        if response.status_code != 200:
+            raise RuntimeError(f"diet recommendation returned {response.status_code}")
+
+    cases = {
+        "predict_single": (single, 1),
+        "predict_batch_32": (lambda: model_service.predict_batch(batch_32), 32),
+        "predict_batch_512": (lambda: model_service.predict_batch(batch_512), 512),
+        "sensor_latest_firebase": (get("/api/sensor/latest", False), 1),
+    }
+    for limit in HISTORY_LIMITS:
+        cases[f"sensor_history_store_{limit}"] = (get(f"/api/sensor/history?limit={limit}", True), limit)
+        cases[f"sensor_history_firebase_{limit}"] = (get(f"/api/sensor/history?limit={limit}", False), limit)
+    cases["diet_recommendation"] = (diet, 1)
+    return cases
+
+
+def compare(results, baseline_path, threshold):
+    """Print the p50/ops change per case against a baseline file; returns the regressed cases"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nAgainst {baseline['meta'].get('commit')} ({baseline_path}):")
+    regressed = []
+    for name, stats in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<40} (new)")
+            continue
+        change = stats["p50_ms"] / before["p50_ms"] - 1.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressed.append(name)
+        print(f"{name:<40} p50 {before['p50_ms']:.3f} -> {stats['p50_ms']:.3f}ms ({change:+.1%}) "
+              f"ops/s {before['ops_per_sec']:.0f} -> {stats['ops_per_sec']:.0f}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend hot-path benchmark suite")
+    parser.add_argument("--iterations", type=int, default=500, help="Timed calls per case")
+    parser.add_argument("--only", help="Comma-separated case names (prefixes match)")
+    parser.add_argument("--output", help="Results file (default data/benchmarks/<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative p50 increase reported as a regression (exit status 1)")
+    args = parser.parse_args()
+
+    stub = start_environment()
+    try:
+        import app as app_module
+        import model_service
+
+        if model_service.registry.get() is None:
+            ensure_model()
+        version = model_service.registry.get()
+        cases = build_cases(model_service, app_module)
+        if args.only:
+            prefixes = args.only.split(",")
+            cases = {name: case for name, case in cases.items() if name.startswith(tuple(prefixes))}
+
+        results = {}
+        for name, (fn, rows) in cases.items():
+            results[name] = measure(fn, iterations=args.iterations, warmup=min(50, args.iterations),
+                                    rows_per_call=rows)
+            print_result(name, results[name])
+    finally:
+        stub.stop()
+
+    import numpy as np
+    commit, dirty = git_revision()
+    meta = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "model": version.source if version is not None else None,
+        "iterations": args.iterations,
+        "history_readings": HISTORY_READINGS,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+    print(f"\nWrote {output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Sensor stream simulator for load testing
+
+Feeds a FirebaseStub with live readings from any number of simulated
+bedside devices, in the nested MAX30102/MPU6050/DHT shape the backend reads,
+at 1x to 1000x real time. Each reading is appended to the device's
+sensor_data history and replaces its sensorData latest value, under
+devices/<id>/ (device 0 is mirrored at the root-level paths too).
+
+Readings come either from a synthetic night (90-minute sleep cycles with
+stage-dependent heart rate and motion, movement bursts, a temperature dip
+and sensor dropouts) or from a recorded night replayed from a sensor store
+database or a Firebase JSON export.
+
+Usage:
+    python benchmarks/sensor_simulator.py [--port 9411] [--devices 10] [--rate 60]
+                                          [--latency 0] [--backfill 3600] [--replay night.db|night.json]
+"""
+
+import argparse
+import json
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from firebase_stub import FirebaseStub, sensor_payload
+
+# Seconds of simulated time emitted per device per tick at most, so a
+# simulator that falls behind catches up gradually instead of stalling
+MAX_CATCH_UP = 600
+CYCLE_SECONDS = 5400
+AWAKE, LIGHT, DEEP, REM = range(4)
+# Sleep stage by position in the cycle: (cycle fraction it ends at, stage)
+STAGES = ((0.35, LIGHT), (0.60, DEEP), (0.75, LIGHT), (1.0, REM))
+# Heart rate offset from resting (bpm) and gyro standard deviation, indexed by stage
+STAGE_BPM = np.array([10.0, 0.0, -6.0, 4.0])
+STAGE_MOTION = np.array([0.35, 0.05, 0.02, 0.03])
+# Seconds awake before sleep onset
+SLEEP_ONSET = 15 * 60
+
+
+class SyntheticNight:
+    """Deterministic synthetic readings for one device, one per simulated second"""
+
+    def __init__(self, seed):
+        self.rng = np.random.default_rng(seed)
+        self.resting_bpm = self.rng.normal(60, 5)
+        self.phase = self.rng.uniform(0, CYCLE_SECONDS)
+        self.burst_until = -1.0
+
+    def _stages(self, t):
+        position = ((t - SLEEP_ONSET + self.phase) % CYCLE_SECONDS) / CYCLE_SECONDS
+        bounds = np.array([upper for upper, _ in STAGES])
+        stages = np.array([stage for _, stage in STAGES])[np.minimum(np.searchsorted(bounds, position, side="right"),
+                                                                      len(STAGES) - 1)]
+        stages[t < SLEEP_ONSET] = AWAKE
+        return stages
+
+    def readings(self, t):
+        """
+        Payloads for night offsets t (seconds)
+
+        Returns:
+            list: Nested sensor payloads
+        """
+        n = len(t)
+        stages = self._stages(t)
+        bpm = self.resting_bpm + STAGE_BPM[stages] + self.rng.normal(0, 2, n)
+        motion = STAGE_MOTION[stages]
+
+        # Movement bursts of 5-20 s that raise motion and heart rate
+        moving = t <= self.burst_until
+        for i in np.flatnonzero(self.rng.random(n) < 0.002):
+            self.burst_until = max(self.burst_until, t[i] + self.rng.uniform(5, 20))
+            moving |= (t >= t[i]) & (t <= self.burst_until)
+        motion = np.where(moving, 0.8, motion)
+        bpm = bpm + np.where(moving, 8.0, 0.0)
+        gyro = self.rng.normal(0, 1, (n, 3)) * motion[:, None]
+
+        # Core temperature dips ~0.4 C over the first half of the night
+        temp = 36.7 - 0.4 * np.sin(np.clip(t / 28800.0, 0, 1) * np.pi) + self.rng.normal(0, 0.05, n)
+        # The pulse sensor occasionally loses contact and reports 0
+        bpm = np.where(self.rng.random(n) < 0.001, 0.0, bpm)
+        return [sensor_payload(bpm[i], *gyro[i], temp[i]) for i in range(n)]
+
+
+class ReplayNight:
+    """
+    A recorded night, replayed by offset from its first reading
+
+    Loops when the simulation runs past the end of the recording.
+    """
+
+    def __init__(self, path, shift=0):
+        offsets, payloads = self.load(path)
+        self.length = offsets[-1] + 1 if offsets else 1
+        self.shift = shift
+        # Latest payload at or before each whole second of the recording
+        self._payloads = payloads
+        self._index = np.searchsorted(np.array(offsets), np.arange(int(self.length)), side="right") - 1
+
+    @staticmethod
+    def load(path):
+        """(offsets, payloads) from a sensor store database or a JSON export of sensor_data"""
+        if path.endswith(".json"):
+            with open(path) as f:
+                data = json.load(f)
+            # Accept a whole database export as well as the sensor_data node itself
+            data = data.get("sensor_data", data)
+            entries = [(float(k), v) for k, v in data.items() if k.replace(".", "", 1).isdigit()]
+        else:
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            entries = [(ts, json.loads(payload)) for ts, payload in
+                       conn.execute("SELECT ts, payload FROM readings WHERE ts IS NOT NULL ORDER BY ts")]
+            conn.close()
+        if not entries:
+            raise ValueError(f"No timestamped readings in {path}")
+        entries.sort(key=lambda entry: entry[0])
+        start = entries[0][0]
+        return [int(ts - start) for ts, _ in entries], [payload for _, payload in entries]
+
+    def readings(self, t):
+        positions = ((t + self.shift) % self.length).astype(np.int64)
+        return [self._payloads[max(0, self._index[p])] for p in positions]
+
+
+class SensorSimulator:
+    """
+    Background thread that emits every device's readings into a FirebaseStub
+    as simulated time advances `rate` times faster than real time
+    """
+
+    def __init__(self, stub, devices=10, rate=1.0, replay=None, backfill=0, tick=0.05, start_ts=None, seed=0):
+        """
+        Args:
+            stub (FirebaseStub): Database to write to
+            devices (int): Simulated devices
+            rate (float): Simulated seconds per real second
+            replay (str): Recording to replay instead of synthetic nights
+            backfill (int): Seconds of history written by backfill() before the live readings
+            tick (float): Real seconds between writes
+            start_ts (float): Epoch seconds of the first live reading (default now)
+            seed (int): Seed of the synthetic nights
+        """
+        self.stub = stub
+        self.rate = rate
+        self.tick = tick
+        self.backfill_seconds = int(backfill)
+        self.start_ts = int(start_ts if start_ts is not None else time.time())
+        self.device_ids = [f"bed-{i:03d}" for i in range(devices)]
+        if replay:
+            # Devices replay the same night from staggered starting points
+            self.sources = [ReplayNight(replay, shift=i * 997) for i in range(devices)]
+        else:
+            self.sources = [SyntheticNight(seed + i) for i in range(devices)]
+        self.emitted = 0
+        self.sim_seconds = 0
+        self.lag_seconds = 0.0
+        self._thread = None
+        self._stop = threading.Event()
+
+    def backfill(self):
+        """Write the backfill history, keyed just before start_ts"""
+        self._emit(-self.backfill_seconds, 0)
+
+    def _emit(self, first, last):
+        """Readings for simulated offsets first <= t < last (from start_ts) on every device"""
+        if last <= first:
+            return
+        t = np.arange(first, last, dtype=np.float64)
+        keys = [str(self.start_ts + int(offset)) for offset in t]
+        # Nights begin with the backfill
+        night = t + self.backfill_seconds
+        for i, (device, source) in enumerate(zip(self.device_ids, self.sources)):
+            payloads = source.readings(night)
+            items = list(zip(keys, payloads))
+            self.stub.push_many(f"devices/{device}/sensor_data", items)
+            self.stub.set(f"devices/{device}/sensorData", payloads[-1])
+            if i == 0:
+                self.stub.push_many("sensor_data", items)
+                self.stub.set("sensorData", payloads[-1])
+            self.emitted += len(items)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sensor-simulator", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        started = time.monotonic()
+        while not self._stop.wait(self.tick):
+            target = int((time.monotonic() - started) * self.rate)
+            upto = min(target, self.sim_seconds + MAX_CATCH_UP)
+            self._emit(self.sim_seconds, upto)
+            self.sim_seconds = upto
+            self.lag_seconds = (target - upto) / self.rate
+
+    def stats(self):
+        return {
+            "devices": len(self.device_ids),
+            "rate": self.rate,
+            "simulated_seconds": self.sim_seconds,
+            "readings": self.emitted,
+            "lag_seconds": round(self.lag_seconds, 2),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Firebase stub fed by simulated bedside devices")
+    parser.add_argument("--port", type=int, default=9411)
+    parser.add_argument("--devices", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=1.0, help="Simulated seconds per real second (1-1000)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Stub response latency (seconds)")
+    parser.add_argument("--backfill", type=int, default=3600, help="Seconds of history per device at start")
+    parser.add_argument("--replay", help="Sensor store .db or sensor_data .json export to replay")
+    parser.add_argument("--start-ts", type=float, help="Epoch seconds of the first live reading (default now)")
+    args = parser.parse_args()
+
+    stub = FirebaseStub(port=args.port, latency=args.latency).start()
+    simulator = SensorSimulator(stub, devices=args.devices, rate=args.rate, replay=args.replay,
+                                backfill=args.backfill, start_ts=args.start_ts)
+    simulator.backfill()
+    simulator.start()
+    print(f"Firebase stub serving on {stub.url}: {args.devices} devices at {args.rate:g}x, "
+          f"{args.backfill}s backfilled", flush=True)
+    try:
+        while True:
+            time.sleep(5)
+            print(f"[Simulator] {simulator.stats()}", flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Compiled Random Forest Module
+Flattens a fitted scikit-learn random forest into packed NumPy node arrays
+and evaluates every tree with vectorized traversal
+"""
+
+import numpy as np
+
+# Rows evaluated per chunk; bounds the (rows, trees, classes) leaf buffer
+CHUNK_ROWS = 4096
+
+
+class CompiledForest:
+    """
+    Array-backed random forest classifier
+
+    All trees share one set of node arrays. Leaves point back to themselves
+    with an infinite threshold, so every row can walk exactly ``max_depth``
+    steps without branching on leaf checks.
+    """
+
+    def __init__(self, children_left, children_right, feature, threshold, missing_go_to_left,
+                 leaf_proba, roots, max_depth, classes, feature_names=None, n_features=None):
+        self.children_left = children_left
+        self.children_right = children_right
+        self.feature = feature
+        self.threshold = threshold
+        self.missing_go_to_left = missing_go_to_left
+        self.leaf_proba = leaf_proba
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.classes_ = np.asarray(classes)
+        self.n_estimators = len(roots)
+        self.n_features_in_ = int(n_features) if n_features is not None else int(feature.max()) + 1
+        if feature_names is not None:
+            self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        """
+        Flatten a fitted RandomForestClassifier
+
+        Args:
+            forest: fitted sklearn.ensemble.RandomForestClassifier
+
+        Returns:
+            CompiledForest: equivalent array-based evaluator
+
+        Raises:
+            ValueError: if the estimator is not a single-output forest classifier
+        """
+        estimators = getattr(forest, "estimators_", None)
+        if not estimators or not hasattr(forest, "classes_"):
+            raise ValueError("Expected a fitted random forest classifier")
+        if getattr(forest, "n_outputs_", 1) != 1:
+            raise ValueError("Multi-output forests are not supported")
+
+        n_classes = len(forest.classes_)
+        left, right, feature, threshold, missing, proba, roots = [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+
+        for estimator in estimators:
+            tree = estimator.tree_
+            n = tree.node_count
+            is_leaf = tree.children_left == -1
+            own = np.arange(offset, offset + n, dtype=np.intp)
+
+            # Leaves loop onto themselves so extra traversal steps are no-ops
+            left.append(np.where(is_leaf, own, tree.children_left + offset).astype(np.intp))
+            right.append(np.where(is_leaf, own, tree.children_right + offset).astype(np.intp))
+            feature.append(np.where(is_leaf, 0, tree.feature).astype(np.intp))
+            threshold.append(np.where(is_leaf, np.inf, tree.threshold).astype(np.float64))
+
+            go_left = getattr(tree, "missing_go_to_left", None)
+            if go_left is None:
+                go_left = np.zeros(n, dtype=bool)
+            missing.append(np.where(is_leaf, True, np.asarray(go_left, dtype=bool)))
+
+            # scikit-learn >= 1.4 stores class fractions in tree_.value and returns
+            # them as-is; older versions store counts and normalise per call
+            values = tree.value[:, 0, :n_classes].astype(np.float64)
+            if not np.isclose(values[0].sum(), 1.0):
+                normalizer = values.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                values = values / normalizer
+            proba.append(values)
+
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n
+
+        return cls(
+            children_left=np.concatenate(left),
+            children_right=np.concatenate(right),
+            feature=np.concatenate(feature),
+            threshold=np.concatenate(threshold),
+            missing_go_to_left=np.concatenate(missing),
+            leaf_proba=np.ascontiguousarray(np.concatenate(proba)),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+            classes=forest.classes_,
+            feature_names=getattr(forest, "feature_names_in_", None),
+            n_features=getattr(forest, "n_features_in_", None),
+        )
+
+    @property
+    def node_count(self):
+        return len(self.feature)
+
+    def apply(self, X):
+        """
+        Leaf node index reached in every tree
+
+        Args:
+            X: (n_samples, n_features) array
+
+        Returns:
+            np.ndarray: (n_samples, n_estimators) global node indices
+        """
+        # sklearn evaluates splits on float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, np.newaxis]
+        # Node arrays may be stored narrower (int32, see model_artifact); indices
+        # are kept as intp because numpy converts narrower index arrays on every gather
+        nodes = np.broadcast_to(self.roots.astype(np.intp, copy=False), (len(X), self.n_estimators))
+        check_missing = bool(np.isnan(X).any())
+
+        for _ in range(self.max_depth):
+            values = X[rows, self.feature[nodes]]
+            go_left = values <= self.threshold[nodes]
+            if check_missing:
+                go_left |= np.isnan(values) & self.missing_go_to_left[nodes]
+            nodes = np.where(go_left, self.children_left[nodes], self.children_right[nodes]).astype(np.intp, copy=False)
+        return nodes
+
+    def predict_proba(self, X):
+        """Class probabilities averaged over trees, matching sklearn bit for bit"""
+        X = np.asarray(X)
+        if X.ndim != 2:
+            raise ValueError(f"Expected a 2D array, got shape {X.shape}")
+
+        out = np.empty((len(X), len(self.classes_)), dtype=np.float64)
+        for start in range(0, len(X), CHUNK_ROWS):
+            leaves = self.apply(X[start:start + CHUNK_ROWS])
+            # cumsum adds trees strictly in order, like sklearn's accumulation loop
+            out[start:start + CHUNK_ROWS] = np.cumsum(self.leaf_proba[leaves], axis=1)[:, -1]
+        out /= self.n_estimators
+        return out
+
+    def predict(self, X):
+        """Predicted class labels"""
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+def probe_inputs(compiled, n_random=2000, seed=0):
+    """
+    Inputs that exercise split boundaries: random rows around the training
+    range plus rows placed exactly on stored thresholds
+
+    Returns:
+        np.ndarray: (n, n_features) float64 probe matrix
+    """
+    rng = np.random.default_rng(seed)
+    internal = np.flatnonzero(np.isfinite(compiled.threshold))
+    n_features = int(compiled.feature.max()) + 1 if len(internal) else 1
+    if hasattr(compiled, "feature_names_in_"):
+        n_features = len(compiled.feature_names_in_)
+
+    lo = np.zeros(n_features)
+    hi = np.ones(n_features)
+    for j in range(n_features):
+        thresholds = compiled.threshold[internal[compiled.feature[internal] == j]]
+        if len(thresholds):
+            lo[j], hi[j] = thresholds.min(), thresholds.max()
+    span = np.maximum(hi - lo, 1e-6)
+
+    X = rng.uniform(lo - 0.1 * span, hi + 0.1 * span, size=(n_random, n_features))
+    if len(internal):
+        chosen = rng.choice(internal, size=min(n_random, len(internal)))
+        edges = X[:len(chosen)].copy()
+        edges[np.arange(len(chosen)), compiled.feature[chosen]] = compiled.threshold[chosen]
+        X = np.vstack([X, edges])
+    return X
+
+
+def verify_equivalence(forest, compiled, X=None):
+    """
+    Check that the compiled evaluator reproduces forest.predict exactly
+
+    Returns:
+        int: number of mismatching rows (0 means identical)
+    """
+    if X is None:
+        X = probe_inputs(compiled)
+    X = np.asarray(X, dtype=np.float64)
+    expected = forest.predict(X)
+    return int(np.count_nonzero(compiled.predict(X) != expected))
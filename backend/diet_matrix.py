@@ -1,4 +1,8 @@
 
+import json
+
+from frozen import freeze
+
 # Diet Matrix Data
 # Structure: DOSHA -> SLEEP_STATE_INDEX (0-4) -> { eat: [], avoid: [] }
 
@@ -78,3 +82,19 @@ SLEEP_STATE_MAP = {
     "Apnea-like pattern": 3,
     "Awake": 4
 }
+
+
+# Read-only: handlers share these across requests
+DIET_MATRIX = freeze(DIET_MATRIX)
+SLEEP_STATE_MAP = freeze(SLEEP_STATE_MAP)
+
+# Pre-serialized '"foods_to_eat":[...],"foods_to_avoid":[...]' JSON member
+# fragments per (dosha, sleep state); handlers splice in per-request fields
+DIET_RESPONSE_FRAGMENTS = {
+    (dosha, state): json.dumps(
+        {"foods_to_eat": list(recommendation["eat"]), "foods_to_avoid": list(recommendation["avoid"])},
+        separators=(",", ":")
+    )[1:-1].encode()
+    for dosha, states in DIET_MATRIX.items()
+    for state, recommendation in states.items()
+}
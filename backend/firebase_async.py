@@ -0,0 +1,184 @@
+"""
+Async Firebase Module
+Non-blocking Firebase REST client for the ASGI server. Builds the same
+requests and parses responses with the same code as FirebaseService.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+
+import aiohttp
+
+import firebase_config
+from firebase_service import FirebaseService, FirebaseSession, upstream_gate
+from instrumentation import stage
+from metrics import Counter, Histogram
+
+# Connections kept open to Firebase by the async client; one event loop
+# multiplexes every in-flight request over these
+ASYNC_POOL_SIZE = int(os.environ.get("FIREBASE_ASYNC_POOL_SIZE", 100))
+
+
+class BufferedResponse:
+    """Fully read response with the requests.Response attributes the FirebaseCall parsers use"""
+
+    __slots__ = ("status_code", "content")
+
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content) if self.content else None
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", "replace")
+
+
+class AsyncFirebaseSession:
+    """
+    Shared keep-alive aiohttp.ClientSession with timeouts, bounded retries
+    on idempotent GETs and the same per-label latency histograms as
+    FirebaseSession
+    """
+
+    RETRY_STATUSES = FirebaseSession.RETRY_STATUSES
+
+    def __init__(self, pool_size=None, connect_timeout=None, read_timeout=None,
+                 max_retries=None, backoff=None, gzip=None):
+        self.pool_size = pool_size or ASYNC_POOL_SIZE
+        self.timeout = (
+            connect_timeout or firebase_config.CONNECT_TIMEOUT,
+            read_timeout or firebase_config.READ_TIMEOUT
+        )
+        self.max_retries = firebase_config.MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = firebase_config.RETRY_BACKOFF if backoff is None else backoff
+        self.gzip = firebase_config.USE_GZIP if gzip is None else gzip
+
+        self.client = None
+        self.errors = Counter()
+        self.retries = Counter()
+        self.latency = {}
+        self._latency_lock = threading.Lock()
+
+    def _histogram(self, label):
+        histogram = self.latency.get(label)
+        if histogram is None:
+            with self._latency_lock:
+                histogram = self.latency.setdefault(label, Histogram())
+        return histogram
+
+    def _client(self):
+        # Created lazily so it binds to the event loop that serves requests
+        if self.client is None:
+            self.client = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(sock_connect=self.timeout[0], sock_read=self.timeout[1]),
+                headers={"Accept-Encoding": "gzip, deflate" if self.gzip else "identity"}
+            )
+        return self.client
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+    async def _get_once(self, url, params):
+        async with self._client().get(url, params=params) as response:
+            return BufferedResponse(response.status, await response.read())
+
+    async def get(self, url, params=None, label="other"):
+        """
+        GET with pooling, timeouts and retries (exponential backoff, like urllib3's Retry)
+
+        Returns:
+            BufferedResponse: Final response after any retries
+        """
+        # aiohttp only accepts string query values
+        params = {k: str(v) for k, v in (params or {}).items()}
+        start = time.perf_counter()
+        try:
+            for attempt in range(self.max_retries + 1):
+                last = attempt == self.max_retries
+                try:
+                    response = await self._get_once(url, params)
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                    if last:
+                        raise
+                else:
+                    if response.status_code not in self.RETRY_STATUSES or last:
+                        return response
+                self.retries.inc()
+                await asyncio.sleep(self.backoff * (2 ** attempt))
+        except Exception:
+            self.errors.inc()
+            raise
+        finally:
+            self._histogram(label).observe(time.perf_counter() - start)
+
+    def stats(self):
+        """Per-call latency histograms and error/retry counters"""
+        return {
+            "pool_size": self.pool_size,
+            "timeout": {"connect": self.timeout[0], "read": self.timeout[1]},
+            "errors": self.errors.value,
+            "retries": self.retries.value,
+            "latency": {label: h.snapshot() for label, h in list(self.latency.items())}
+        }
+
+
+# Shared by every AsyncFirebaseService call
+async_firebase_session = AsyncFirebaseSession()
+
+
+class AsyncFirebaseService:
+    """Awaitable counterparts of FirebaseService's methods (same result dicts)"""
+
+    @staticmethod
+    async def execute(call, session=None):
+        """
+        Send a FirebaseCall and parse the response: through the upstream gate
+        over the shared session, or directly over another session (whose
+        owner bounds its own concurrency)
+        """
+        if session is None:
+            return await upstream_gate.run_async(call, lambda: AsyncFirebaseService._send(call, async_firebase_session))
+        return await AsyncFirebaseService._send(call, session)
+
+    @staticmethod
+    async def _send(call, session):
+        try:
+            with stage(f"firebase_{call.label}"):
+                response = await session.get(call.url, params=call.params, label=call.label)
+            with stage("firebase_parse"):
+                return call.parse(response)
+        except Exception as e:
+            return call.failure(e)
+
+    @staticmethod
+    async def get_latest_sensor_data(device=None):
+        return await AsyncFirebaseService.execute(FirebaseService.latest_call(device))
+
+    @staticmethod
+    async def get_sensor_history(limit=100, device=None):
+        return await AsyncFirebaseService.execute(FirebaseService.history_call(limit, device))
+
+    @staticmethod
+    async def get_sensor_data_by_range(start_time=None, end_time=None, device=None):
+        return await AsyncFirebaseService.execute(FirebaseService.range_call(start_time, end_time, device))
+
+    @staticmethod
+    async def get_sensor_entries(start_key=None, limit=1000, device=None):
+        return await AsyncFirebaseService.execute(FirebaseService.entries_call(start_key, limit, device))
+
+    @staticmethod
+    async def list_devices():
+        return await AsyncFirebaseService.execute(FirebaseService.devices_call())
+
+    @staticmethod
+    async def test_connection():
+        return await AsyncFirebaseService.execute(FirebaseService.connection_call())
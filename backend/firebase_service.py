@@ -3,174 +3,583 @@ Firebase Service Module
 Handles all Firebase Realtime Database operations for sensor data retrieval
 """
 
+import asyncio
+import re
+import threading
+import time
 import requests
+from collections import OrderedDict, namedtuple
 from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import firebase_config
 from firebase_config import get_firebase_url, API_KEY
+from instrumentation import stage
+from metrics import Counter, Histogram
+
+class FirebaseSession:
+    """
+    Shared keep-alive HTTP session for Firebase REST calls
+    
+    Pools connections, applies connect/read timeouts and retries idempotent
+    GETs with bounded exponential backoff. Tracks per-call latency and how
+    many requests reused an existing connection.
+    """
+    
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    
+    def __init__(self, pool_size=None, connect_timeout=None, read_timeout=None,
+                 max_retries=None, backoff=None, gzip=None):
+        self.pool_size = pool_size or firebase_config.POOL_SIZE
+        self.timeout = (
+            connect_timeout or firebase_config.CONNECT_TIMEOUT,
+            read_timeout or firebase_config.READ_TIMEOUT
+        )
+        retries = firebase_config.MAX_RETRIES if max_retries is None else max_retries
+        backoff = firebase_config.RETRY_BACKOFF if backoff is None else backoff
+        gzip = firebase_config.USE_GZIP if gzip is None else gzip
+        
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False
+        )
+        self.adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self.session.headers["Accept-Encoding"] = "gzip, deflate" if gzip else "identity"
+        
+        self.errors = Counter()
+        self.latency = {}
+        self._latency_lock = threading.Lock()
+    
+    def _histogram(self, label):
+        histogram = self.latency.get(label)
+        if histogram is None:
+            with self._latency_lock:
+                histogram = self.latency.setdefault(label, Histogram())
+        return histogram
+    
+    def get(self, url, params=None, label="other"):
+        """
+        GET with pooling, timeouts and retries
+        
+        Args:
+            url (str): Firebase REST URL
+            params (dict): Query parameters
+            label (str): Name used for the latency histogram
+        
+        Returns:
+            requests.Response: Final response after any retries
+        """
+        start = time.perf_counter()
+        try:
+            return self.session.get(url, params=params, timeout=self.timeout)
+        except Exception:
+            self.errors.inc()
+            raise
+        finally:
+            self._histogram(label).observe(time.perf_counter() - start)
+    
+    def connection_stats(self):
+        """
+        Connection reuse counters summed over all pooled hosts
+        
+        Returns:
+            dict: requests sent, new connections opened and reused connections
+        """
+        pools = self.adapter.poolmanager.pools
+        requests_sent = 0
+        new_connections = 0
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            requests_sent += pool.num_requests
+            new_connections += pool.num_connections
+        return {
+            "requests": requests_sent,
+            "new_connections": new_connections,
+            "reused_connections": max(0, requests_sent - new_connections)
+        }
+    
+    def stats(self):
+        """Connection reuse counters and per-call latency histograms"""
+        return {
+            "pool_size": self.pool_size,
+            "timeout": {"connect": self.timeout[0], "read": self.timeout[1]},
+            "connections": self.connection_stats(),
+            "errors": self.errors.value,
+            "latency": {label: h.snapshot() for label, h in list(self.latency.items())}
+        }
+
+# Shared by every FirebaseService call
+firebase_session = FirebaseSession()
+
+# Device ids are single Firebase keys: no path separators or query characters
+DEVICE_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+def validate_device(device):
+    """
+    Raises:
+        ValueError: if device is not a usable device id
+    """
+    if not isinstance(device, str) or not DEVICE_ID.match(device):
+        raise ValueError("Device ids are 1-64 letters, digits, '-' or '_'")
+    return device
+
+def device_path(node, device=None):
+    """Database path of a sensor node: the root-level node, or the device's own copy"""
+    if device is None:
+        return node
+    return f"{firebase_config.DEVICES_PATH}/{validate_device(device)}/{node}"
+
+class FirebaseCall(namedtuple("FirebaseCall", "url params label parse error_message")):
+    """
+    One Firebase REST request: where to send it, how to turn the response
+    into a result dict, and the message reported if the request fails.
+    Shared by FirebaseService and the async client in firebase_async.py.
+    """
+
+    def failure(self, error):
+        return {
+            "success": False,
+            "message": self.error_message,
+            "error": str(error)
+        }
+
+def _shared_copy(result):
+    """
+    A caller's own copy of a shared result: routes add keys to the result
+    and may pop entries from its data, so each caller gets its own top
+    level and data container (the entries themselves are not modified)
+    """
+    result = dict(result)
+    data = result.get("data")
+    if isinstance(data, dict):
+        result["data"] = dict(data)
+    elif isinstance(data, list):
+        result["data"] = list(data)
+    return result
+
+class _Flight:
+    """An upstream call in progress and the result its waiters will share"""
+
+    __slots__ = ("done", "result")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+class UpstreamGate:
+    """
+    Single-flight and admission control for Firebase calls
+    
+    Concurrent calls with the same URL and parameters share one upstream
+    request and its parsed result. At most max_in_flight distinct requests
+    run at once; a call over that budget is answered immediately with the
+    last successful result of the same request if it is at most stale_ttl
+    seconds old (marked "stale"), or else with an "overloaded" failure that
+    the routes turn into a 503. Threads and the ASGI event loop share the
+    budget; async calls coalesce among themselves on that loop.
+    """
+    
+    def __init__(self, max_in_flight=None, stale_ttl=None, stale_entries=None, coalesce=None):
+        self.max_in_flight = firebase_config.MAX_IN_FLIGHT if max_in_flight is None else max_in_flight
+        self.stale_ttl = firebase_config.STALE_TTL if stale_ttl is None else stale_ttl
+        self.stale_entries = firebase_config.STALE_ENTRIES if stale_entries is None else stale_entries
+        self.coalesce = firebase_config.COALESCE if coalesce is None else coalesce
+        
+        self.in_flight = 0
+        self.admitted = Counter()
+        self.coalesced = Counter()
+        self.shed = Counter()
+        self.stale_served = Counter()
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._async_flights = {}
+        # Request key -> (monotonic time, last successful result), least recent first
+        self._last_good = OrderedDict()
+    
+    @staticmethod
+    def key(call):
+        return call.url, tuple(sorted((name, str(value)) for name, value in call.params.items()))
+    
+    def _admit(self):
+        with self._lock:
+            if self.in_flight >= self.max_in_flight:
+                return False
+            self.in_flight += 1
+        self.admitted.inc()
+        return True
+    
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+    
+    def _remember(self, key, result):
+        if not result.get("success"):
+            return
+        with self._lock:
+            self._last_good[key] = (time.monotonic(), result)
+            self._last_good.move_to_end(key)
+            while len(self._last_good) > self.stale_entries:
+                self._last_good.popitem(last=False)
+    
+    def _over_budget(self, key):
+        """Answer for a call refused admission: a recent last good result, or an overloaded failure"""
+        with self._lock:
+            entry = self._last_good.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age <= self.stale_ttl:
+                self.stale_served.inc()
+                return dict(entry[1], stale=True, stale_age=round(age, 3))
+        self.shed.inc()
+        return {
+            "success": False,
+            "overloaded": True,
+            "message": "Too many Firebase requests in flight, retry shortly"
+        }
+    
+    def _send(self, key, send):
+        if not self._admit():
+            return self._over_budget(key)
+        try:
+            result = send()
+        finally:
+            self._release()
+        self._remember(key, result)
+        return result
+    
+    async def _send_async(self, key, send):
+        if not self._admit():
+            return self._over_budget(key)
+        try:
+            result = await send()
+        finally:
+            self._release()
+        self._remember(key, result)
+        return result
+    
+    def run(self, call, send):
+        """
+        Result of send() for call, shared with identical concurrent calls
+        
+        Args:
+            call (FirebaseCall): Request about to be made
+            send (callable): Makes the request and parses the response; must not raise
+        
+        Returns:
+            dict: The caller's own copy of the result
+        """
+        key = self.key(call)
+        # _send's result is also remembered as the last good one, and a stale
+        # answer is built on it, so no caller ever gets that dict itself
+        if not self.coalesce:
+            return _shared_copy(self._send(key, send))
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if leader:
+            try:
+                flight.result = self._send(key, send)
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+        else:
+            self.coalesced.inc()
+            with stage("firebase_coalesced"):
+                flight.done.wait()
+        return _shared_copy(flight.result)
+    
+    async def run_async(self, call, send):
+        """Awaitable run(): send is a coroutine function"""
+        key = self.key(call)
+        if not self.coalesce:
+            return _shared_copy(await self._send_async(key, send))
+        task = self._async_flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._send_async(key, send))
+            self._async_flights[key] = task
+            task.add_done_callback(lambda _: self._async_flights.pop(key, None))
+        else:
+            self.coalesced.inc()
+        # Shielded so a caller that goes away does not cancel the request for the others
+        return _shared_copy(await asyncio.shield(task))
+    
+    def stats(self):
+        """Budget use and coalesced/shed/stale-served counters"""
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "admitted": self.admitted.value,
+            "coalesced": self.coalesced.value,
+            "shed": self.shed.value,
+            "stale_served": self.stale_served.value,
+            "stale_ttl": self.stale_ttl,
+            "remembered": len(self._last_good)
+        }
+
+# Shared by FirebaseService and AsyncFirebaseService
+upstream_gate = UpstreamGate()
+
+def _request_failed(response):
+    return {
+        "success": False,
+        "message": f"Firebase request failed with status {response.status_code}",
+        "error": response.text
+    }
+
+def _entry_list(data):
+    """Convert a {key: values} node to a list of entries with a "timestamp" field"""
+    entries = []
+    if isinstance(data, dict):
+        for timestamp, values in data.items():
+            entry = values.copy() if isinstance(values, dict) else {"value": values}
+            entry["timestamp"] = timestamp
+            entries.append(entry)
+    return entries
+
+def _parse_latest(response):
+    if response.status_code != 200:
+        return _request_failed(response)
+    data = response.json()
+    
+    if not data:
+        return {
+            "success": False,
+            "message": "No sensor data available in Firebase"
+        }
+    
+    # Return the data directly
+    return {
+        "success": True,
+        "data": data,
+        "timestamp": datetime.now().isoformat()
+    }
+
+def _parse_history(response):
+    if response.status_code != 200:
+        return _request_failed(response)
+    data = response.json()
+    
+    if not data:
+        return {
+            "success": False,
+            "message": "No historical data available"
+        }
+    
+    # Convert to list format for easier consumption
+    history = _entry_list(data)
+    return {
+        "success": True,
+        "count": len(history),
+        "data": history
+    }
+
+def _parse_range(response, start_time, end_time):
+    if response.status_code != 200:
+        return _request_failed(response)
+    data = response.json()
+    
+    if not data:
+        return {
+            "success": False,
+            "message": "No data available in the specified range"
+        }
+    
+    # Convert to list format
+    range_data = _entry_list(data)
+    return {
+        "success": True,
+        "count": len(range_data),
+        "data": range_data,
+        "range": {
+            "start": start_time,
+            "end": end_time
+        }
+    }
+
+def _parse_entries(response):
+    if response.status_code != 200:
+        return _request_failed(response)
+    data = response.json()
+    return {
+        "success": True,
+        "data": data if isinstance(data, dict) else {}
+    }
+
+def _parse_devices(response):
+    if response.status_code != 200:
+        return _request_failed(response)
+    data = response.json()
+    # A shallow listing maps each child key to true; ignore keys that are not device ids
+    devices = sorted(key for key in data if DEVICE_ID.match(key)) if isinstance(data, dict) else []
+    return {
+        "success": True,
+        "count": len(devices),
+        "devices": devices
+    }
+
+def _parse_connection(response, url):
+    if response.status_code != 200:
+        return {
+            "success": False,
+            "message": f"Connection failed with status {response.status_code}",
+            "error": response.text
+        }
+    return {
+        "success": True,
+        "message": "Firebase connection successful",
+        "database_url": url.replace(".json", "")
+    }
 
 class FirebaseService:
-    """Service class for Firebase Realtime Database operations"""
+    """
+    Service class for Firebase Realtime Database operations
+
+    Sensor calls read the original single device's root-level nodes, or
+    with device=<id> that device's subtree under DEVICES_PATH.
+    """
+    
+    @staticmethod
+    def latest_call(device=None):
+        # Changed to 'sensorData' as it appears to be at the root level
+        return FirebaseCall(get_firebase_url(device_path("sensorData", device)), {"auth": API_KEY}, "latest",
+                            _parse_latest, "Error fetching data from Firebase")
+    
+    @staticmethod
+    def history_call(limit=100, device=None):
+        params = {
+            "auth": API_KEY,
+            "orderBy": '"$key"',
+            "limitToLast": limit
+        }
+        return FirebaseCall(get_firebase_url(device_path("sensor_data", device)), params, "history",
+                            _parse_history, "Error fetching historical data from Firebase")
+    
+    @staticmethod
+    def range_call(start_time=None, end_time=None, device=None):
+        params = {"auth": API_KEY, "orderBy": '"$key"'}
+        if start_time:
+            params["startAt"] = f'"{start_time}"'
+        if end_time:
+            params["endAt"] = f'"{end_time}"'
+        return FirebaseCall(get_firebase_url(device_path("sensor_data", device)), params, "range",
+                            lambda response: _parse_range(response, start_time, end_time),
+                            "Error fetching range data from Firebase")
+    
+    @staticmethod
+    def entries_call(start_key=None, limit=1000, device=None):
+        params = {"auth": API_KEY, "orderBy": '"$key"', "limitToFirst": limit}
+        if start_key:
+            params["startAt"] = f'"{start_key}"'
+        return FirebaseCall(get_firebase_url(device_path("sensor_data", device)), params, "sync",
+                            _parse_entries, "Error fetching sensor entries from Firebase")
+    
+    @staticmethod
+    def devices_call():
+        # Same shallow listing as the connection test, one level down: keys only, no readings
+        return FirebaseCall(get_firebase_url(firebase_config.DEVICES_PATH), {"auth": API_KEY, "shallow": "true"},
+                            "devices", _parse_devices, "Error listing devices in Firebase")
+    
+    @staticmethod
+    def connection_call():
+        url = get_firebase_url()
+        return FirebaseCall(url, {"auth": API_KEY, "shallow": "true"}, "test",
+                            lambda response: _parse_connection(response, url), "Connection test failed")
+    
+    @staticmethod
+    def execute(call):
+        """Send a FirebaseCall through the upstream gate and parse the response"""
+        return upstream_gate.run(call, lambda: FirebaseService._send(call))
     
     @staticmethod
-    def get_latest_sensor_data():
+    def _send(call):
+        try:
+            with stage(f"firebase_{call.label}"):
+                response = firebase_session.get(call.url, params=call.params, label=call.label)
+            with stage("firebase_parse"):
+                return call.parse(response)
+        except Exception as e:
+            return call.failure(e)
+    
+    @staticmethod
+    def get_latest_sensor_data(device=None):
         """
         Fetch the latest sensor reading from Firebase
         
+        Args:
+            device (str): Device id, or None for the root-level sensorData
+        
         Returns:
             dict: Latest sensor data or error message
         """
-        try:
-            # Changed to 'sensorData' as it appears to be at the root level
-            url = get_firebase_url("sensorData")
-            response = requests.get(url, params={"auth": API_KEY})
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                if not data:
-                    return {
-                        "success": False,
-                        "message": "No sensor data available in Firebase"
-                    }
-                
-                # Return the data directly
-                return {
-                    "success": True,
-                    "data": data,
-                    "timestamp": datetime.now().isoformat()
-                }
-            else:
-                return {
-                    "success": False,
-                    "message": f"Firebase request failed with status {response.status_code}",
-                    "error": response.text
-                }
-                
-        except Exception as e:
-            return {
-                "success": False,
-                "message": "Error fetching data from Firebase",
-                "error": str(e)
-            }
+        return FirebaseService.execute(FirebaseService.latest_call(device))
     
     @staticmethod
-    def get_sensor_history(limit=100):
+    def get_sensor_history(limit=100, device=None):
         """
         Fetch historical sensor data from Firebase
         
         Args:
             limit (int): Maximum number of records to fetch
+            device (str): Device id, or None for the root-level sensor_data
         
         Returns:
             dict: Historical sensor data or error message
         """
-        try:
-            url = get_firebase_url("sensor_data")
-            params = {
-                "auth": API_KEY,
-                "orderBy": '"$key"',
-                "limitToLast": limit
-            }
-            
-            response = requests.get(url, params=params)
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                if not data:
-                    return {
-                        "success": False,
-                        "message": "No historical data available"
-                    }
-                
-                # Convert to list format for easier consumption
-                history = []
-                if isinstance(data, dict):
-                    for timestamp, values in data.items():
-                        entry = values.copy() if isinstance(values, dict) else {"value": values}
-                        entry["timestamp"] = timestamp
-                        history.append(entry)
-                
-                return {
-                    "success": True,
-                    "count": len(history),
-                    "data": history
-                }
-            else:
-                return {
-                    "success": False,
-                    "message": f"Firebase request failed with status {response.status_code}",
-                    "error": response.text
-                }
-                
-        except Exception as e:
-            return {
-                "success": False,
-                "message": "Error fetching historical data from Firebase",
-                "error": str(e)
-            }
+        return FirebaseService.execute(FirebaseService.history_call(limit, device))
     
     @staticmethod
-    def get_sensor_data_by_range(start_time=None, end_time=None):
+    def get_sensor_data_by_range(start_time=None, end_time=None, device=None):
         """
         Fetch sensor data within a specific time range
         
         Args:
             start_time (str): Start timestamp (ISO format or Firebase key)
             end_time (str): End timestamp (ISO format or Firebase key)
+            device (str): Device id, or None for the root-level sensor_data
         
         Returns:
             dict: Sensor data within the specified range or error message
         """
-        try:
-            url = get_firebase_url("sensor_data")
-            params = {"auth": API_KEY, "orderBy": '"$key"'}
-            
-            if start_time:
-                params["startAt"] = f'"{start_time}"'
-            if end_time:
-                params["endAt"] = f'"{end_time}"'
-            
-            response = requests.get(url, params=params)
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                if not data:
-                    return {
-                        "success": False,
-                        "message": "No data available in the specified range"
-                    }
-                
-                # Convert to list format
-                range_data = []
-                if isinstance(data, dict):
-                    for timestamp, values in data.items():
-                        entry = values.copy() if isinstance(values, dict) else {"value": values}
-                        entry["timestamp"] = timestamp
-                        range_data.append(entry)
-                
-                return {
-                    "success": True,
-                    "count": len(range_data),
-                    "data": range_data,
-                    "range": {
-                        "start": start_time,
-                        "end": end_time
-                    }
-                }
-            else:
-                return {
-                    "success": False,
-                    "message": f"Firebase request failed with status {response.status_code}",
-                    "error": response.text
-                }
-                
-        except Exception as e:
-            return {
-                "success": False,
-                "message": "Error fetching range data from Firebase",
-                "error": str(e)
-            }
+        return FirebaseService.execute(FirebaseService.range_call(start_time, end_time, device))
+    
+    @staticmethod
+    def get_sensor_entries(start_key=None, limit=1000, device=None):
+        """
+        Fetch raw sensor_data entries in key order, for incremental sync
+        
+        Args:
+            start_key (str): First key to include (inclusive), or None for the beginning
+            limit (int): Maximum number of entries to fetch
+            device (str): Device id, or None for the root-level sensor_data
+        
+        Returns:
+            dict: { "success", "data": {key: values} } or error message
+        """
+        return FirebaseService.execute(FirebaseService.entries_call(start_key, limit, device))
+    
+    @staticmethod
+    def list_devices():
+        """
+        Discover device subtrees with a shallow listing of DEVICES_PATH
+        
+        Returns:
+            dict: { "success", "count", "devices": [device ids] } or error message
+        """
+        return FirebaseService.execute(FirebaseService.devices_call())
     
     @staticmethod
     def test_connection():
@@ -180,26 +589,4 @@ class FirebaseService:
         Returns:
             dict: Connection test result
         """
-        try:
-            url = get_firebase_url()
-            response = requests.get(url, params={"auth": API_KEY, "shallow": "true"})
-            
-            if response.status_code == 200:
-                return {
-                    "success": True,
-                    "message": "Firebase connection successful",
-                    "database_url": url.replace(".json", "")
-                }
-            else:
-                return {
-                    "success": False,
-                    "message": f"Connection failed with status {response.status_code}",
-                    "error": response.text
-                }
-                
-        except Exception as e:
-            return {
-                "success": False,
-                "message": "Connection test failed",
-                "error": str(e)
-            }
+        return FirebaseService.execute(FirebaseService.connection_call())
@@ -0,0 +1,32 @@
+"""
+Frozen Module
+Read-only containers for data that request handlers share
+"""
+
+
+class FrozenDict(dict):
+    """
+    Read-only dict shared across requests. Serializes like a normal dict;
+    any attempt to mutate it raises TypeError instead of corrupting other
+    requests' responses.
+    """
+
+    __slots__ = ("json_bytes",)
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Shared responses are read-only; copy with dict() first")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _readonly
+    __ior__ = _readonly
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+def freeze(value):
+    """Recursively convert dicts to FrozenDict and lists to tuples"""
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
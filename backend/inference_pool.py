@@ -0,0 +1,257 @@
+"""
+Inference Pool Module
+Runs model inference in a pool of worker processes so predictions use every
+core instead of queueing on one interpreter's GIL.
+
+The model is shared rather than copied into every worker:
+  - "mmap": a CompiledForest is exported once (or its model artifact is
+    reused) and each worker memory-maps the same file, so the node arrays
+    live in the shared page cache
+  - "fork": workers inherit the parent's estimator copy-on-write (any model,
+    fork start method only)
+  - "copy": every worker loads its own copy (for comparison)
+Single requests are coalesced into micro-batches before they are sent to a worker.
+"""
+
+import gc
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from metrics import Counter
+from model_artifact import ARTIFACT_SUFFIX, load_artifact
+
+# "local" runs inference in the request thread; "process" uses InferencePool
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "local").lower()
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", os.cpu_count() or 1))
+# Largest micro-batch sent to one worker; bigger requests are split across workers
+POOL_MAX_BATCH = int(os.environ.get("INFERENCE_POOL_MAX_BATCH", 256))
+# Longest a request waits for others to share its batch (milliseconds)
+POOL_MAX_WAIT_MS = float(os.environ.get("INFERENCE_POOL_MAX_WAIT_MS", 1.0))
+# How workers get the model: "mmap", "fork" or "copy"
+POOL_SHARE = os.environ.get("INFERENCE_POOL_SHARE", "mmap").lower()
+# Where the shared model file is written for workers to map
+SHARED_MODEL_PATH = os.environ.get(
+    "INFERENCE_SHARED_MODEL_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'shared_model.joblib')
+)
+
+# Model used by each worker process
+_worker_model = None
+# Set in the parent only while share="fork" workers are being forked
+_inherited_model = None
+
+
+def _init_worker(path, mmap_mode):
+    global _worker_model
+    if path is None:
+        _worker_model = _inherited_model
+    elif path.endswith(ARTIFACT_SUFFIX):
+        # The parent already verified the artifact's checksum
+        _worker_model = load_artifact(path, mmap=mmap_mode is not None, verify=False)
+    else:
+        import joblib
+        _worker_model = joblib.load(path, mmap_mode=mmap_mode)
+
+
+def _worker_predict(X):
+    return _worker_model.predict(X)
+
+
+def export_model(compiled, path=SHARED_MODEL_PATH):
+    """
+    Write a CompiledForest where workers can memory-map it. Uncompressed,
+    so every node array is a plain region of the file. Written to a temp
+    file and renamed, so workers mapping an older export are unaffected.
+    """
+    import joblib
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(compiled, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def process_memory(pid):
+    """
+    Memory of one process from /proc (Linux)
+
+    Returns:
+        dict: rss_mb, pss_mb (shared pages divided among the processes mapping
+              them) and private_mb, or None where unavailable
+    """
+    fields = {"Rss": None, "Pss": None, "Private_Clean": 0, "Private_Dirty": 0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in fields:
+                    fields[name] = int(rest.split()[0]) / 1024.0
+    except OSError:
+        return {"rss_mb": None, "pss_mb": None, "private_mb": None}
+    return {
+        "rss_mb": round(fields["Rss"], 1) if fields["Rss"] is not None else None,
+        "pss_mb": round(fields["Pss"], 1) if fields["Pss"] is not None else None,
+        "private_mb": round(fields["Private_Clean"] + fields["Private_Dirty"], 1),
+    }
+
+
+class InferencePool:
+    """
+    Process pool serving model predictions
+
+    predict() may be called from any number of threads. Calls are queued
+    and a dispatcher thread groups them into batches of about max_batch
+    rows, waiting at most max_wait for company, and keeps every worker
+    busy with at most two batches in flight per worker.
+    """
+
+    def __init__(self, model, workers=INFERENCE_WORKERS, max_batch=POOL_MAX_BATCH,
+                 max_wait=POOL_MAX_WAIT_MS / 1000.0, share=POOL_SHARE, path=SHARED_MODEL_PATH):
+        """
+        Args:
+            model: CompiledForest for share="mmap"/"copy", any estimator for share="fork"
+            workers (int): Worker processes
+            max_batch (int): Rows per micro-batch
+            max_wait (float): Seconds a request may wait for its batch to fill
+            share (str): "mmap", "fork" or "copy"
+            path (str): Export file for "mmap"/"copy"
+        """
+        global _inherited_model
+
+        if share not in ("mmap", "fork", "copy"):
+            raise ValueError(f"Unknown model sharing mode {share!r}")
+        self.workers = max(1, workers)
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.share = share
+
+        # fork, where available, spares workers from re-importing the app
+        # (spawn would run app.py again in every worker)
+        methods = multiprocessing.get_all_start_methods()
+        if share == "fork" and "fork" not in methods:
+            raise ValueError("share='fork' needs the fork start method")
+        context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+
+        if share == "fork":
+            self.path = None
+        elif share == "mmap" and getattr(model, "artifact_path", None):
+            # Loaded from a model artifact: workers map the same file
+            self.path = model.artifact_path
+        else:
+            self.path = export_model(model, path)
+        self._executor = ProcessPoolExecutor(self.workers, mp_context=context, initializer=_init_worker,
+                                             initargs=(self.path, "r" if share == "mmap" else None))
+        self._queue = queue.Queue()
+        self._in_flight = threading.BoundedSemaphore(self.workers * 2)
+        self.batches = Counter()
+        self.rows = Counter()
+
+        # Start every worker now, before the server starts its own threads.
+        # Freezing the GC keeps the workers' collections from writing to (and
+        # so un-sharing) the pages of objects they inherited from this process.
+        probe = np.zeros((1, model.n_features_in_), dtype=np.float64)
+        _inherited_model = model if share == "fork" else None
+        gc.freeze()
+        try:
+            list(self._executor.map(_worker_predict, [probe] * self.workers))
+        finally:
+            gc.unfreeze()
+            _inherited_model = None
+        self._dispatcher = threading.Thread(target=self._dispatch, name="inference-dispatch", daemon=True)
+        self._dispatcher.start()
+
+    def predict(self, X):
+        """
+        Class labels for an (N, n_features) matrix, in the model's column order
+
+        Blocks until the workers have answered.
+        """
+        if len(X) > self.max_batch:
+            # Large requests are already batched; spread their chunks over the workers
+            futures = [self._executor.submit(_worker_predict, X[i:i + self.max_batch])
+                       for i in range(0, len(X), self.max_batch)]
+            self.batches.inc(len(futures))
+            self.rows.inc(len(X))
+            return np.concatenate([f.result() for f in futures])
+
+        future = Future()
+        self._queue.put((np.array(X, copy=True), future))
+        return future.result()
+
+    def _dispatch(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            # Wait for a free worker first; requests arriving meanwhile join this batch
+            self._in_flight.acquire()
+            batch, rows = [item], len(item[0])
+            deadline = time.monotonic() + self.max_wait
+            while rows < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+                rows += len(item[0])
+
+            X = batch[0][0] if len(batch) == 1 else np.concatenate([x for x, _ in batch])
+            self.batches.inc()
+            self.rows.inc(rows)
+            try:
+                result = self._executor.submit(_worker_predict, X)
+            except Exception as e:
+                self._in_flight.release()
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            result.add_done_callback(partial(self._resolve, batch))
+
+    def _resolve(self, batch, result):
+        self._in_flight.release()
+        try:
+            labels = result.result()
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        start = 0
+        for x, future in batch:
+            future.set_result(labels[start:start + len(x)])
+            start += len(x)
+
+    def worker_pids(self):
+        # ProcessPoolExecutor keeps its workers keyed by pid
+        return sorted(self._executor._processes)
+
+    def stats(self):
+        batches = self.batches.value
+        return {
+            "backend": "process",
+            "workers": self.workers,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": batches,
+            "rows": self.rows.value,
+            "mean_batch_rows": round(self.rows.value / batches, 2) if batches else None,
+            "share": self.share,
+            "shared_model": self.path,
+        }
+
+    def stop(self):
+        self._queue.put(None)
+        self._dispatcher.join(5)
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
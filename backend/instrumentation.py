@@ -0,0 +1,264 @@
+"""
+Instrumentation Module
+Per-route request latency and per-stage timings in fixed-bucket histograms,
+Prometheus text exposition of these and the service modules' own counters,
+and an opt-in profiler that dumps slow requests.
+
+Stages are timed with ``with stage("firebase_fetch"):`` anywhere in the
+request path. The current request is tracked in a context variable, so a
+stage is attributed to the route that ran it on threads and event loops alike.
+"""
+
+import contextvars
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import random
+import re
+import threading
+import time
+
+from metrics import Counter, Histogram
+
+# Set METRICS=0 to disable request and stage timing
+ENABLED = os.environ.get("METRICS", "1") != "0"
+
+# Set PROFILE_SLOW_MS to profile sampled requests and dump those slower than this
+PROFILE_SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", 0))
+# Fraction of requests profiled while PROFILE_SLOW_MS is set
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0.1))
+PROFILE_DIR = os.environ.get(
+    "PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'profiles')
+)
+
+# Stages run from tens of microseconds (serialization) to seconds (Firebase)
+STAGE_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = contextvars.ContextVar("request_trace", default=None)
+# cProfile attaches per thread, but only one request is profiled at a time
+_profile_lock = threading.Lock()
+_profile_sequence = itertools.count(1)
+started_at = time.time()
+
+
+class LabeledHistograms:
+    """Histograms keyed by a tuple of label values, created on first use"""
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = buckets
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        histogram = self._children.get(values)
+        if histogram is None:
+            with self._lock:
+                histogram = self._children.setdefault(values, Histogram(self.buckets))
+        return histogram
+
+    def items(self):
+        return list(self._children.items())
+
+
+request_seconds = LabeledHistograms()
+stage_seconds = LabeledHistograms()
+profiles_written = Counter()
+
+
+class RequestTrace:
+    """Timing state of one request"""
+
+    __slots__ = ("method", "route", "start", "stages", "profiler", "token")
+
+    def __init__(self, method, route):
+        self.method = method
+        self.route = route
+        self.start = time.perf_counter()
+        self.stages = []
+        self.profiler = None
+        self.token = None
+
+
+class Stage:
+    """Context manager timing one stage of the current request"""
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if not ENABLED:
+            return False
+        elapsed = time.perf_counter() - self.start
+        trace = _current.get()
+        if trace is None:
+            # Outside any request: the ingest worker, store sync and other background threads
+            stage_seconds.labels("background", self.name).observe(elapsed)
+        else:
+            stage_seconds.labels(trace.route, self.name).observe(elapsed)
+            trace.stages.append((self.name, elapsed))
+        return False
+
+
+def stage(name):
+    """Time a block as the named stage of the current request"""
+    return Stage(name)
+
+
+def begin_request(method, route):
+    """
+    Start timing a request (and maybe profiling it)
+
+    Returns:
+        RequestTrace: pass to end_request, or None when metrics are disabled
+    """
+    if not ENABLED:
+        return None
+    trace = RequestTrace(method, route)
+    trace.token = _current.set(trace)
+    if PROFILE_SLOW_MS and random.random() < PROFILE_SAMPLE_RATE and _profile_lock.acquire(blocking=False):
+        trace.profiler = cProfile.Profile()
+        try:
+            trace.profiler.enable()
+        except ValueError:
+            # Another profiler is active in this interpreter
+            trace.profiler = None
+            _profile_lock.release()
+    return trace
+
+
+def end_request(trace, status):
+    """Record a request's latency; dump its profile if it was slow"""
+    if trace is None:
+        return
+    elapsed = time.perf_counter() - trace.start
+    request_seconds.labels(trace.method, trace.route, str(status)).observe(elapsed)
+    try:
+        _current.reset(trace.token)
+    except ValueError:
+        # Finished in a different context than it started (e.g. another thread)
+        _current.set(None)
+
+    if trace.profiler is not None:
+        trace.profiler.disable()
+        try:
+            if elapsed * 1000.0 >= PROFILE_SLOW_MS:
+                _dump_profile(trace, elapsed)
+        finally:
+            _profile_lock.release()
+
+
+def _dump_profile(trace, elapsed):
+    """Write <time>-<n>-<route>.prof (for pstats/snakeviz) and a readable .txt summary"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    route = re.sub(r'[^A-Za-z0-9]+', '_', trace.route).strip('_') or 'root'
+    path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{next(_profile_sequence)}-"
+                                    f"{int(elapsed * 1000)}ms-{route}")
+    trace.profiler.dump_stats(path + ".prof")
+
+    out = io.StringIO()
+    out.write(f"{trace.method} {trace.route} took {elapsed * 1000:.1f} ms\n\nStages:\n")
+    for stage_name, seconds in trace.stages:
+        out.write(f"  {stage_name:<24} {seconds * 1000:9.3f} ms\n")
+    out.write("\n")
+    pstats.Stats(trace.profiler, stream=out).sort_stats("cumulative").print_stats(30)
+    with open(path + ".txt", "w") as f:
+        f.write(out.getvalue())
+    profiles_written.inc()
+    print(f"[Instrumentation] Slow request profiled: {path}.txt")
+
+
+# Prometheus text exposition
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value):
+    if value is None:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Exposition:
+    """
+    Collects samples per metric family and renders them in the Prometheus
+    text format (0.0.4), one HELP/TYPE header per family
+    """
+
+    def __init__(self):
+        self._families = {}
+
+    def _family(self, name, kind, help_text):
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = (kind, help_text, [])
+        return family[2]
+
+    def counter(self, name, help_text, value, labels=None):
+        self._family(name, "counter", help_text).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    def gauge(self, name, help_text, value, labels=None):
+        self._family(name, "gauge", help_text).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    def histogram(self, name, help_text, histogram, labels=None):
+        snapshot = histogram.snapshot()
+        samples = self._family(name, "histogram", help_text)
+        labels = labels or {}
+        for bound, count in snapshot["buckets"]:
+            le = bound if bound == "+Inf" else _format_value(float(bound))
+            samples.append(f"{name}_bucket{_format_labels(dict(labels, le=le))} {count}")
+        samples.append(f"{name}_sum{_format_labels(labels)} {_format_value(float(snapshot['sum']))}")
+        samples.append(f"{name}_count{_format_labels(labels)} {snapshot['count']}")
+
+    def render(self):
+        lines = []
+        for name, (kind, help_text, samples) in self._families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+_collectors = []
+
+
+def register_collector(collect):
+    """Add a callable that writes a module's own metrics into an Exposition"""
+    _collectors.append(collect)
+
+
+def render_metrics():
+    """Every request, stage and registered collector metric, as Prometheus text"""
+    out = Exposition()
+    out.gauge("process_start_time_seconds", "Start time of the process since the Unix epoch", started_at)
+    for (method, route, status), histogram in sorted(request_seconds.items()):
+        out.histogram("http_request_duration_seconds", "Time from request start to response headers",
+                      histogram, {"method": method, "route": route, "status": status})
+    for (route, name), histogram in sorted(stage_seconds.items()):
+        out.histogram("request_stage_duration_seconds", "Time spent in each stage of a request",
+                      histogram, {"route": route, "stage": name})
+    out.counter("slow_request_profiles_total", "Profiles written for slow requests", profiles_written.value)
+    for collect in _collectors:
+        try:
+            collect(out)
+        except Exception as e:
+            print(f"[Instrumentation] Collector {getattr(collect, '__name__', collect)} failed: {e}")
+    return out.render()
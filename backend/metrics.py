@@ -0,0 +1,95 @@
+"""
+Metrics Module
+Lightweight thread-safe counters and fixed-bucket latency histograms
+"""
+
+import bisect
+import threading
+
+# Latency bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """Monotonic counter"""
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram
+
+    observe() is a bisect plus two additions, cheap enough for every request.
+    Percentiles are estimated from bucket bounds.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    @property
+    def count(self):
+        return self._count
+
+    def percentile(self, q, counts=None, total=None):
+        """Upper bound of the bucket holding the q-th percentile (0-100)"""
+        counts = self._counts if counts is None else counts
+        total = self._count if total is None else total
+        if not total:
+            return None
+        rank = q / 100.0 * total
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            seen += n
+            if seen >= rank:
+                return bound if bound != float("inf") else self.buckets[-1]
+        return self.buckets[-1]
+
+    def snapshot(self):
+        """
+        Point-in-time copy
+
+        Returns:
+            dict: count, sum, mean, estimated p50/p95/p99 and cumulative buckets
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+            total_sum = self._sum
+
+        cumulative = []
+        running = 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            running += n
+            cumulative.append(("+Inf" if bound == float("inf") else bound, running))
+
+        return {
+            "count": total,
+            "sum": total_sum,
+            "mean": total_sum / total if total else None,
+            "p50": self.percentile(50, counts, total),
+            "p95": self.percentile(95, counts, total),
+            "p99": self.percentile(99, counts, total),
+            "buckets": cumulative
+        }
@@ -0,0 +1,266 @@
+"""
+Model Artifact Module
+Compact, versioned on-disk format for the random forest. Loading maps the
+packed node arrays with numpy.memmap instead of unpickling sklearn objects,
+so it needs neither sklearn nor a matching sklearn version, and processes
+loading the same file share its pages.
+
+File layout:
+    magic       8 bytes, b"SLEEPRF\\0"
+    version     uint32 (little-endian)
+    header_len  uint32
+    header      UTF-8 JSON: feature schema, classes, tree shape, array table,
+                sha256 of the array region and a digest of probe predictions
+    padding     to a 64-byte boundary
+    arrays      node arrays, each 64-byte aligned
+
+Split thresholds are stored as float32 rounded toward -inf. sklearn compares
+float32 inputs against float64 thresholds, and for a float32 x, x <= t holds
+exactly when x <= (the largest float32 <= t), so every split is unchanged.
+Leaf probabilities stay float64 so predict_proba is bit-identical.
+
+Usage:
+    python model_artifact.py export [model.pkl] [model.forest]
+    python model_artifact.py verify [model.forest]
+"""
+
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from compiled_forest import CompiledForest, probe_inputs, verify_equivalence
+
+MAGIC = b"SLEEPRF\0"
+FORMAT_VERSION = 1
+ARTIFACT_SUFFIX = ".forest"
+ALIGNMENT = 64
+# Rows of probe_inputs whose predictions are fingerprinted in the header
+PROBE_ROWS = 1000
+
+# Stored dtype of each CompiledForest node array
+ARRAY_DTYPES = {
+    "children_left": np.int32,
+    "children_right": np.int32,
+    "feature": np.int32,
+    "threshold": np.float32,
+    "missing_go_to_left": np.bool_,
+    "leaf_proba": np.float64,
+    "roots": np.int32,
+}
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _round_down_float32(values):
+    """Largest float32 <= each value (infinities unchanged)"""
+    rounded = values.astype(np.float32)
+    over = rounded.astype(np.float64) > values
+    rounded[over] = np.nextafter(rounded[over], np.float32(-np.inf))
+    return rounded
+
+
+def pack(compiled):
+    """
+    CompiledForest with node arrays narrowed to their stored dtypes
+
+    Raises:
+        ValueError: if node indices do not fit in int32
+    """
+    if compiled.node_count >= np.iinfo(np.int32).max:
+        raise ValueError(f"{compiled.node_count} nodes do not fit int32 indices")
+    arrays = {name: np.ascontiguousarray(getattr(compiled, name), dtype=dtype)
+              for name, dtype in ARRAY_DTYPES.items() if name != "threshold"}
+    arrays["threshold"] = _round_down_float32(compiled.threshold)
+    return CompiledForest(
+        max_depth=compiled.max_depth,
+        classes=compiled.classes_,
+        feature_names=getattr(compiled, "feature_names_in_", None),
+        n_features=compiled.n_features_in_,
+        **arrays
+    )
+
+
+def probe_digest(compiled):
+    """sha256 of predict_proba on deterministic probe rows"""
+    X = probe_inputs(compiled, PROBE_ROWS, seed=0)
+    return hashlib.sha256(np.ascontiguousarray(compiled.predict_proba(X)).tobytes()).hexdigest()
+
+
+def export_artifact(forest, path):
+    """
+    Write a fitted RandomForestClassifier as a model artifact
+
+    The packed forest is checked against forest.predict / predict_proba on
+    boundary probes before anything is written. The file is written to a
+    temp path and renamed, so processes mapping an older export are unaffected.
+
+    Returns:
+        dict: The artifact header
+
+    Raises:
+        ValueError: if the packed forest does not reproduce the estimator exactly
+    """
+    packed = pack(CompiledForest.from_sklearn(forest))
+
+    X = np.vstack([probe_inputs(packed, seed=1), probe_inputs(CompiledForest.from_sklearn(forest), seed=2)])
+    with warnings.catch_warnings():
+        # Probes are plain arrays in the forest's own column order
+        warnings.filterwarnings("ignore", message="X does not have valid feature names", category=UserWarning)
+        mismatches = verify_equivalence(forest, packed, X)
+        identical = np.array_equal(forest.predict_proba(X), packed.predict_proba(X))
+    if mismatches or not identical:
+        raise ValueError(f"Packed forest disagrees with the estimator ({mismatches} label mismatches)")
+
+    table, chunks, offset = {}, [], 0
+    for name in ARRAY_DTYPES:
+        array = getattr(packed, name)
+        offset = _align(offset)
+        table[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset,
+                       "nbytes": array.nbytes}
+        chunks.append((offset, array))
+        offset += array.nbytes
+    data = bytearray(offset)
+    for start, array in chunks:
+        data[start:start + array.nbytes] = array.tobytes()
+
+    feature_names = getattr(packed, "feature_names_in_", None)
+    header = {
+        "format_version": FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "feature_names": None if feature_names is None else [str(n) for n in feature_names],
+        "n_features": packed.n_features_in_,
+        "classes": packed.classes_.tolist(),
+        "classes_dtype": packed.classes_.dtype.str,
+        "n_estimators": packed.n_estimators,
+        "max_depth": packed.max_depth,
+        "node_count": packed.node_count,
+        "arrays": table,
+        "data_bytes": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "probe_sha256": probe_digest(packed),
+    }
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    prefix = MAGIC + struct.pack("<II", FORMAT_VERSION, len(header_bytes)) + header_bytes
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(prefix)
+        f.write(b"\0" * (_align(len(prefix)) - len(prefix)))
+        f.write(data)
+    os.replace(tmp_path, path)
+    return header
+
+
+def read_header(path):
+    """
+    Header of a model artifact, plus the file offset of its array region
+
+    Raises:
+        ValueError: if the file is not an artifact or has an unsupported version
+    """
+    with open(path, "rb") as f:
+        prefix = f.read(16)
+        if len(prefix) < 16 or prefix[:8] != MAGIC:
+            raise ValueError(f"{path} is not a model artifact")
+        version, header_len = struct.unpack("<II", prefix[8:])
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path} has artifact version {version}, expected {FORMAT_VERSION}")
+        header = json.loads(f.read(header_len).decode("utf-8"))
+    header["data_offset"] = _align(16 + header_len)
+    return header
+
+
+def load_artifact(path, mmap=True, verify=True):
+    """
+    Load a model artifact as a CompiledForest
+
+    Args:
+        path (str): Artifact file
+        mmap (bool): Map the arrays read-only (zero copy, pages shared
+                     between processes) rather than reading them into memory
+        verify (bool): Check the array region against the header's sha256
+
+    Returns:
+        CompiledForest: with artifact_path and artifact_header attributes set
+
+    Raises:
+        ValueError: if the file is malformed, truncated or fails its checksum
+    """
+    header = read_header(path)
+    buffer = np.memmap(path, dtype=np.uint8, mode="r") if mmap else np.fromfile(path, dtype=np.uint8)
+    # Plain ndarray views: memmap subclass bookkeeping on every gather is costly
+    data = np.asarray(buffer[header["data_offset"]:])
+    if len(data) != header["data_bytes"]:
+        raise ValueError(f"{path} is truncated ({len(data)} of {header['data_bytes']} data bytes)")
+    if verify and hashlib.sha256(data).hexdigest() != header["sha256"]:
+        raise ValueError(f"{path} failed its checksum")
+
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        start = spec["offset"]
+        arrays[name] = data[start:start + spec["nbytes"]].view(np.dtype(spec["dtype"])).reshape(spec["shape"])
+
+    compiled = CompiledForest(
+        max_depth=header["max_depth"],
+        classes=np.asarray(header["classes"], dtype=np.dtype(header["classes_dtype"])),
+        feature_names=header["feature_names"],
+        n_features=header["n_features"],
+        **arrays
+    )
+    compiled.artifact_path = path
+    compiled.artifact_header = header
+    return compiled
+
+
+def verify_artifact(path):
+    """
+    Check an artifact's checksum and that it still produces the predictions
+    fingerprinted at export
+
+    Returns:
+        bool: True if both match
+    """
+    try:
+        compiled = load_artifact(path)
+    except ValueError as e:
+        print(f"[ModelArtifact] {e}")
+        return False
+    return probe_digest(compiled) == compiled.artifact_header["probe_sha256"]
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "export"
+    # Only the configured paths are needed; don't load the model on import
+    os.environ.setdefault("MODEL_PRELOAD", "lazy")
+    from model_service import MODEL_ARTIFACT_PATH, MODEL_PATH
+
+    if command == "export":
+        import joblib
+
+        source = sys.argv[2] if len(sys.argv) > 2 else MODEL_PATH
+        target = sys.argv[3] if len(sys.argv) > 3 else os.path.splitext(source)[0] + ARTIFACT_SUFFIX
+        header = export_artifact(joblib.load(source), target)
+        print(f"[ModelArtifact] Wrote {target}: {header['n_estimators']} trees, {header['node_count']} nodes, "
+              f"{os.path.getsize(target) / 2 ** 20:.1f} MB (pickle {os.path.getsize(source) / 2 ** 20:.1f} MB), "
+              f"predictions identical to {source}")
+    elif command == "verify":
+        target = sys.argv[2] if len(sys.argv) > 2 else MODEL_ARTIFACT_PATH
+        ok = verify_artifact(target)
+        print(f"[ModelArtifact] {target}: {'OK' if ok else 'FAILED'}")
+        sys.exit(0 if ok else 1)
+    else:
+        print(__doc__)
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,880 @@
+import itertools
+import json
+import math
 import os
-import joblib
+import queue
+import random
+import copy
+import re
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
 import numpy as np
 
+from frozen import FrozenDict, freeze
+from inference_pool import INFERENCE_BACKEND, POOL_SHARE, InferencePool
+from metrics import Counter, Histogram
+from model_artifact import ARTIFACT_SUFFIX, load_artifact
+
 # Path to the model file
-MODEL_PATH = os.path.join(os.path.dirname(__file__), 'model', 'sleep_disorder_rf_tuned_no_subject.pkl')
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model')
+MODEL_PATH = os.path.join(MODEL_DIR, 'sleep_disorder_rf_tuned_no_subject.pkl')
+# Compact memory-mapped export of the same model (python model_artifact.py export)
+MODEL_ARTIFACT_PATH = os.environ.get("MODEL_ARTIFACT_PATH", os.path.splitext(MODEL_PATH)[0] + ARTIFACT_SUFFIX)
+# "auto" loads the artifact if it exists and is not older than the pickle;
+# "artifact" or "pickle" use only that format
+MODEL_FORMAT = os.environ.get("MODEL_FORMAT", "auto").lower()
+
+# Feature columns in the order the model was trained on
+FEATURE_ORDER = ["bvp", "acc_x", "acc_y", "acc_z", "temp"]
+FEATURE_DEFAULTS = {"bvp": 0.0, "acc_x": 0.0, "acc_y": 0.0, "acc_z": 0.0, "temp": 36.5}
+
+# Inference engine: "sklearn" (stock estimator) or "compiled" (flattened array evaluator)
+MODEL_ENGINE = os.environ.get("MODEL_ENGINE", "sklearn").lower()
 
+# Estimator serving the primary slot, kept in step with `registry` for
+# offline tools and benchmarks; requests go through the registry
 model = None
 
-def load_model():
-    global model
-    print(f"[ModelService] Checking model path: {MODEL_PATH}")
-    if os.path.exists(MODEL_PATH):
+# Inputs up to this many rows use a model's CompiledForest (when it has one).
+# It wins on small inputs where sklearn's per-call overhead dominates; large
+# batches go to sklearn's per-tree loops, which gather memory more efficiently.
+COMPILED_MAX_BATCH = 512
+
+# Per-thread preallocated (1, 5) input row for single-reading inference
+_row_buffers = threading.local()
+
+def _parse_quantization(spec):
+    """Parse "bvp=1,acc_x=0.01" into per-feature steps"""
+    steps = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, step = item.partition("=")
+        if name.strip() in FEATURE_ORDER:
+            steps[name.strip()] = float(step)
+    return steps
+
+class PredictionCache:
+    """
+    LRU + TTL cache of raw model classes keyed on quantized feature vectors.
+    Readings that round to the same grid point share one forest evaluation.
+    A step of 0 keys that feature on its exact value.
+    """
+
+    def __init__(self, max_size=1024, ttl=300.0, quantization=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.steps = [float((quantization or {}).get(name, 0.0)) for name in FEATURE_ORDER]
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def key(self, row, namespace=0):
+        """
+        Quantized cache key for one FEATURE_ORDER row (None if uncacheable).
+        namespace keeps entries of different models apart.
+        """
+        key = [namespace]
+        for value, step in zip(row.tolist(), self.steps):
+            if not math.isfinite(value):
+                return None
+            key.append(round(value / step) if step else value)
+        return tuple(key)
+
+    def get(self, key):
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, stored_at = entry
+            if self.ttl and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if key is None or not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def purge(self, namespace):
+        """Drop the entries of one namespace (a model version that stopped serving)"""
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == namespace]
+            for key in stale:
+                del self._entries[key]
+            if stale:
+                self.invalidations += 1
+        return len(stale)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "quantization": dict(zip(FEATURE_ORDER, self.steps)),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
+# Default grid: 1 BPM, 0.01 gyro units, 0.1 degree; override with
+# PREDICTION_CACHE_QUANTIZATION="bvp=1,acc_x=0.01,acc_y=0.01,acc_z=0.01,temp=0.1"
+CACHE_QUANTIZATION = {"bvp": 1.0, "acc_x": 0.01, "acc_y": 0.01, "acc_z": 0.01, "temp": 0.1}
+CACHE_QUANTIZATION.update(_parse_quantization(os.environ.get("PREDICTION_CACHE_QUANTIZATION", "")))
+
+prediction_cache = PredictionCache(
+    max_size=int(os.environ.get("PREDICTION_CACHE_SIZE", 1024)),
+    ttl=float(os.environ.get("PREDICTION_CACHE_TTL", 300)),
+    quantization=CACHE_QUANTIZATION
+)
+
+# Bucket bounds for the scheduler's batch size (rows) and queue wait (seconds) histograms
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+QUEUE_WAIT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.002, 0.003, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+class InferenceScheduler:
+    """
+    Micro-batching front end for in-process inference
+
+    Callers block in predict() while a dispatcher thread gathers queued
+    requests into one matrix, evaluates it with a single model call and
+    hands each caller its own rows. A batch closes once it holds max_batch
+    rows or its oldest request has waited max_wait seconds; requests that
+    queue up while a batch is running are taken without further waiting.
+    """
+
+    def __init__(self, run, max_batch=64, max_wait=0.002):
+        self._run = run
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.requests = Counter()
+        self.batches = Counter()
+        self.errors = Counter()
+        self.batch_rows = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait = Histogram(QUEUE_WAIT_BUCKETS)
+
+    def _ensure_started(self):
+        # Started on first use so importing the module never spawns threads
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="inference-scheduler", daemon=True)
+                    self._thread.start()
+
+    def submit(self, X):
+        """Queue a matrix for the next batch; returns a Future of its labels"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((X, future, time.perf_counter()))
+        return future
+
+    def predict(self, X):
+        """Labels for X, evaluated together with whatever else is queued"""
+        return self.submit(X).result()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None, 0
+        batch, rows = [first], len(first[0])
+        deadline = first[2] + self.max_wait
+        while rows < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Finish this batch, then stop
+                self._queue.put(None)
+                break
+            batch.append(item)
+            rows += len(item[0])
+        return batch, rows
+
+    def _loop(self):
+        while True:
+            batch, rows = self._collect()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            for _, _, queued_at in batch:
+                self.queue_wait.observe(started - queued_at)
+            self.batch_rows.observe(rows)
+            self.requests.inc(len(batch))
+            self.batches.inc()
+
+            try:
+                X = batch[0][0] if len(batch) == 1 else np.concatenate([x for x, _, _ in batch])
+                labels = self._run(X)
+            except Exception as e:
+                self.errors.inc()
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            start = 0
+            for x, future, _ in batch:
+                future.set_result(labels[start:start + len(x)])
+                start += len(x)
+
+    def stop(self):
+        """Stop the dispatcher once everything already queued has been answered"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(5)
+
+    def stats(self):
+        batch_rows = self.batch_rows.snapshot()
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "requests": self.requests.value,
+            "batches": self.batches.value,
+            "errors": self.errors.value,
+            "mean_batch_rows": round(batch_rows["mean"], 2) if batch_rows["mean"] is not None else None,
+            "batch_rows": batch_rows,
+            "queue_wait_seconds": self.queue_wait.snapshot()
+        }
+
+def _validate_features(loaded_model):
+    """
+    Check the model's training columns once at load time so inference can
+    pass plain NumPy arrays instead of building a DataFrame per call.
+
+    Returns:
+        list: Column permutation to apply to FEATURE_ORDER matrices, or None
+              if the model was trained on exactly FEATURE_ORDER
+    """
+    names = getattr(loaded_model, "feature_names_in_", None)
+    if names is None:
+        return None
+
+    names = [str(n) for n in names]
+    if sorted(names) != sorted(FEATURE_ORDER):
+        raise ValueError(f"Model expects features {names}, service provides {FEATURE_ORDER}")
+
+    return None if names == FEATURE_ORDER else [FEATURE_ORDER.index(n) for n in names]
+
+def _unnamed(estimator):
+    """
+    Shallow copy of a fitted estimator without feature_names_in_, sharing its
+    trees. Columns were checked by _validate_features, so this copy takes
+    plain arrays without sklearn warning about missing feature names.
+    """
+    if getattr(estimator, "feature_names_in_", None) is None:
+        return estimator
+    estimator = copy.copy(estimator)
+    del estimator.feature_names_in_
+    return estimator
+
+def _compile_model(loaded_model, force=False):
+    """
+    Build the flattened tree evaluator and check it against the stock model.
+    Returns None (stock sklearn inference) if compilation is disabled or fails.
+    """
+    if MODEL_ENGINE != "compiled" and not force:
+        return None
+
+    from compiled_forest import CompiledForest, verify_equivalence
+
+    try:
+        compiled = CompiledForest.from_sklearn(loaded_model)
+        mismatches = verify_equivalence(_unnamed(loaded_model), compiled)
+        if mismatches:
+            print(f"[ModelService] WARN: Compiled forest disagrees on {mismatches} probe rows, using sklearn")
+            return None
+        print(f"[ModelService] Compiled forest: {compiled.n_estimators} trees, {compiled.node_count} nodes")
+        return compiled
+    except Exception as e:
+        print(f"[ModelService] WARN: Could not compile model ({e}), using sklearn")
+        return None
+
+def _start_pool(loaded_model, compiled):
+    """
+    Start worker processes sharing the model when INFERENCE_BACKEND is
+    "process": the stock estimator copy-on-write (INFERENCE_POOL_SHARE=fork)
+    or a memory-mapped CompiledForest. Returns None (in-process inference)
+    otherwise, or if the pool cannot be started.
+    """
+    if INFERENCE_BACKEND != "process":
+        return None
+
+    if POOL_SHARE != "fork":
+        loaded_model = compiled or _compile_model(loaded_model, force=True)
+        if loaded_model is None:
+            print("[ModelService] WARN: Process backend needs a compiled forest, using in-process inference")
+            return None
+    try:
+        pool = InferencePool(_unnamed(loaded_model) if POOL_SHARE == "fork" else loaded_model)
+        print(f"[ModelService] Inference pool: {pool.workers} worker processes ({pool.share} model sharing)")
+        return pool
+    except Exception as e:
+        print(f"[ModelService] WARN: Could not start inference pool ({e}), using in-process inference")
+        return None
+
+# Set INFERENCE_BATCHING=1 to micro-batch concurrent in-process predictions
+# (the process backend batches on its own)
+INFERENCE_BATCHING = os.environ.get("INFERENCE_BATCHING", "0") == "1"
+INFERENCE_MAX_BATCH = int(os.environ.get("INFERENCE_MAX_BATCH", 64))
+INFERENCE_MAX_WAIT_MS = float(os.environ.get("INFERENCE_MAX_WAIT_MS", 2.0))
+
+class ModelVersion:
+    """
+    One loaded model with everything needed to serve it: the estimator, its
+    compiled evaluator, worker pool, micro-batching scheduler and column
+    order, plus its own latency and class-distribution counters.
+
+    Requests hold a version from route() to release(), so a swap never
+    changes the model under a request in flight. A retired version stops
+    its pool and scheduler once the last of those requests has released it.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, slot, source, estimator, compiled=None, pool=None, column_order=None, batch_source=None):
+        self.id = next(ModelVersion._ids)
+        self.slot = slot
+        self.source = source
+        self.estimator = estimator
+        self.compiled = compiled
+        self.pool = pool
+        self.column_order = column_order
+        # Pickle loaded on the first batch above COMPILED_MAX_BATCH when the
+        # estimator itself is a CompiledForest read from an artifact
+        self.batch_source = batch_source
+        # The sklearn forest itself serves large batches unless it has to be loaded first
+        self._batch_estimator = None if batch_source or estimator is compiled else _unnamed(estimator)
+        self._batch_lock = threading.Lock()
+        self.loaded_at = time.time()
+        self.scheduler = InferenceScheduler(
+            self.run, max_batch=INFERENCE_MAX_BATCH, max_wait=INFERENCE_MAX_WAIT_MS / 1000.0
+        ) if INFERENCE_BATCHING and pool is None else None
+
+        self.requests = Counter()
+        self.rows = Counter()
+        self.errors = Counter()
+        self.latency = Histogram()
+        self.classes = {}
+        self._classes_lock = threading.Lock()
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._retired = False
+        self._closed = False
+
+    def run(self, X):
+        """Evaluate the in-process estimator on a matrix in the model's column order"""
+        if self.compiled is not None and len(X) <= COMPILED_MAX_BATCH:
+            return self.compiled.predict(X)
+        return self.batch_estimator().predict(X)
+
+    def batch_estimator(self):
+        """
+        Estimator for batches above COMPILED_MAX_BATCH: the sklearn forest,
+        unpickled from batch_source on first use for artifact-loaded models
+        (falling back to the compiled forest if that fails or disagrees)
+        """
+        if self._batch_estimator is None:
+            if self.batch_source is None:
+                return self.estimator
+            with self._batch_lock:
+                if self._batch_estimator is None:
+                    self._batch_estimator = _load_batch_estimator(self.batch_source, self.compiled)
+        return self._batch_estimator
+
+    def _evaluate(self, X):
+        if self.column_order is not None:
+            X = X[:, self.column_order]
+        if self.pool is not None:
+            return self.pool.predict(X)
+        # Small requests share a batch with concurrent callers; large ones are batches already
+        if self.scheduler is not None and len(X) < self.scheduler.max_batch:
+            return self.scheduler.predict(X)
+        return self.run(X)
+
+    def predict(self, X):
+        """Labels for an (N, 5) FEATURE_ORDER matrix"""
+        start = time.perf_counter()
         try:
-            print(f"[ModelService] Attempting to load model from {MODEL_PATH}...")
-            model = joblib.load(MODEL_PATH)
-            print(f"[ModelService] SUCCESS: Model loaded from {MODEL_PATH}")
+            labels = self._evaluate(X)
+        except Exception:
+            self.errors.inc()
+            raise
+        self.latency.observe(time.perf_counter() - start)
+        self.rows.inc(len(X))
+        return labels
+
+    def count_classes(self, labels):
+        """Record served predictions (model or cache) in the class distribution"""
+        counts = {}
+        for label in labels:
+            counts[label] = counts.get(label, 0) + 1
+        for label, n in counts.items():
+            counter = self.classes.get(label)
+            if counter is None:
+                with self._classes_lock:
+                    counter = self.classes.setdefault(label, Counter())
+            counter.inc(n)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def acquire(self, count=True):
+        """
+        Hold this version for one request; False once it has been closed.
+        count=False holds it without recording a served request.
+        """
+        with self._lock:
+            if self._closed:
+                return False
+            self._in_flight += 1
+        if count:
+            self.requests.inc()
+        return True
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+            close = self._retired and self._in_flight == 0 and not self._closed
+            self._closed = self._closed or close
+        if close:
+            self._close_async()
+
+    def retire(self):
+        """Stop serving: close now if idle, otherwise when the last request releases"""
+        with self._lock:
+            self._retired = True
+            close = self._in_flight == 0 and not self._closed
+            self._closed = self._closed or close
+        if close:
+            self._close_async()
+
+    def _close_async(self):
+        # No request can look this version up any more, so its cached predictions are dead weight
+        prediction_cache.purge(self.id)
+        # Pool shutdown waits for its workers; keep that off the request path
+        if self.pool is not None or self.scheduler is not None:
+            threading.Thread(target=self.close, name=f"model-close-{self.id}", daemon=True).start()
+
+    def close(self):
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        if self.pool is not None:
+            self.pool.stop()
+        print(f"[ModelService] Retired model {self.id} ({self.slot}: {os.path.basename(self.source)})")
+
+    def stats(self):
+        stats = {
+            "id": self.id,
+            "slot": self.slot,
+            "source": os.path.basename(self.source),
+            "loaded_at": self.loaded_at,
+            "engine": "compiled" if self.compiled is not None else "sklearn",
+            "backend": "process" if self.pool is not None else "local",
+            "in_flight": self.in_flight,
+            "requests": self.requests.value,
+            "rows": self.rows.value,
+            "errors": self.errors.value,
+            "latency_seconds": self.latency.snapshot(),
+            "classes": {str(label): c.value for label, c in sorted(list(self.classes.items()), key=lambda item: str(item[0]))}
+        }
+        if self.scheduler is not None:
+            stats["scheduler"] = self.scheduler.stats()
+        return stats
+
+def _warmup(version):
+    # One row in FEATURE_ORDER through the serving path, skipping the prediction cache and counters
+    version._evaluate(np.array([[FEATURE_DEFAULTS[name] for name in FEATURE_ORDER]], dtype=np.float64))
+    # And the large-batch estimator, so the first big batch does not pay for unpickling it
+    if version.pool is None:
+        version.batch_estimator()
+
+def _artifact_pickle(artifact_path):
+    """
+    The pickle an artifact was exported from, used for large batches, or
+    None when there is none or MODEL_ENGINE=compiled keeps every batch on
+    the compiled forest
+    """
+    if MODEL_ENGINE == "compiled":
+        return None
+    stem = os.path.splitext(artifact_path)[0]
+    candidates = [stem + ".pkl", stem + ".joblib"]
+    if os.path.abspath(artifact_path) == os.path.abspath(MODEL_ARTIFACT_PATH):
+        candidates.insert(0, MODEL_PATH)
+    return next((path for path in candidates if os.path.exists(path)), None)
+
+def _load_batch_estimator(path, compiled):
+    import joblib
+    from compiled_forest import verify_equivalence
+
+    try:
+        estimator = _unnamed(joblib.load(path))
+        mismatches = verify_equivalence(estimator, compiled)
+        if mismatches:
+            print(f"[ModelService] WARN: {path} disagrees with the artifact on {mismatches} probe rows, "
+                  f"large batches stay on the compiled forest")
+            return compiled
+        print(f"[ModelService] Large batches use the sklearn forest from {path}")
+        return estimator
+    except Exception as e:
+        print(f"[ModelService] WARN: Could not load {path} for large batches ({e}), using the compiled forest")
+        return compiled
+
+def _model_source():
+    """Path to load per MODEL_FORMAT, or None if there is nothing to load"""
+    has_artifact = MODEL_FORMAT != "pickle" and os.path.exists(MODEL_ARTIFACT_PATH)
+    has_pickle = MODEL_FORMAT != "artifact" and os.path.exists(MODEL_PATH)
+    if has_artifact and has_pickle and os.path.getmtime(MODEL_PATH) > os.path.getmtime(MODEL_ARTIFACT_PATH):
+        print(f"[ModelService] WARN: {MODEL_ARTIFACT_PATH} is older than the pickle, re-export it; using the pickle")
+        return MODEL_PATH
+    if has_artifact:
+        return MODEL_ARTIFACT_PATH
+    return MODEL_PATH if has_pickle else None
+
+MODEL_FILE_SUFFIXES = (".pkl", ".joblib", ARTIFACT_SUFFIX)
+
+def resolve_model_file(name):
+    """
+    Path of a model file named by a client, which must sit directly in MODEL_DIR
+
+    Raises:
+        ValueError: for paths outside MODEL_DIR, unknown suffixes or missing files
+    """
+    path = os.path.abspath(os.path.join(MODEL_DIR, str(name)))
+    if os.path.dirname(path) != MODEL_DIR:
+        raise ValueError("Model files must be named relative to the model directory")
+    if not path.endswith(MODEL_FILE_SUFFIXES):
+        raise ValueError(f"Model files must end with one of {', '.join(MODEL_FILE_SUFFIXES)}")
+    if not os.path.isfile(path):
+        raise ValueError(f"No model file {os.path.basename(path)}")
+    return path
+
+_SLOT_NAME = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
+
+def validate_slot(name):
+    """Slot name from a client (letters, digits, - and _)"""
+    if not isinstance(name, str) or not _SLOT_NAME.match(name):
+        raise ValueError("Slot names are 1-32 letters, digits, '-' or '_'")
+    return name
+
+# How the model is loaded at startup:
+#   "sync"       - at import, before the server answers anything (default)
+#   "background" - on a daemon thread; /health and the diet routes answer at
+#                  once and predictions wait for the load (see /ready)
+#   "lazy"       - on the first prediction
+MODEL_PRELOAD = os.environ.get("MODEL_PRELOAD", "sync").lower()
+# Set MODEL_WARMUP=1 to run a dummy prediction once the model is loaded
+MODEL_WARMUP = os.environ.get("MODEL_WARMUP", "0") == "1"
+
+PRIMARY_SLOT = "primary"
+LOAD_STAGES = ("importing", "reading", "validating", "compiling", "starting_pool", "warming_up", "ready")
+
+class ModelRegistry:
+    """
+    Named model slots with atomic swaps and a percentage traffic split
+
+    The "primary" slot serves every request not routed elsewhere by the
+    split. Loads run one at a time, so at most one model beyond those being
+    served is in memory; the replaced version is retired on swap and freed
+    once its in-flight requests finish. Readers never take a lock: slots
+    and the split are replaced wholesale, never mutated.
+    """
+
+    def __init__(self):
+        self._slots = {}
+        # ((slot, cumulative percent), ...) checked in order against one random draw
+        self._split = ()
+        self._split_percent = {}
+        self._lock = threading.Lock()
+        # Serializes loads, so requests arriving mid-load wait for it instead of starting another
+        self._load_lock = threading.RLock()
+        # Slot -> thread of the latest load_async(), so ensure_loaded can wait for a preload not yet started
+        self._load_threads = {}
+        self.status = {"state": "pending", "slot": None, "source": None, "stage": None,
+                       "started": None, "finished": None, "error": None}
+        self.loads = Counter()
+        self.load_failures = Counter()
+
+    def get(self, slot=PRIMARY_SLOT):
+        return self._slots.get(slot)
+
+    def split(self):
+        """Percent of traffic routed to each non-primary slot"""
+        return dict(self._split_percent)
+
+    def versions(self):
+        """(slot, ModelVersion) pairs currently serving"""
+        return list(self._slots.items())
+
+    def route(self):
+        """
+        Version to serve one request, per the traffic split, already acquired
+        (call release() when done). None if no model is loaded.
+        """
+        while True:
+            slots = self._slots
+            version = slots.get(PRIMARY_SLOT)
+            if self._split:
+                draw = random.random() * 100.0
+                for slot, upper in self._split:
+                    if draw < upper:
+                        version = slots.get(slot, version)
+                        break
+            if version is None or version.acquire():
+                return version
+            # Lost a race with a swap that closed this version; the new one is in place now
+
+    def internal(self):
+        """
+        Primary version for the server's own scoring (rollups, sleep
+        analysis), already acquired but outside the traffic split and the
+        request counters. None if no model is loaded.
+        """
+        while True:
+            version = self._slots.get(PRIMARY_SLOT)
+            if version is None or version.acquire(count=False):
+                return version
+
+    def install(self, slot, version):
+        """Publish a version in a slot and retire the one it replaces"""
+        global model
+        with self._lock:
+            slots = dict(self._slots)
+            previous = slots.get(slot)
+            slots[slot] = version
+            self._slots = slots
+            if slot == PRIMARY_SLOT:
+                model = version.estimator
+        if previous is not None:
+            previous.retire()
+        print(f"[ModelService] Slot {slot} now serving model {version.id} ({os.path.basename(version.source)})")
+
+    def unload(self, slot):
+        """Remove a non-primary slot and its share of traffic"""
+        if slot == PRIMARY_SLOT:
+            raise ValueError("The primary slot cannot be unloaded")
+        with self._lock:
+            slots = dict(self._slots)
+            previous = slots.pop(slot, None)
+            if previous is None:
+                raise ValueError(f"No model in slot {slot!r}")
+            self._set_split_locked(slot, 0.0)
+            self._slots = slots
+        previous.retire()
+
+    def set_split(self, slot, percent):
+        """
+        Route percent (0-100) of requests to slot instead of primary
+
+        Raises:
+            ValueError: for the primary slot, an empty slot, or splits above 100% in total
+        """
+        percent = float(percent)
+        if slot == PRIMARY_SLOT:
+            raise ValueError("Primary receives whatever the other slots do not")
+        if not 0.0 <= percent <= 100.0:
+            raise ValueError("percent must be between 0 and 100")
+        with self._lock:
+            if percent and slot not in self._slots:
+                raise ValueError(f"No model in slot {slot!r}")
+            self._set_split_locked(slot, percent)
+
+    def _set_split_locked(self, slot, percent):
+        shares = dict(self._split_percent)
+        shares.pop(slot, None)
+        if percent:
+            shares[slot] = percent
+        if sum(shares.values()) > 100.0:
+            raise ValueError("Traffic split exceeds 100%")
+        cumulative, total = [], 0.0
+        for name, share in sorted(shares.items()):
+            total += share
+            cumulative.append((name, total))
+        self._split_percent = shares
+        self._split = tuple(cumulative)
+
+    def _set_stage(self, stage):
+        self.status["stage"] = stage
+        if stage == "ready":
+            self.status["state"] = "ready"
+            self.status["finished"] = time.time()
+
+    def _build(self, slot, source):
+        if source.endswith(ARTIFACT_SUFFIX):
+            # Node arrays are memory-mapped; no sklearn import or unpickling
+            self._set_stage("reading")
+            loaded = load_artifact(source)
+            self._set_stage("validating")
+            column_order = _validate_features(loaded)
+            compiled = loaded
+        else:
+            # Deferred so importing this module stays cheap
+            self._set_stage("importing")
+            import joblib
+            self._set_stage("reading")
+            loaded = joblib.load(source)
+            self._set_stage("validating")
+            column_order = _validate_features(loaded)
+            self._set_stage("compiling")
+            compiled = _compile_model(loaded)
+        self._set_stage("starting_pool")
+        batch_source = _artifact_pickle(source) if source.endswith(ARTIFACT_SUFFIX) else None
+        version = ModelVersion(slot, source, loaded, compiled, _start_pool(loaded, compiled), column_order,
+                               batch_source)
+        if MODEL_WARMUP:
+            self._set_stage("warming_up")
+            try:
+                _warmup(version)
+            except Exception:
+                version.close()
+                raise
+        return version
+
+    def load(self, slot=PRIMARY_SLOT, source=None):
+        """
+        Load a model file into a slot, replacing what it serves once loaded
+
+        Blocks until done; requests keep using the current version meanwhile.
+
+        Returns:
+            bool: True on success (failures are logged and kept in status)
+        """
+        with self._load_lock:
+            source = source or _model_source()
+            print(f"[ModelService] Checking model path: {source or MODEL_PATH}")
+            self.status = {"state": "loading", "slot": slot, "source": source and os.path.basename(source),
+                           "stage": None, "started": time.time(), "finished": None, "error": None}
+            if source is None or not os.path.exists(source):
+                missing = source or MODEL_PATH
+                print(f"[ModelService] ERROR: Model file NOT FOUND at {missing}")
+                print(f"[ModelService] Current working directory: {os.getcwd()}")
+                print(f"[ModelService] Directory contents of {os.path.dirname(missing)}:")
+                self.status.update(state="failed", finished=time.time(), error=f"Model file not found at {missing}")
+                self.load_failures.inc()
+                try:
+                    print(os.listdir(os.path.dirname(missing)))
+                except Exception as e:
+                    print(f"Could not list directory: {e}")
+                return False
+
+            try:
+                print(f"[ModelService] Attempting to load model from {source}...")
+                version = self._build(slot, source)
+            except Exception as e:
+                print(f"[ModelService] ERROR: Failed to load model: {e}")
+                self.status.update(state="failed", finished=time.time(), error=str(e))
+                self.load_failures.inc()
+                import traceback
+                traceback.print_exc()
+                return False
+
+            self.install(slot, version)
+            self._set_stage("ready")
+            self.loads.inc()
+            print(f"[ModelService] SUCCESS: Model loaded from {source}")
             return True
-        except Exception as e:
-            print(f"[ModelService] ERROR: Failed to load model: {e}")
-            import traceback
-            traceback.print_exc()
-            return False
-    else:
-        print(f"[ModelService] ERROR: Model file NOT FOUND at {MODEL_PATH}")
-        print(f"[ModelService] Current working directory: {os.getcwd()}")
-        print(f"[ModelService] Directory contents of {os.path.dirname(MODEL_PATH)}:")
-        try:
-            print(os.listdir(os.path.dirname(MODEL_PATH)))
-        except Exception as e:
-            print(f"Could not list directory: {e}")
-        return False
 
-# Load model on startup
-load_model()
+    def load_async(self, slot=PRIMARY_SLOT, source=None):
+        """load() on a daemon thread; progress is reported in status"""
+        thread = threading.Thread(target=self.load, args=(slot, source), name=f"model-load-{slot}", daemon=True)
+        # Loading from now on, not only once the thread gets to run
+        self.status = dict(self.status, state="loading", slot=slot, stage=None,
+                           started=time.time(), finished=None, error=None)
+        self._load_threads[slot] = thread
+        thread.start()
+        return thread
+
+    def ensure_loaded(self):
+        """True once a primary model is available, waiting for a load already in progress"""
+        if PRIMARY_SLOT in self._slots:
+            return True
+        thread = self._load_threads.get(PRIMARY_SLOT)
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+            if PRIMARY_SLOT in self._slots:
+                return True
+        with self._load_lock:
+            if PRIMARY_SLOT in self._slots:
+                return True
+            print("[ModelService] WARN: Model object is None. Attempting lazy reload...")
+            return self.load()
+
+    def stats(self):
+        status = dict(self.status)
+        started, finished = status.pop("started"), status.pop("finished")
+        if started is not None:
+            status["elapsed_seconds"] = round((finished or time.time()) - started, 3)
+        return {
+            "slots": {slot: version.stats() for slot, version in list(self._slots.items())},
+            "split_percent": self.split(),
+            "loads": self.loads.value,
+            "load_failures": self.load_failures.value,
+            "last_load": status
+        }
+
+registry = ModelRegistry()
+
+def load_model():
+    """Load (or reload) the primary model from MODEL_PATH / MODEL_ARTIFACT_PATH"""
+    return registry.load(PRIMARY_SLOT)
+
+def _ensure_model():
+    return registry.ensure_loaded()
 
-import pandas as pd
+def model_readiness():
+    """
+    Model load state for the readiness probe
+
+    Returns:
+        dict: ready, state (pending/loading/ready/failed), current stage,
+              progress (0-1 over LOAD_STAGES), elapsed seconds and any error
+    """
+    status = dict(registry.status)
+    stage = status["stage"]
+    started, finished = status.pop("started"), status.pop("finished")
+    status["ready"] = registry.get() is not None
+    status["preload"] = MODEL_PRELOAD
+    status["progress"] = round((LOAD_STAGES.index(stage) + 1) / len(LOAD_STAGES), 2) if stage else 0.0
+    if started is not None:
+        status["elapsed_seconds"] = round((finished or time.time()) - started, 3)
+    return status
+
+# Load model on startup
+if MODEL_PRELOAD == "background":
+    registry.load_async(PRIMARY_SLOT)
+elif MODEL_PRELOAD != "lazy":
+    load_model()
 
 # Diet recommendations based on conditions
 # Mapping of model classes (0-4) to conditions
@@ -100,51 +940,218 @@ DIET_RECOMMENDATIONS = {
     }
 }
 
+def to_json_bytes(value):
+    """Compact JSON encoding used for pre-serialized responses"""
+    return json.dumps(value, separators=(",", ":")).encode()
+
+DIET_RECOMMENDATIONS = freeze(DIET_RECOMMENDATIONS)
+
+def _precompute_result(prediction):
+    """Immutable response for one raw model class, with its JSON pre-serialized"""
+    condition = CLASS_MAPPING.get(prediction, "Unknown Condition")
+    result = dict(DIET_RECOMMENDATIONS.get(condition, DIET_RECOMMENDATIONS["Normal sleep"]))
+
+    result["condition"] = condition
+    result["source"] = "ml_model"
+    result["raw_prediction"] = prediction
+
+    result = FrozenDict(result)
+    result.json_bytes = to_json_bytes(result)
+    return result
+
+# One shared, read-only response per model class, built once at import
+PREDICTION_RESPONSES = {prediction: _precompute_result(prediction) for prediction in CLASS_MAPPING}
+
 def predict_disease(data):
     """
     Predict disease based on input data.
     Expected data format: { "bvp": float, "acc_x": float, "acc_y": float, "acc_z": float, "temp": float, "subject": str }
     """
-    global model
-    
-    if not model:
-        print("[ModelService] WARN: Model object is None. Attempting lazy reload...")
-        success = load_model()
-        if not success:
-            return {"error": "Model not loaded - reload failed. Check server logs."}
+    if not _ensure_model():
+        return {"error": "Model not loaded - reload failed. Check server logs."}
 
+    version = None
     try:
-        # Prepare input dataframe matching the model's training columns
-        # Columns: ["bvp", "acc_x", "acc_y", "acc_z", "temp", "subject"]
-        input_data = {
-            "bvp": [float(data.get('bvp', 0))],
-            "acc_x": [float(data.get('acc_x', 0))],
-            "acc_y": [float(data.get('acc_y', 0))],
-            "acc_z": [float(data.get('acc_z', 0))],
-            "temp": [float(data.get('temp', 36.5))] # Default body temp
-        }
-        
-        df = pd.DataFrame(input_data)
-        
-        # Predict
-        prediction = model.predict(df)[0]
-        
-        # Convert numpy types to native python types for JSON serialization
-        if hasattr(prediction, 'item'):
-            prediction = prediction.item()
+        version = registry.route()
+        # Fill this thread's preallocated row in FEATURE_ORDER (no DataFrame needed)
+        X = _single_row_matrix(data)
+
+        # Identical or near-identical readings skip the forest entirely
+        key = prediction_cache.key(X[0], version.id) if prediction_cache.enabled else None
+        prediction = prediction_cache.get(key)
+
+        if prediction is None:
+            prediction = version.predict(X)[0]
             
-        # Map prediction to recommendations
-        # The model returns an integer class (0-4)
-        
-        condition = CLASS_MAPPING.get(prediction, "Unknown Condition")
-        result = DIET_RECOMMENDATIONS.get(condition, DIET_RECOMMENDATIONS["Normal sleep"])
-        
-        result["condition"] = condition
-        result["source"] = "ml_model"
-        result["raw_prediction"] = prediction
-        
-        return result
+            # Convert numpy types to native python types for JSON serialization
+            if hasattr(prediction, 'item'):
+                prediction = prediction.item()
+            prediction_cache.put(key, prediction)
+
+        version.count_classes((prediction,))
+        return _build_result(prediction)
 
     except Exception as e:
         print(f"Prediction error: {e}")
         return {"error": f"Prediction failed: {str(e)}"}
+    finally:
+        if version is not None:
+            version.release()
+
+
+def _build_result(prediction):
+    """
+    Map a raw model class (0-4) to its condition and diet recommendations.
+    Returns the shared precomputed FrozenDict - no per-call copying.
+    """
+    result = PREDICTION_RESPONSES.get(prediction)
+    if result is None:
+        result = _precompute_result(prediction)
+    return result
+
+def prediction_json(result):
+    """Serialized prediction: pre-built bytes for model results, encoded on the fly for errors"""
+    body = getattr(result, "json_bytes", None)
+    return body if body is not None else to_json_bytes(result)
+
+def batch_json(result):
+    """
+    Serialize a predict_batch result by joining each row's pre-built bytes,
+    so the static recommendation lists are never re-encoded
+    """
+    if "predictions" not in result:
+        return to_json_bytes(result)
+    rows = b",".join(prediction_json(row) for row in result["predictions"])
+    head = to_json_bytes({k: v for k, v in result.items() if k != "predictions"})
+    return head[:-1] + b',"predictions":[' + rows + b"]}"
+
+def _single_row_matrix(data):
+    """Write one reading into this thread's reusable (1, 5) float64 buffer"""
+    X = getattr(_row_buffers, "row", None)
+    if X is None:
+        X = _row_buffers.row = np.empty((1, len(FEATURE_ORDER)), dtype=np.float64)
+
+    row = X[0]
+    for j, name in enumerate(FEATURE_ORDER):
+        row[j] = float(data.get(name, FEATURE_DEFAULTS[name]))
+    return X
+
+def _predict_matrix(X):
+    """Labels for an (N, 5) FEATURE_ORDER matrix from the routed model version"""
+    version = registry.route()
+    try:
+        labels = version.predict(X)
+        version.count_classes(labels.tolist())
+        return labels
+    finally:
+        version.release()
+
+def _rows_to_matrix(rows):
+    """
+    Convert readings to an (N, 5) float64 matrix in FEATURE_ORDER.
+    Accepts a list of reading dicts, a columnar dict of equal-length lists,
+    or a pandas DataFrame (offline tools). Keys outside FEATURE_ORDER are
+    ignored and missing features take their defaults.
+
+    Raises:
+        ValueError: for any other shape, or values that are not numbers
+    """
+    if hasattr(rows, "to_numpy"):
+        return rows.reindex(columns=FEATURE_ORDER).fillna(FEATURE_DEFAULTS).to_numpy(dtype=np.float64)
+
+    if isinstance(rows, dict):
+        columns = {name: rows[name] for name in FEATURE_ORDER if name in rows}
+        if not columns:
+            raise ValueError(f"Columnar input needs at least one of {', '.join(FEATURE_ORDER)}")
+        for name, column in columns.items():
+            if not isinstance(column, (list, tuple)):
+                raise ValueError(f"Column {name!r} must be an array")
+        if len({len(column) for column in columns.values()}) != 1:
+            raise ValueError("Columnar input must contain equal-length arrays")
+        n = len(next(iter(columns.values())))
+        X = np.empty((n, len(FEATURE_ORDER)), dtype=np.float64)
+        for j, name in enumerate(FEATURE_ORDER):
+            column = columns.get(name)
+            if column is None:
+                X[:, j] = FEATURE_DEFAULTS[name]
+                continue
+            try:
+                X[:, j] = np.asarray(column, dtype=np.float64)
+            except (TypeError, ValueError):
+                raise ValueError(f"Column {name!r} must contain only numbers") from None
+        return X
+
+    if isinstance(rows, (list, tuple)):
+        X = np.empty((len(rows), len(FEATURE_ORDER)), dtype=np.float64)
+        for i, row in enumerate(rows):
+            if not isinstance(row, dict):
+                raise ValueError(f"Reading {i} must be an object of feature values")
+            for j, name in enumerate(FEATURE_ORDER):
+                try:
+                    X[i, j] = float(row.get(name, FEATURE_DEFAULTS[name]))
+                except (TypeError, ValueError):
+                    raise ValueError(f"Reading {i}: {name!r} must be a number") from None
+        return X
+
+    raise ValueError("Readings must be a JSON array of objects or a columnar object of arrays")
+
+def predict_batch(rows):
+    """
+    Predict conditions for many readings with a single model call.
+    Expected data format: [{ "bvp": float, "acc_x": float, ... }, ...]
+                      or  { "bvp": [float], "acc_x": [float], ... }
+
+    Raises:
+        ValueError: for malformed readings (see _rows_to_matrix)
+    """
+    if not _ensure_model():
+        return {"error": "Model not loaded - reload failed. Check server logs."}
+
+    start = time.perf_counter()
+    X = _rows_to_matrix(rows)
+    if len(X) == 0:
+        return {"count": 0, "predictions": [], "elapsed_ms": 0.0, "rows_per_sec": 0.0}
+
+    try:
+        predictions = _predict_matrix(X)
+        results = [_build_result(p.item() if hasattr(p, 'item') else p) for p in predictions]
+        elapsed = time.perf_counter() - start
+
+        return {
+            "count": len(results),
+            "predictions": results,
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "rows_per_sec": round(len(results) / elapsed, 1) if elapsed > 0 else None
+        }
+
+    except Exception as e:
+        print(f"Batch prediction error: {e}")
+        return {"error": f"Batch prediction failed: {str(e)}"}
+
+def predict_classes(X):
+    """
+    Raw model classes for an (N, 5) FEATURE_ORDER matrix, for pipelines that
+    build their own responses. Raises RuntimeError if no model is available.
+    """
+    if not _ensure_model():
+        raise RuntimeError("Model not loaded - reload failed. Check server logs.")
+    # Internal scoring: primary model only, kept out of the A/B request and class counters
+    version = registry.internal()
+    if version is None:
+        raise RuntimeError("Model not loaded - reload failed. Check server logs.")
+    try:
+        return version._evaluate(np.asarray(X, dtype=np.float64))
+    finally:
+        version.release()
+
+def inference_stats():
+    """Which inference backend is serving the primary model, with pool/scheduler counters if any"""
+    version = registry.get()
+    if version is None:
+        return {"backend": None, "engine": None}
+    if version.pool is not None:
+        return version.pool.stats()
+    stats = {"backend": "local", "engine": "compiled" if version.compiled is not None else "sklearn"}
+    if version.scheduler is not None:
+        stats["scheduler"] = version.scheduler.stats()
+    return stats
@@ -0,0 +1,569 @@
+"""
+Sensor Ingestion Module
+Polls Firebase once in the background and keeps recent readings in memory
+so request handlers never wait on the network. SensorIngestWorker follows
+the original root-level device; DeviceIngestWorker follows every device
+listed under FIREBASE_DEVICES_PATH.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from firebase_service import FirebaseService
+from instrumentation import stage
+from metrics import Counter, Histogram
+from model_service import BATCH_SIZE_BUCKETS, predict_batch, predict_disease
+from sleep_summary import DEFAULT_USER, summary_engine
+
+# Seconds between Firebase polls
+POLL_INTERVAL = float(os.environ.get("SENSOR_POLL_INTERVAL", 2.0))
+# Readings kept in memory
+BUFFER_CAPACITY = int(os.environ.get("SENSOR_BUFFER_CAPACITY", 4096))
+# Serve from memory only while the last successful poll is this recent (seconds)
+MAX_AGE = float(os.environ.get("SENSOR_MAX_AGE", 30.0))
+# Set SENSOR_INGEST=0 to fetch from Firebase on every request instead
+INGEST_ENABLED = os.environ.get("SENSOR_INGEST", "1") != "0"
+# Concurrent /api/sensor/stream clients allowed
+MAX_SUBSCRIBERS = int(os.environ.get("SENSOR_STREAM_MAX_SUBSCRIBERS", 500))
+# Seconds between SSE keep-alive comments on an idle stream
+KEEPALIVE_INTERVAL = 15.0
+# Seconds between shallow listings of the devices path
+DEVICE_DISCOVERY_INTERVAL = float(os.environ.get("SENSOR_DEVICE_DISCOVERY_INTERVAL", 30.0))
+# Device fetches in flight at once during a poll
+DEVICE_CONCURRENCY = int(os.environ.get("SENSOR_DEVICE_CONCURRENCY", 100))
+# Readings kept in memory per device
+DEVICE_BUFFER_CAPACITY = int(os.environ.get("SENSOR_DEVICE_BUFFER_CAPACITY", 512))
+# Devices followed at most (the first in key order)
+MAX_DEVICES = int(os.environ.get("SENSOR_MAX_DEVICES", 1000))
+# Bucket bounds (seconds) of the device poll timings
+TICK_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def extract_features(data):
+    """
+    Map a raw sensorData payload onto model input features
+
+    Mapping: bvp -> Heart Rate (bpm), acc_x/y/z -> Gyro x/y/z, temp -> DHT temperature
+
+    Args:
+        data (dict): Nested payload as returned by FirebaseService.get_latest_sensor_data
+
+    Returns:
+        dict: Model input { "bvp", "acc_x", "acc_y", "acc_z", "temp" }
+    """
+    bpm = float(data.get('MAX30102', {}).get('bpm', 0))
+    gyro = data.get('MPU6050', {}).get('gyro', {})
+
+    return {
+        "bvp": bpm,
+        "acc_x": float(gyro.get('x', 0)),
+        "acc_y": float(gyro.get('y', 0)),
+        "acc_z": float(gyro.get('z', 0)),
+        # Extract temperature from DHT sensor (default to 36.5 if missing)
+        "temp": float(data.get('DHT', {}).get('temperature', 36.5))
+    }
+
+
+def predict_payload(data):
+    """Run the model on a raw payload, returning the prediction dict"""
+    try:
+        with stage("features"):
+            features = extract_features(data)
+        with stage("predict"):
+            return predict_disease(features)
+    except Exception as e:
+        print(f"Prediction pre-processing error: {e}")
+        return {"error": "Failed to process data for prediction"}
+
+
+class SensorRingBuffer:
+    """
+    Fixed-size ring of sensor readings
+
+    Numeric features live in a preallocated float64 array; the raw payload
+    and prediction for each slot are kept alongside for serving.
+    """
+
+    COLUMNS = ("received_at", "bvp", "acc_x", "acc_y", "acc_z", "temp")
+
+    def __init__(self, capacity=BUFFER_CAPACITY):
+        self.capacity = capacity
+        self._values = np.zeros((capacity, len(self.COLUMNS)), dtype=np.float64)
+        self._payloads = [None] * capacity
+        self._predictions = [None] * capacity
+        self._next = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def append(self, received_at, features, payload, prediction):
+        """Store one reading, overwriting the oldest once full"""
+        with self._lock:
+            slot = self._next
+            row = self._values[slot]
+            row[0] = received_at
+            for j, name in enumerate(self.COLUMNS[1:], start=1):
+                row[j] = features[name]
+            self._payloads[slot] = payload
+            self._predictions[slot] = prediction
+            self._next = (slot + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def latest(self):
+        """
+        Most recent reading
+
+        Returns:
+            tuple: (received_at, payload, prediction) or None when empty
+        """
+        with self._lock:
+            if not self._size:
+                return None
+            slot = (self._next - 1) % self.capacity
+            return self._values[slot, 0], self._payloads[slot], self._predictions[slot]
+
+
+class SensorBroadcaster:
+    """
+    Fans each new reading out to Server-Sent Events subscribers
+
+    The event is serialized once on publish; subscribers only wait on a
+    shared condition and write the same bytes, so no client ever touches
+    Firebase or the model.
+    """
+
+    def __init__(self, max_subscribers=MAX_SUBSCRIBERS, keepalive=KEEPALIVE_INTERVAL):
+        self.max_subscribers = max_subscribers
+        self.keepalive = keepalive
+        self.subscribers = 0
+        self._seq = 0
+        self._event = None
+        self._cond = threading.Condition()
+        self._listeners = []
+
+    def publish(self, body):
+        """Serialize a response body once and wake every subscriber"""
+        data = json.dumps(body, separators=(",", ":"))
+        with self._cond:
+            self._seq += 1
+            self._event = f"id: {self._seq}\nevent: reading\ndata: {data}\n\n".encode()
+            self._cond.notify_all()
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback()
+
+    def add_listener(self, callback):
+        """Call callback() from the publishing thread after every publish (used by async servers)"""
+        with self._cond:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._cond:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def current(self):
+        """
+        Returns:
+            tuple: (seq, event bytes) of the latest published event
+        """
+        with self._cond:
+            return self._seq, self._event
+
+    def acquire(self, last_event_id=None):
+        """
+        Reserve a subscriber slot
+
+        Returns:
+            int: Last event seq the client has seen, or None if the subscriber limit is reached
+        """
+        with self._cond:
+            if self.subscribers >= self.max_subscribers:
+                return None
+            self.subscribers += 1
+
+        try:
+            return int(last_event_id) if last_event_id else 0
+        except ValueError:
+            return 0
+
+    def release(self):
+        with self._cond:
+            self.subscribers -= 1
+
+    def subscribe(self, last_event_id=None):
+        """
+        Register a subscriber
+
+        Args:
+            last_event_id (str): Last-Event-ID sent by a reconnecting client
+
+        Returns:
+            generator: SSE byte chunks, or None if the subscriber limit is reached
+        """
+        seen = self.acquire(last_event_id)
+        if seen is None:
+            return None
+        return self._stream(seen)
+
+    def _stream(self, seen):
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                with self._cond:
+                    if self._seq == seen:
+                        self._cond.wait(self.keepalive)
+                    seq, event = self._seq, self._event
+
+                if seq != seen and event is not None:
+                    seen = seq
+                    yield event
+                else:
+                    yield b": keep-alive\n\n"
+        finally:
+            self.release()
+
+
+class SensorIngestWorker:
+    """Background thread that polls sensorData and fills a SensorRingBuffer"""
+
+    def __init__(self, poll_interval=POLL_INTERVAL, capacity=BUFFER_CAPACITY):
+        self.poll_interval = poll_interval
+        self.buffer = SensorRingBuffer(capacity)
+        self.broadcaster = SensorBroadcaster()
+        self.last_success = None
+        self.last_error = None
+        self.polls = 0
+        self._last_payload = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the polling thread (idempotent)"""
+        with self._start_lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sensor-ingest", daemon=True)
+            self._thread.start()
+            print(f"[SensorIngest] Polling sensorData every {self.poll_interval}s")
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def poll_once(self):
+        """
+        Fetch sensorData once and record it if it changed
+
+        Returns:
+            bool: True if a new reading was stored
+        """
+        self.polls += 1
+        result = FirebaseService.get_latest_sensor_data()
+        if not result.get('success'):
+            self.last_error = result.get('error') or result.get('message')
+            return False
+        # Over the upstream budget: the gate's last good answer is not a new
+        # poll, so the buffer must still go stale if Firebase stays out of reach
+        if result.get('stale'):
+            return False
+
+        now = time.time()
+        self.last_success = now
+        self.last_error = None
+        data = result.get('data', {})
+        if data == self._last_payload:
+            return False
+
+        try:
+            features = extract_features(data)
+            prediction = predict_disease(features)
+        except Exception as e:
+            print(f"Prediction pre-processing error: {e}")
+            features = dict.fromkeys(SensorRingBuffer.COLUMNS[1:], np.nan)
+            prediction = {"error": "Failed to process data for prediction"}
+
+        self.buffer.append(now, features, data, prediction)
+        summary_engine.record(DEFAULT_USER, now, features, prediction.get("raw_prediction"))
+        self._last_payload = data
+        # Unchanged readings returned early above, so idle sensors publish nothing
+        self.broadcaster.publish(self.latest_response())
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.poll_once()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"[SensorIngest] Poll failed: {e}")
+            self._stop.wait(max(0.0, self.poll_interval - (time.monotonic() - started)))
+
+    def latest_response(self, max_age=MAX_AGE):
+        """
+        Latest reading in the /api/sensor/latest response shape
+
+        Returns:
+            dict: Response body, or None if no fresh reading is buffered
+        """
+        return _latest_response(self.buffer, self.last_success, max_age)
+
+
+def _is_fresh(last_success, max_age):
+    return last_success is not None and time.time() - last_success <= max_age
+
+
+def _latest_response(buffer, last_success, max_age):
+    latest = buffer.latest()
+    if latest is None or not _is_fresh(last_success, max_age):
+        return None
+
+    _, payload, prediction = latest
+    return {
+        "success": True,
+        "data": payload,
+        "timestamp": datetime.fromtimestamp(last_success).isoformat(),
+        "prediction": prediction
+    }
+
+
+class DeviceFeed:
+    """Buffered readings and poll state of one device"""
+
+    def __init__(self, device, capacity=DEVICE_BUFFER_CAPACITY):
+        self.device = device
+        self.buffer = SensorRingBuffer(capacity)
+        self.last_success = None
+        self.last_error = None
+        self.last_payload = None
+
+    def latest_response(self, max_age=MAX_AGE):
+        body = _latest_response(self.buffer, self.last_success, max_age)
+        if body is not None:
+            body["device"] = self.device
+        return body
+
+    def status(self, max_age=MAX_AGE):
+        return {
+            "device": self.device,
+            "readings": len(self.buffer),
+            "fresh": _is_fresh(self.last_success, max_age),
+            "last_success": datetime.fromtimestamp(self.last_success).isoformat() if self.last_success else None,
+            "last_error": self.last_error
+        }
+
+
+class DeviceIngestWorker:
+    """
+    Background thread that polls the latest reading of every device
+
+    Devices are discovered with a shallow listing of the devices path. Each
+    poll fetches all of them concurrently on the thread's own event loop (at
+    most `concurrency` requests in flight) and scores every new reading with
+    one predict_batch call, so a poll takes about one Firebase round trip
+    whether it covers one device or a hundred.
+    """
+
+    def __init__(self, poll_interval=POLL_INTERVAL, concurrency=DEVICE_CONCURRENCY,
+                 discovery_interval=DEVICE_DISCOVERY_INTERVAL, capacity=DEVICE_BUFFER_CAPACITY,
+                 max_devices=MAX_DEVICES):
+        self.poll_interval = poll_interval
+        self.concurrency = max(1, concurrency)
+        self.discovery_interval = discovery_interval
+        self.capacity = capacity
+        self.max_devices = max_devices
+        # Replaced, never mutated, on discovery so readers need no lock
+        self.feeds = {}
+        self.last_discovery = None
+        self.last_error = None
+        self.polls = Counter()
+        self.readings = Counter()
+        self.errors = Counter()
+        self.poll_seconds = Histogram(TICK_BUCKETS)
+        self.fetch_seconds = Histogram(TICK_BUCKETS)
+        self.score_seconds = Histogram(TICK_BUCKETS)
+        self.batch_rows = Histogram(BATCH_SIZE_BUCKETS)
+        self._loop = None
+        self._session = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the polling thread (idempotent)"""
+        with self._start_lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="device-ingest", daemon=True)
+            self._thread.start()
+            print(f"[DeviceIngest] Polling devices every {self.poll_interval}s "
+                  f"({self.concurrency} concurrent fetches)")
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def latest_response(self, device, max_age=MAX_AGE):
+        """Latest buffered reading of a device, or None if it has none fresh"""
+        feed = self.feeds.get(device)
+        return feed.latest_response(max_age) if feed is not None else None
+
+    def poll_once(self):
+        """
+        Discover devices if due, then fetch every device and score the new readings.
+        Runs on a private event loop; call from one thread at a time.
+
+        Returns:
+            int: New readings stored
+        """
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(self._poll())
+
+    def close(self):
+        """Close the HTTP session and event loop used by poll_once"""
+        if self._loop is not None:
+            if self._session is not None:
+                self._loop.run_until_complete(self._session.close())
+                self._session = None
+            self._loop.close()
+            self._loop = None
+
+    async def _poll(self):
+        # aiohttp is only imported once device polling starts
+        from firebase_async import AsyncFirebaseService, AsyncFirebaseSession
+
+        if self._session is None:
+            # Bound to this loop; sized so no fetch waits for a connection
+            self._session = AsyncFirebaseSession(pool_size=self.concurrency)
+        started = time.perf_counter()
+        self.polls.inc()
+        if self.last_discovery is None or time.monotonic() - self.last_discovery >= self.discovery_interval:
+            await self._discover()
+
+        feeds = list(self.feeds.values())
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(feed):
+            async with slots:
+                return await AsyncFirebaseService.execute(FirebaseService.latest_call(feed.device), self._session)
+
+        results = await asyncio.gather(*(fetch(feed) for feed in feeds))
+        fetched = time.perf_counter()
+        self.fetch_seconds.observe(fetched - started)
+
+        stored = self._record(feeds, results)
+        self.score_seconds.observe(time.perf_counter() - fetched)
+        self.poll_seconds.observe(time.perf_counter() - started)
+        return stored
+
+    async def _discover(self):
+        from firebase_async import AsyncFirebaseService
+
+        result = await AsyncFirebaseService.execute(FirebaseService.devices_call(), self._session)
+        self.last_discovery = time.monotonic()
+        if not result.get('success'):
+            self.last_error = result.get('error') or result.get('message')
+            return
+        self.last_error = None
+        current = self.feeds
+        self.feeds = {device: current.get(device) or DeviceFeed(device, self.capacity)
+                      for device in result["devices"][:self.max_devices]}
+        added = len(self.feeds.keys() - current.keys())
+        if added:
+            print(f"[DeviceIngest] Following {len(self.feeds)} devices ({added} new)")
+
+    def _record(self, feeds, results):
+        """Score every changed reading in one batch and store it with its device"""
+        now = time.time()
+        fresh = []
+        for feed, result in zip(feeds, results):
+            if not result.get('success'):
+                feed.last_error = result.get('error') or result.get('message')
+                self.errors.inc()
+                continue
+            feed.last_success = now
+            feed.last_error = None
+            data = result.get('data', {})
+            if data == feed.last_payload:
+                continue
+            try:
+                features = extract_features(data)
+            except Exception as e:
+                print(f"[DeviceIngest] {feed.device}: bad payload: {e}")
+                features = None
+            fresh.append((feed, data, features))
+
+        if not fresh:
+            return 0
+        scorable = [features for _, _, features in fresh if features is not None]
+        self.batch_rows.observe(len(scorable))
+        with stage("device_score"):
+            scored = predict_batch(scorable) if scorable else {"predictions": []}
+        predictions = iter(scored.get("predictions", ()))
+        failed = {"error": scored.get("error", "Failed to process data for prediction")}
+
+        for feed, data, features in fresh:
+            prediction = next(predictions, failed) if features is not None else failed
+            if features is None:
+                features = dict.fromkeys(SensorRingBuffer.COLUMNS[1:], np.nan)
+            feed.buffer.append(now, features, data, prediction)
+            summary_engine.record(feed.device, now, features, prediction.get("raw_prediction"))
+            feed.last_payload = data
+        self.readings.inc(len(fresh))
+        return len(fresh)
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                started = time.monotonic()
+                try:
+                    self.poll_once()
+                except Exception as e:
+                    self.last_error = str(e)
+                    print(f"[DeviceIngest] Poll failed: {e}")
+                self._stop.wait(max(0.0, self.poll_interval - (time.monotonic() - started)))
+        finally:
+            self.close()
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "devices": len(self.feeds),
+            "concurrency": self.concurrency,
+            "poll_interval": self.poll_interval,
+            "polls": self.polls.value,
+            "readings": self.readings.value,
+            "errors": self.errors.value,
+            "last_error": self.last_error,
+            "poll_seconds": self.poll_seconds.snapshot(),
+            "fetch_seconds": self.fetch_seconds.snapshot(),
+            "score_seconds": self.score_seconds.snapshot(),
+            "batch_rows": self.batch_rows.snapshot()
+        }
+
+
+ingest_worker = SensorIngestWorker()
+device_worker = DeviceIngestWorker()
@@ -0,0 +1,181 @@
+"""
+Sensor Rollups Module
+Multi-resolution summaries of sensor history: per bucket of 1 min, 15 min
+and 1 h, the min/max/mean of each channel and how often each condition was
+predicted. Buckets are partial aggregates that merge exactly, so they are
+updated incrementally as readings arrive and can be coarsened on the fly.
+"""
+
+import json
+
+import numpy as np
+
+from model_service import CLASS_MAPPING
+
+# (name, bucket seconds), finest first; raw readings sit below the first tier
+TIERS = (("1m", 60), ("15m", 900), ("1h", 3600))
+CHANNELS = ("bpm", "gyro_x", "gyro_y", "gyro_z", "temp")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    tier INTEGER,
+    bucket INTEGER,
+    count INTEGER NOT NULL,
+    stats BLOB NOT NULL,
+    classes TEXT NOT NULL,
+    PRIMARY KEY (tier, bucket)
+) WITHOUT ROWID;
+"""
+
+# Per-channel statistics packed into the stats blob: count, sum, min, max
+_STATS_ROWS = 4
+
+
+class Bucket:
+    """
+    Aggregate of the readings in one time bucket
+
+    Channel statistics are a (4, 5) float64 array - rows count, sum, min
+    and max, one column per channel - and classes maps each predicted class
+    to its count. Missing values are left out of their channel only.
+    """
+
+    __slots__ = ("start", "count", "stats", "classes")
+
+    def __init__(self, start, count, stats, classes):
+        self.start = start
+        self.count = count
+        self.stats = stats
+        self.classes = classes
+
+    @classmethod
+    def empty(cls, start):
+        stats = np.vstack([np.zeros((2, len(CHANNELS))), np.full((2, len(CHANNELS)), np.nan)])
+        return cls(start, 0, stats, {})
+
+    def merge(self, other):
+        """Fold another aggregate of the same (or an adjacent) bucket into this one"""
+        self.count += other.count
+        self.stats[:2] += other.stats[:2]
+        self.stats[2] = np.fmin(self.stats[2], other.stats[2])
+        self.stats[3] = np.fmax(self.stats[3], other.stats[3])
+        for label, n in other.classes.items():
+            self.classes[label] = self.classes.get(label, 0) + n
+        return self
+
+    def dominant(self):
+        """Most frequently predicted class, or None if none were predicted"""
+        if not self.classes:
+            return None
+        return max(self.classes.items(), key=lambda item: (item[1], -item[0]))[0]
+
+    def to_row(self, tier):
+        return (tier, self.start, self.count, self.stats.tobytes(),
+                json.dumps({str(k): v for k, v in self.classes.items()}, separators=(",", ":")))
+
+    @classmethod
+    def from_row(cls, bucket, count, stats, classes):
+        return cls(bucket, count, np.frombuffer(stats, dtype=np.float64).reshape(_STATS_ROWS, len(CHANNELS)).copy(),
+                   {int(k): v for k, v in json.loads(classes).items()})
+
+    def to_point(self):
+        """API shape: bucket start as the timestamp key, then min/max/mean per channel"""
+        n, total, low, high = self.stats
+        point = {"timestamp": str(int(self.start)), "count": self.count}
+        for j, channel in enumerate(CHANNELS):
+            if n[j]:
+                point[channel] = {"min": round(float(low[j]), 3), "max": round(float(high[j]), 3),
+                                  "mean": round(float(total[j] / n[j]), 3)}
+            else:
+                point[channel] = None
+        prediction = self.dominant()
+        point["prediction"] = prediction
+        point["condition"] = CLASS_MAPPING.get(prediction) if prediction is not None else None
+        return point
+
+
+def summarize(ts, values, classes, seconds):
+    """
+    Aggregate readings into buckets of `seconds`
+
+    Args:
+        ts (np.ndarray): (n,) epoch seconds, all finite
+        values (np.ndarray): (n, 5) channels, NaN where missing
+        classes (np.ndarray): (n,) predicted class per reading, -1 if unknown
+        seconds (int): Bucket width
+
+    Returns:
+        list: Bucket per occupied bucket, in time order
+    """
+    if len(ts) == 0:
+        return []
+    starts = (np.floor(ts / seconds) * seconds).astype(np.int64)
+    order = np.argsort(starts, kind="stable")
+    starts, values, classes = starts[order], values[order], classes[order]
+    boundaries = np.flatnonzero(np.r_[True, starts[1:] != starts[:-1]])
+
+    present = np.isfinite(values)
+    counts = np.add.reduceat(present, boundaries, axis=0)
+    sums = np.add.reduceat(np.where(present, values, 0.0), boundaries, axis=0)
+    # fmin/fmax skip NaN, so a channel with no values in a bucket stays NaN
+    lows = np.fmin.reduceat(values, boundaries, axis=0)
+    highs = np.fmax.reduceat(values, boundaries, axis=0)
+    sizes = np.diff(np.r_[boundaries, len(starts)])
+
+    known = classes >= 0
+    group = np.repeat(np.arange(len(boundaries)), sizes)
+    class_counts = np.zeros((len(boundaries), int(classes.max()) + 1 if known.any() else 0), dtype=np.int64)
+    np.add.at(class_counts, (group[known], classes[known]), 1)
+
+    buckets = []
+    for i, start in enumerate(starts[boundaries].tolist()):
+        stats = np.vstack([counts[i], sums[i], lows[i], highs[i]])
+        row = class_counts[i] if class_counts.shape[1] else ()
+        buckets.append(Bucket(start, int(sizes[i]), stats,
+                              {label: int(n) for label, n in enumerate(row) if n}))
+    return buckets
+
+
+def coarsen(buckets, max_points, seconds):
+    """
+    Merge time-ordered buckets of `seconds` into wider ones so at most
+    max_points remain. Each merged bucket covers a whole multiple of
+    `seconds` starting on a multiple of its width, so gaps between readings
+    never stretch a bucket beyond its reported width.
+
+    Returns:
+        tuple: (buckets, number of `seconds` spans in each merged bucket)
+    """
+    if len(buckets) <= max_points:
+        return buckets, 1
+    starts = np.array([bucket.start for bucket in buckets], dtype=np.int64)
+    size = -(-len(buckets) // max_points)
+    # Readings spread out with gaps occupy more aligned buckets than a dense run
+    while len(np.unique(starts // (seconds * size))) > max_points:
+        size *= 2
+    width = seconds * size
+    merged = []
+    for bucket in buckets:
+        start = int(bucket.start) // width * width
+        if not merged or merged[-1].start != start:
+            merged.append(Bucket.empty(start))
+        merged[-1].merge(bucket)
+    return merged, size
+
+
+def downsample(ts, values, classes, max_points):
+    """
+    Pick the finest tier with at most max_points buckets for in-memory readings
+    (coarsening the last tier further if even that has too many)
+
+    Returns:
+        tuple: (tier name, bucket seconds, buckets)
+    """
+    finite = np.isfinite(ts)
+    ts, values, classes = ts[finite], values[finite], classes[finite]
+    for name, seconds in TIERS:
+        buckets = summarize(ts, values, classes, seconds)
+        if len(buckets) <= max_points:
+            return name, seconds, buckets
+    buckets, size = coarsen(buckets, max_points, seconds)
+    return name, seconds * size, buckets
@@ -0,0 +1,492 @@
+"""
+Sensor Store Module
+Local SQLite copy of sensor_data history, synced incrementally from Firebase
+and queried by key (timestamp) through the primary-key index. Downsampled
+rollups (see sensor_rollups.py) are updated in the same transaction as
+each insert.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from firebase_service import FirebaseService
+from model_service import FEATURE_DEFAULTS, FEATURE_ORDER, predict_classes
+from sensor_rollups import SCHEMA as ROLLUP_SCHEMA, TIERS, Bucket, coarsen, summarize
+
+STORE_PATH = os.environ.get(
+    "SENSOR_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'sensor_history.db')
+)
+# Set SENSOR_STORE=0 to serve history/range straight from Firebase
+STORE_ENABLED = os.environ.get("SENSOR_STORE", "1") != "0"
+# Minimum seconds between incremental syncs triggered by requests
+SYNC_INTERVAL = float(os.environ.get("SENSOR_STORE_SYNC_INTERVAL", 10.0))
+# Entries requested from Firebase per sync page
+SYNC_PAGE_SIZE = 1000
+# Readings rolled up per pass when rollups are rebuilt from existing history
+ROLLUP_REBUILD_CHUNK = 50000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS readings (
+    key TEXT PRIMARY KEY,
+    ts REAL,
+    bpm REAL,
+    gyro_x REAL,
+    gyro_y REAL,
+    gyro_z REAL,
+    temp REAL,
+    payload TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS readings_ts ON readings (ts);
+""" + ROLLUP_SCHEMA
+
+
+def parse_timestamp(key):
+    """
+    Best-effort epoch seconds for a sensor_data key
+
+    Accepts epoch seconds or milliseconds and ISO 8601 strings.
+
+    Returns:
+        float: Epoch seconds, or None if the key is not a timestamp
+    """
+    try:
+        value = float(key)
+        return value / 1000.0 if value > 1e11 else value
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(str(key).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def reading_values(values):
+    """
+    Numeric channels of one nested sensor payload
+
+    Returns:
+        tuple: (bpm, gyro_x, gyro_y, gyro_z, temp), None where a value is missing
+    """
+    if not isinstance(values, dict):
+        return (None,) * 5
+    gyro = values.get('MPU6050', {}).get('gyro', {}) if isinstance(values.get('MPU6050'), dict) else {}
+    bpm = values.get('MAX30102', {}).get('bpm') if isinstance(values.get('MAX30102'), dict) else None
+    temp = values.get('DHT', {}).get('temperature') if isinstance(values.get('DHT'), dict) else None
+    return (_number(bpm), _number(gyro.get('x')), _number(gyro.get('y')), _number(gyro.get('z')), _number(temp))
+
+
+def classify(values):
+    """
+    Predicted class per reading for rollups
+
+    Args:
+        values (np.ndarray): (n, 5) bpm, gyro x/y/z, temp, NaN where missing
+
+    Returns:
+        np.ndarray: (n,) int classes, -1 for all when no model is available
+    """
+    X = np.array(values, dtype=np.float64)
+    defaults = np.array([FEATURE_DEFAULTS[name] for name in FEATURE_ORDER])
+    missing = ~np.isfinite(X)
+    X[missing] = np.broadcast_to(defaults, X.shape)[missing]
+    try:
+        return np.asarray(predict_classes(X)).astype(np.int64)
+    except Exception as e:
+        print(f"[SensorStore] Rollup readings left unclassified: {e}")
+        return np.full(len(X), -1, dtype=np.int64)
+
+
+def _row(key, values):
+    """Flatten one Firebase entry into a readings row"""
+    return (key, parse_timestamp(key)) + reading_values(values) + (json.dumps(values, separators=(",", ":")),)
+
+
+def entry_json(key, payload):
+    """
+    Serialized API entry built by splicing "timestamp" into the stored
+    payload text, without parsing it
+    """
+    stamp = json.dumps(key)
+    if payload.startswith("{"):
+        if payload == "{}":
+            return '{"timestamp":' + stamp + '}'
+        return payload[:-1] + ',"timestamp":' + stamp + '}'
+    return '{"value":' + payload + ',"timestamp":' + stamp + '}'
+
+
+class EntryEncoder:
+    """
+    Framing for streamed entry lists: one JSON document
+    {"success":true,"data":[...],"count":..} or NDJSON lines.
+    Feed it (key, payload_json) rows one at a time.
+    """
+
+    def __init__(self, fmt="json", page_size=None, extra=None):
+        self.ndjson = fmt == "ndjson"
+        self.page_size = page_size
+        self.extra = extra
+        self.count = 0
+        self.last_key = None
+
+    @property
+    def mimetype(self):
+        return "application/x-ndjson" if self.ndjson else "application/json"
+
+    def row(self, key, payload):
+        """Text for one row (the first row also opens the document)"""
+        self.count += 1
+        self.last_key = key
+        if self.ndjson:
+            return entry_json(key, payload) + "\n"
+        prefix = '{"success":true,"data":[' if self.count == 1 else ","
+        return prefix + entry_json(key, payload)
+
+    def close(self):
+        """Text that ends the document: count, cursor and any extra fields"""
+        if self.ndjson:
+            return ""
+        trailer = {"count": self.count}
+        if self.page_size is not None:
+            trailer["next_after"] = self.last_key if self.count == self.page_size else None
+        trailer.update(self.extra or {})
+        return "]," + json.dumps(trailer, separators=(",", ":"))[1:]
+
+
+class SensorStore:
+    """SQLite-backed sensor history with incremental Firebase sync"""
+
+    def __init__(self, path=STORE_PATH, sync_interval=SYNC_INTERVAL):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.last_sync = None
+        self.last_sync_error = None
+        self._last_attempt = None
+        self._rollups_checked = False
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        self._rollup_lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        """Per-thread connection (sqlite3 connections must not be shared across threads)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def insert(self, entries):
+        """
+        Store Firebase entries, ignoring keys already present, and fold the
+        new readings into the rollups
+
+        Args:
+            entries (dict): key -> values as returned by Firebase
+
+        Returns:
+            int: Number of new rows
+        """
+        rows = [_row(key, values) for key, values in entries.items()]
+        if not rows:
+            return 0
+        conn = self._connect()
+        # Serialized with rebuilds so a bucket's read-merge-write is never interleaved
+        with self._rollup_lock, conn:
+            stored = self._existing_keys(conn, [row[0] for row in rows])
+            new_rows = [row for row in rows if row[0] not in stored]
+            conn.executemany("INSERT OR IGNORE INTO readings VALUES (?, ?, ?, ?, ?, ?, ?, ?)", new_rows)
+            self._roll_up(conn, new_rows)
+            return len(new_rows)
+
+    @staticmethod
+    def _existing_keys(conn, keys):
+        stored = set()
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            stored.update(key for (key,) in conn.execute(
+                f"SELECT key FROM readings WHERE key IN ({','.join('?' * len(chunk))})", chunk))
+        return stored
+
+    def _roll_up(self, conn, rows):
+        """Merge readings rows into every rollup tier (inside the caller's transaction)"""
+        rows = [row for row in rows if row[1] is not None]
+        if not rows:
+            return
+        table = np.array([row[1:7] for row in rows], dtype=np.float64)
+        ts, values = table[:, 0], table[:, 1:]
+        classes = classify(values)
+        for _, seconds in TIERS:
+            buckets = summarize(ts, values, classes, seconds)
+            stored = {bucket: Bucket.from_row(bucket, *rest) for bucket, *rest in conn.execute(
+                "SELECT bucket, count, stats, classes FROM rollups WHERE tier = ? AND bucket BETWEEN ? AND ?",
+                (seconds, buckets[0].start, buckets[-1].start))}
+            conn.executemany(
+                "INSERT OR REPLACE INTO rollups VALUES (?, ?, ?, ?, ?)",
+                [(stored[b.start].merge(b) if b.start in stored else b).to_row(seconds) for b in buckets]
+            )
+
+    def rebuild_rollups(self):
+        """
+        Recompute every rollup from the stored readings
+
+        Returns:
+            int: Readings rolled up
+        """
+        conn = self._connect()
+        done = 0
+        with self._rollup_lock:
+            with conn:
+                conn.execute("DELETE FROM rollups")
+            last = ""
+            while True:
+                rows = conn.execute(
+                    "SELECT key, ts, bpm, gyro_x, gyro_y, gyro_z, temp FROM readings WHERE key > ? "
+                    "ORDER BY key LIMIT ?", (last, ROLLUP_REBUILD_CHUNK)).fetchall()
+                if not rows:
+                    break
+                with conn:
+                    self._roll_up(conn, rows)
+                done += len(rows)
+                last = rows[-1][0]
+        return done
+
+    def ensure_rollups(self):
+        """Build rollups once for history stored before rollups existed"""
+        if self._rollups_checked:
+            return
+        conn = self._connect()
+        if conn.execute("SELECT 1 FROM rollups LIMIT 1").fetchone() is None and not self.is_empty():
+            started = time.perf_counter()
+            count = self.rebuild_rollups()
+            print(f"[SensorStore] Rolled up {count} stored readings in {time.perf_counter() - started:.1f}s")
+        self._rollups_checked = True
+
+    def last_key(self):
+        row = self._connect().execute("SELECT MAX(key) FROM readings").fetchone()
+        return row[0] if row else None
+
+    def is_empty(self):
+        return self.last_key() is None
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM readings").fetchone()[0]
+
+    def sync(self):
+        """
+        Pull entries newer than the last stored key from Firebase, page by page
+
+        Returns:
+            dict: { "success", "added" } or the Firebase error
+        """
+        self.ensure_rollups()
+        added = 0
+        start_key = self.last_key()
+        while True:
+            result = FirebaseService.get_sensor_entries(start_key, SYNC_PAGE_SIZE)
+            if not result.get('success'):
+                self.last_sync_error = result.get('error') or result.get('message')
+                return dict(result, added=added)
+            if result.get('stale'):
+                # Over the upstream budget: a remembered page says nothing about what is new upstream
+                self.last_sync_error = "Firebase over its request budget; sync deferred"
+                return {"success": False, "stale": True, "message": self.last_sync_error, "added": added}
+
+            page = result['data']
+            # startAt is inclusive; the boundary key is already stored
+            page.pop(start_key, None)
+            if not page:
+                break
+            added += self.insert(page)
+            start_key = max(page)
+            if len(page) < SYNC_PAGE_SIZE - 1:
+                break
+
+        self.last_sync = time.time()
+        self.last_sync_error = None
+        return {"success": True, "added": added}
+
+    def _stale(self):
+        return self._last_attempt is None or time.time() - self._last_attempt >= self.sync_interval
+
+    def sync_if_stale(self):
+        """
+        Sync at most once per sync_interval. Only the very first sync makes
+        callers wait; later ones run in whichever request gets the lock while
+        the others serve what is already stored.
+        """
+        if not self._stale():
+            return
+        if not self._sync_lock.acquire(blocking=self._last_attempt is None):
+            return
+        try:
+            if self._stale():
+                self._last_attempt = time.time()
+                self.sync()
+        finally:
+            self._sync_lock.release()
+
+    def iter_history(self, limit=100, after=None, page_size=None):
+        """
+        Lazily yield (key, payload_json) rows in key order
+
+        Without a cursor this is the last `limit` entries, like
+        orderBy="$key"&limitToLast=limit. With `after`, it pages forward
+        from that key (exclusive).
+
+        Args:
+            limit (int): Size of the history window
+            after (str): Cursor - last key of the previous page
+            page_size (int): Maximum rows to yield
+        """
+        conn = self._connect()
+        count = limit if page_size is None else min(limit, page_size)
+        if after is not None:
+            return self._iter(conn.execute(
+                "SELECT key, payload FROM readings WHERE key > ? ORDER BY key LIMIT ?", (after, count)))
+
+        # Locate the first key of the window on the index, then stream forward from it
+        row = conn.execute("SELECT key FROM readings ORDER BY key DESC LIMIT 1 OFFSET ?", (max(limit - 1, 0),)).fetchone()
+        first = row[0] if row else ""
+        return self._iter(conn.execute(
+            "SELECT key, payload FROM readings WHERE key >= ? ORDER BY key LIMIT ?", (first, count)))
+
+    def iter_range(self, start_time=None, end_time=None, after=None, page_size=None):
+        """
+        Lazily yield (key, payload_json) rows with start_time <= key <= end_time,
+        like startAt/endAt on $key, optionally after a cursor key
+        """
+        clauses, args = [], []
+        if start_time:
+            clauses.append("key >= ?")
+            args.append(start_time)
+        if end_time:
+            clauses.append("key <= ?")
+            args.append(end_time)
+        if after is not None:
+            clauses.append("key > ?")
+            args.append(after)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        args.append(-1 if page_size is None else page_size)
+        return self._iter(self._connect().execute(
+            f"SELECT key, payload FROM readings {where} ORDER BY key LIMIT ?", args))
+
+    def range_arrays(self, start_time=None, end_time=None):
+        """
+        Numeric columns for a key range, read without touching the JSON payloads
+
+        Returns:
+            tuple: (ts, values) - ts is (n,) epoch seconds (NaN if the key is not a
+                   timestamp), values is (n, 5) bpm, gyro x/y/z, temp (NaN if missing)
+        """
+        clauses, args = [], []
+        if start_time:
+            clauses.append("key >= ?")
+            args.append(start_time)
+        if end_time:
+            clauses.append("key <= ?")
+            args.append(end_time)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connect().execute(
+            f"SELECT ts, bpm, gyro_x, gyro_y, gyro_z, temp FROM readings {where} ORDER BY key", args
+        ).fetchall()
+        table = np.array(rows, dtype=np.float64).reshape(len(rows), 6)
+        return table[:, 0], table[:, 1:]
+
+    def _count_at_most(self, sql, args, limit):
+        """COUNT(*) of a query, stopping once it exceeds limit"""
+        return self._connect().execute(f"SELECT COUNT(*) FROM ({sql} LIMIT ?)", args + [limit + 1]).fetchone()[0]
+
+    def downsampled_range(self, start_time=None, end_time=None, max_points=1000):
+        """
+        A key range at the finest resolution that fits in max_points
+
+        Raw readings are used when there are at most max_points of them,
+        otherwise the first rollup tier with at most max_points buckets
+        overlapping the range. Work is bounded by max_points, not by the
+        span, except that a span with more hours than max_points reads its
+        hourly buckets and merges them further.
+
+        Returns:
+            tuple: (None, stride, None) to serve every stride-th raw reading
+                   (1 when they all fit; more when the keys are not timestamps
+                   and so have no rollups), else (tier name, bucket seconds, [Bucket])
+        """
+        clauses, raw_args = [], []
+        if start_time:
+            clauses.append("key >= ?")
+            raw_args.append(start_time)
+        if end_time:
+            clauses.append("key <= ?")
+            raw_args.append(end_time)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        if self._count_at_most(f"SELECT 1 FROM readings {where}", raw_args, max_points) <= max_points:
+            return None, 1, None
+
+        start_ts = parse_timestamp(start_time) if start_time else None
+        end_ts = parse_timestamp(end_time) if end_time else None
+        for name, seconds in TIERS:
+            clauses, args = ["tier = ?"], [seconds]
+            if start_ts is not None:
+                # The bucket holding start_time begins before it
+                clauses.append("bucket >= ?")
+                args.append(int(start_ts // seconds * seconds))
+            if end_ts is not None:
+                clauses.append("bucket <= ?")
+                args.append(end_ts)
+            query = f"SELECT bucket, count, stats, classes FROM rollups WHERE {' AND '.join(clauses)} ORDER BY bucket"
+            fits = self._count_at_most(query, args, max_points) <= max_points
+            if fits or seconds == TIERS[-1][1]:
+                break
+
+        limit = max_points if fits else -1
+        buckets = [Bucket.from_row(*row) for row in self._connect().execute(f"{query} LIMIT ?", args + [limit])]
+        if not buckets:
+            # Keys that are not timestamps have no rollups: every stride-th raw reading instead
+            total = self._connect().execute(f"SELECT COUNT(*) FROM readings {where}", raw_args).fetchone()[0]
+            return None, -(-total // max_points), None
+        if fits:
+            return name, seconds, buckets
+        buckets, size = coarsen(buckets, max_points, seconds)
+        return name, seconds * size, buckets
+
+    @staticmethod
+    def _iter(cursor):
+        """Fetch from a cursor in small batches so results are never fully materialised"""
+        while True:
+            rows = cursor.fetchmany(256)
+            if not rows:
+                return
+            yield from rows
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide SensorStore, created on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SensorStore()
+    return _store
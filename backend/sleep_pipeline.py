@@ -0,0 +1,176 @@
+"""
+Sleep Analysis Pipeline
+Turns a night of sensor readings into windowed features, classifies every
+window in one model call and summarises the result as a hypnogram
+"""
+
+import warnings
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from model_service import CLASS_MAPPING, FEATURE_DEFAULTS, FEATURE_ORDER, predict_classes
+from sensor_store import parse_timestamp, reading_values
+
+# Epoch length of the hypnogram (seconds)
+EPOCH_SECONDS = 30
+# Rolling feature window (seconds); windows overlap when longer than EPOCH_SECONDS
+WINDOW_SECONDS = 60
+# Mean gyro magnitude above which an epoch counts as a movement
+MOVEMENT_THRESHOLD = 0.5
+# Sample period assumed when keys carry no usable timestamps (seconds)
+DEFAULT_SAMPLE_PERIOD = 1.0
+
+
+def arrays_from_entries(entries):
+    """
+    Columns from API entries (payload fields plus "timestamp")
+
+    Returns:
+        tuple: (ts, values) - (n,) epoch seconds and (n, 5) bpm, gyro x/y/z, temp
+    """
+    ts = np.array([parse_timestamp(e.get("timestamp")) for e in entries], dtype=np.float64)
+    values = np.array([reading_values(e) for e in entries], dtype=np.float64).reshape(len(entries), 5)
+    return ts, values
+
+
+def _sample_period(ts):
+    """Median spacing of timestamps, falling back to DEFAULT_SAMPLE_PERIOD"""
+    steps = np.diff(ts[np.isfinite(ts)])
+    steps = steps[steps > 0]
+    return float(np.median(steps)) if len(steps) else DEFAULT_SAMPLE_PERIOD
+
+
+def window_features(ts, values, epoch_seconds=EPOCH_SECONDS, window_seconds=WINDOW_SECONDS):
+    """
+    Rolling-window features over strided views of the series (no copies per window)
+
+    Args:
+        ts (np.ndarray): (n,) epoch seconds, ascending
+        values (np.ndarray): (n, 5) bpm, gyro x/y/z, temp
+        epoch_seconds (float): Step between windows
+        window_seconds (float): Window length
+
+    Returns:
+        dict: per-window arrays - start, end, hr_mean, hr_var, gyro_mean (n, 3),
+              motion_mean, motion_var, temp_mean, temp_trend (degrees per hour)
+    """
+    period = _sample_period(ts)
+    if not np.isfinite(ts).all():
+        ts = ts[0] + np.arange(len(ts)) * period if np.isfinite(ts[0]) else np.arange(len(ts)) * period
+
+    window = max(1, int(round(window_seconds / period)))
+    step = max(1, int(round(epoch_seconds / period)))
+    if len(ts) < window:
+        window = len(ts)
+
+    # (n_windows, window) views; stepping the view keeps one window per epoch
+    def view(column):
+        return sliding_window_view(column, window)[::step]
+
+    bpm = view(values[:, 0])
+    gyro = [view(values[:, j]) for j in (1, 2, 3)]
+    temp = view(values[:, 4])
+    times = view(ts)
+
+    magnitude = np.sqrt(gyro[0] ** 2 + gyro[1] ** 2 + gyro[2] ** 2)
+
+    # Least-squares slope of temperature against time within each window
+    t_centered = times - times.mean(axis=1, keepdims=True)
+    denom = (t_centered ** 2).sum(axis=1)
+    # All-NaN windows (sensor dropouts) yield NaN features rather than warnings
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        temp_centered = temp - np.nanmean(temp, axis=1, keepdims=True)
+        slope = np.nansum(t_centered * temp_centered, axis=1) / np.where(denom > 0, denom, np.inf)
+
+        return {
+            "start": times[:, 0],
+            "end": times[:, -1],
+            "hr_mean": np.nanmean(bpm, axis=1),
+            "hr_var": np.nanvar(bpm, axis=1),
+            "gyro_mean": np.column_stack([np.nanmean(g, axis=1) for g in gyro]),
+            "motion_mean": np.nanmean(magnitude, axis=1),
+            "motion_var": np.nanvar(magnitude, axis=1),
+            "temp_mean": np.nanmean(temp, axis=1),
+            "temp_trend": slope * 3600.0,
+        }
+
+
+def _model_inputs(features):
+    """Window means mapped onto the model's instantaneous-reading inputs"""
+    X = np.column_stack([
+        features["hr_mean"],
+        features["gyro_mean"],
+        features["temp_mean"],
+    ])
+    defaults = np.array([FEATURE_DEFAULTS[name] for name in FEATURE_ORDER])
+    missing = ~np.isfinite(X)
+    X[missing] = np.broadcast_to(defaults, X.shape)[missing]
+    return X
+
+
+def _round(array, digits=3):
+    return [None if not np.isfinite(v) else round(float(v), digits) for v in array]
+
+
+def analyze_night(ts, values, epoch_seconds=EPOCH_SECONDS, window_seconds=WINDOW_SECONDS):
+    """
+    Classify a night of readings epoch by epoch
+
+    Args:
+        ts (np.ndarray): (n,) epoch seconds
+        values (np.ndarray): (n, 5) bpm, gyro x/y/z, temp
+
+    Returns:
+        dict: { "success", "epochs": hypnogram timeline, "summary": night statistics }
+    """
+    ts = np.asarray(ts, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if len(ts) == 0:
+        return {"success": False, "message": "No sensor data available for analysis"}
+
+    order = np.argsort(ts, kind="stable")
+    ts, values = ts[order], values[order]
+
+    features = window_features(ts, values, epoch_seconds, window_seconds)
+    classes = np.asarray(predict_classes(_model_inputs(features))).astype(int)
+
+    hr_mean, hr_var = _round(features["hr_mean"], 2), _round(features["hr_var"], 2)
+    motion_mean, motion_var = _round(features["motion_mean"]), _round(features["motion_var"])
+    temp_trend = _round(features["temp_trend"])
+    epochs = [
+        {
+            "start": float(features["start"][i]),
+            "end": float(features["end"][i]),
+            "state": int(classes[i]),
+            "condition": CLASS_MAPPING.get(int(classes[i]), "Unknown Condition"),
+            "hr_mean": hr_mean[i],
+            "hr_var": hr_var[i],
+            "motion_mean": motion_mean[i],
+            "motion_var": motion_var[i],
+            "temp_trend": temp_trend[i],
+        }
+        for i in range(len(classes))
+    ]
+
+    counts = np.bincount(classes, minlength=len(CLASS_MAPPING))
+    minutes = counts * epoch_seconds / 60.0
+    awake = counts[4] if len(counts) > 4 else 0
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        summary = {
+            "samples": int(len(ts)),
+            "epochs": int(len(classes)),
+            "epoch_seconds": epoch_seconds,
+            "start": float(ts[0]) if np.isfinite(ts[0]) else None,
+            "end": float(ts[-1]) if np.isfinite(ts[-1]) else None,
+            "minutes_by_condition": {CLASS_MAPPING[c]: round(float(minutes[c]), 1) for c in CLASS_MAPPING},
+            "dominant_condition": CLASS_MAPPING.get(int(np.argmax(counts)), "Unknown Condition"),
+            "sleep_efficiency": round(float(1 - awake / len(classes)), 3) if len(classes) else None,
+            "mean_bpm": _round([np.nanmean(values[:, 0])], 2)[0],
+            "movement_epochs": int(np.count_nonzero(np.nan_to_num(features["motion_mean"]) > MOVEMENT_THRESHOLD)),
+            "temp_trend_per_hour": _round([np.nanmean(features["temp_trend"])])[0],
+        }
+
+    return {"success": True, "epochs": epochs, "summary": summary}
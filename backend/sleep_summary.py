@@ -0,0 +1,280 @@
+"""
+Sleep Summary Module
+Per-user, per-night running statistics updated as each reading is ingested,
+so nightly summaries are served without re-reading history
+"""
+
+import atexit
+import json
+import math
+import os
+import threading
+from datetime import datetime
+
+from model_service import CLASS_MAPPING
+from sleep_pipeline import MOVEMENT_THRESHOLD
+
+SUMMARY_PATH = os.environ.get(
+    "SLEEP_SUMMARY_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'sleep_summaries.json')
+)
+# Seconds between checkpoints to disk
+CHECKPOINT_INTERVAL = float(os.environ.get("SLEEP_SUMMARY_CHECKPOINT_INTERVAL", 60.0))
+# Most recent nights kept per user; older ones are dropped from memory and the checkpoint
+MAX_NIGHTS = int(os.environ.get("SLEEP_SUMMARY_MAX_NIGHTS", 90))
+# User id for readings from the single sensorData device
+DEFAULT_USER = os.environ.get("SENSOR_USER_ID", "default")
+# Nights run noon to noon (local time), so one night never spans two keys
+NIGHT_BOUNDARY_HOUR = 12
+# Gaps longer than this (seconds) are not attributed to any state
+MAX_GAP = 300.0
+
+
+def night_key(ts):
+    """Night a timestamp belongs to, named by the date the evening started"""
+    return datetime.fromtimestamp(ts - NIGHT_BOUNDARY_HOUR * 3600).strftime("%Y-%m-%d")
+
+
+class RunningStat:
+    """Welford online mean/variance"""
+
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self, n=0, mean=0.0, m2=0.0):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self):
+        return self.m2 / self.n if self.n else None
+
+    def to_dict(self):
+        return {"n": self.n, "mean": self.mean, "m2": self.m2}
+
+
+class NightAggregate:
+    """Running counters for one user's night"""
+
+    def __init__(self):
+        self.readings = 0
+        self.first_ts = None
+        self.last_ts = None
+        self.last_state = None
+        self.state_counts = [0] * len(CLASS_MAPPING)
+        self.state_seconds = [0.0] * len(CLASS_MAPPING)
+        self.movements = 0
+        self.bpm = RunningStat()
+        self.temp = RunningStat()
+
+    def add(self, ts, features, state):
+        """
+        Fold one reading into the aggregate in O(1)
+
+        Args:
+            ts (float): Epoch seconds of the reading
+            features (dict): Model inputs (bvp, acc_x/y/z, temp)
+            state (int): Predicted class, or None if prediction failed
+        """
+        # Time since the previous reading is credited to the state it was in
+        if self.last_ts is not None and self.last_state is not None:
+            gap = ts - self.last_ts
+            if 0 < gap <= MAX_GAP:
+                self.state_seconds[self.last_state] += gap
+
+        self.readings += 1
+        self.first_ts = ts if self.first_ts is None else min(self.first_ts, ts)
+        self.last_ts = ts if self.last_ts is None else max(self.last_ts, ts)
+        valid_state = isinstance(state, int) and 0 <= state < len(self.state_counts)
+        self.last_state = state if valid_state else None
+        if valid_state:
+            self.state_counts[state] += 1
+
+        bpm = features.get("bvp")
+        if bpm is not None and math.isfinite(bpm) and bpm > 0:
+            self.bpm.add(bpm)
+        temp = features.get("temp")
+        if temp is not None and math.isfinite(temp):
+            self.temp.add(temp)
+
+        magnitude = math.sqrt(sum(features.get(k, 0.0) ** 2 for k in ("acc_x", "acc_y", "acc_z")))
+        if magnitude > MOVEMENT_THRESHOLD:
+            self.movements += 1
+
+    def summary(self):
+        classified = sum(self.state_counts)
+        dominant = max(range(len(self.state_counts)), key=self.state_counts.__getitem__) if classified else None
+        return {
+            "readings": self.readings,
+            "start": self.first_ts,
+            "end": self.last_ts,
+            "minutes_by_condition": {CLASS_MAPPING[c]: round(self.state_seconds[c] / 60.0, 1) for c in CLASS_MAPPING},
+            "readings_by_condition": {CLASS_MAPPING[c]: self.state_counts[c] for c in CLASS_MAPPING},
+            "dominant_condition": CLASS_MAPPING[dominant] if dominant is not None else None,
+            "mean_bpm": round(self.bpm.mean, 2) if self.bpm.n else None,
+            "bpm_variance": round(self.bpm.variance, 2) if self.bpm.n else None,
+            "mean_temp": round(self.temp.mean, 2) if self.temp.n else None,
+            "movements": self.movements
+        }
+
+    def to_dict(self):
+        return {
+            "readings": self.readings,
+            "first_ts": self.first_ts,
+            "last_ts": self.last_ts,
+            "last_state": self.last_state,
+            "state_counts": self.state_counts,
+            "state_seconds": self.state_seconds,
+            "movements": self.movements,
+            "bpm": self.bpm.to_dict(),
+            "temp": self.temp.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        aggregate = cls()
+        aggregate.readings = data["readings"]
+        aggregate.first_ts = data["first_ts"]
+        aggregate.last_ts = data["last_ts"]
+        aggregate.last_state = data["last_state"]
+        aggregate.state_counts = list(data["state_counts"])
+        aggregate.state_seconds = list(data["state_seconds"])
+        aggregate.movements = data["movements"]
+        aggregate.bpm = RunningStat(**data["bpm"])
+        aggregate.temp = RunningStat(**data["temp"])
+        return aggregate
+
+
+class SleepSummaryEngine:
+    """
+    Night aggregates keyed by (user, night), at most max_nights per user,
+    checkpointed to disk by a background thread every checkpoint_interval
+    """
+
+    def __init__(self, path=SUMMARY_PATH, checkpoint_interval=CHECKPOINT_INTERVAL, max_nights=MAX_NIGHTS):
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        self.max_nights = max(1, max_nights)
+        self._nights = {}
+        self._latest_night = {}
+        self._lock = threading.Lock()
+        # Held for a whole checkpoint so concurrent writers never share the
+        # temp file and a newer snapshot is never replaced by an older one
+        self._checkpoint_lock = threading.Lock()
+        self._dirty = False
+        self._stop = threading.Event()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self.load()
+
+    def record(self, user, ts, features, state):
+        """Update the user's night with one predicted reading (never writes to disk itself)"""
+        night = night_key(ts)
+        with self._lock:
+            aggregate = self._nights.get((user, night))
+            if aggregate is None:
+                aggregate = self._nights[(user, night)] = NightAggregate()
+                self._prune(user)
+            aggregate.add(ts, features, state)
+            if night >= self._latest_night.get(user, ""):
+                self._latest_night[user] = night
+            self._dirty = True
+
+        if self._writer is None:
+            self._start_writer()
+
+    def _prune(self, user):
+        """Drop the user's oldest nights beyond max_nights (call with _lock held)"""
+        nights = sorted(night for (u, night) in self._nights if u == user)
+        for night in nights[:max(0, len(nights) - self.max_nights)]:
+            del self._nights[(user, night)]
+
+    def _start_writer(self):
+        with self._writer_lock:
+            if self._writer is not None:
+                return
+            self._writer = threading.Thread(target=self._run_writer, name="sleep-summary-checkpoint", daemon=True)
+            self._writer.start()
+
+    def _run_writer(self):
+        while not self._stop.wait(max(self.checkpoint_interval, 0.1)):
+            self.checkpoint()
+
+    def close(self):
+        """Stop the checkpoint thread and write a final checkpoint"""
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join()
+        self.checkpoint()
+
+    def summary(self, user=DEFAULT_USER, night=None):
+        """
+        Summary for one night (the user's most recent night by default)
+
+        Returns:
+            dict: Summary fields, or None if nothing was recorded
+        """
+        with self._lock:
+            night = night or self._latest_night.get(user)
+            aggregate = self._nights.get((user, night))
+            if aggregate is None:
+                return None
+            result = aggregate.summary()
+        result.update({"user": user, "night": night})
+        return result
+
+    def nights(self, user=DEFAULT_USER):
+        with self._lock:
+            return sorted(night for (u, night) in self._nights if u == user)
+
+    def checkpoint(self):
+        """Atomically write all aggregates to disk if anything changed"""
+        with self._checkpoint_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                state = [
+                    {"user": user, "night": night, "aggregate": aggregate.to_dict()}
+                    for (user, night), aggregate in self._nights.items()
+                ]
+                self._dirty = False
+
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(state, f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"[SleepSummary] Checkpoint failed: {e}")
+                with self._lock:
+                    self._dirty = True
+
+    def load(self):
+        """Restore aggregates from the last checkpoint, if any"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+            for item in state:
+                user, night = item["user"], item["night"]
+                self._nights[(user, night)] = NightAggregate.from_dict(item["aggregate"])
+                if night >= self._latest_night.get(user, ""):
+                    self._latest_night[user] = night
+            # The cap may have been lowered since this checkpoint was written
+            for user in self._latest_night:
+                self._prune(user)
+            print(f"[SleepSummary] Restored {len(state)} night summaries from {self.path}")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[SleepSummary] Could not restore checkpoint: {e}")
+
+
+summary_engine = SleepSummaryEngine()
+atexit.register(summary_engine.close)
@@ -0,0 +1,44 @@
+"""
+Test setup: backend modules and the benchmark helpers (synthetic models,
+Firebase stub) are imported flat, the way app.py imports its modules
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.join(BACKEND_DIR, "benchmarks"), BACKEND_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# Keep test runs away from the real data directory and background threads
+_scratch = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ.setdefault("SENSOR_STORE_PATH", os.path.join(_scratch, "sensor_history.db"))
+os.environ.setdefault("SLEEP_SUMMARY_PATH", os.path.join(_scratch, "summaries.json"))
+os.environ.setdefault("SENSOR_STORE", "0")
+os.environ.setdefault("SENSOR_INGEST", "0")
+
+
+@pytest.fixture(scope="session")
+def model_service():
+    """model_service serving the bundled model, or a synthetic forest of the same shape"""
+    import model_service
+    from common import ensure_model
+
+    if model_service.registry.get() is None:
+        ensure_model()
+    return model_service
+
+
+@pytest.fixture
+def firebase_stub(monkeypatch):
+    """A local Firebase stub the Firebase calls are pointed at"""
+    import firebase_config
+    from firebase_stub import FirebaseStub
+
+    with FirebaseStub() as stub:
+        monkeypatch.setattr(firebase_config, "DATABASE_URL", stub.url)
+        yield stub
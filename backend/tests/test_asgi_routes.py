@@ -0,0 +1,66 @@
+"""ASGI app: native async routes answer like the Flask routes they shadow; lifespan cleanup"""
+
+import json
+
+from firebase_stub import sensor_payload, synthetic_history
+
+START = 1767225600
+
+
+def test_downsampled_range_matches_flask(model_service, firebase_stub):
+    from starlette.testclient import TestClient
+
+    import asgi_app
+
+    firebase_stub.set("sensor_data", synthetic_history(600, start_ts=START))
+    flask_client = asgi_app.flask_app.test_client()
+    queries = {
+        "buckets": f"start={START}&end={START + 599}&max_points=40",
+        "ndjson": f"start={START}&end={START + 599}&max_points=40&format=ndjson",
+        "raw": f"start={START}&end={START + 99}&max_points=1000",
+    }
+    # One client for every query: leaving it runs the lifespan shutdown, which stops the inference pool
+    with TestClient(asgi_app.app) as asgi_client:
+        for name, query in queries.items():
+            expected = flask_client.get(f"/api/sensor/range?{query}")
+            actual = asgi_client.get(f"/api/sensor/range?{query}")
+
+            assert actual.status_code == expected.status_code == 200, (name, actual.text)
+            assert actual.headers["content-type"].split(";")[0] == expected.mimetype
+            if name == "ndjson":
+                assert actual.text == expected.get_data(as_text=True)
+                assert len(actual.text.splitlines()) <= 40
+            else:
+                body = actual.json()
+                assert body == json.loads(expected.get_data())
+                assert body["resolution"] == "raw" if name == "raw" else body["count"] <= 40
+
+        # Keys that are not timestamps cannot be bucketed; both serve every stride-th reading
+        firebase_stub.set("sensor_data", {f"-Nreading{i:03d}": sensor_payload(60 + i % 10) for i in range(50)})
+        expected = json.loads(flask_client.get("/api/sensor/range?max_points=10").get_data())
+        actual = asgi_client.get("/api/sensor/range?max_points=10").json()
+        assert actual == expected
+        assert actual["stride"] == 5 and actual["count"] == 10
+
+
+def test_shutdown_stops_ingest_workers(model_service, firebase_stub, monkeypatch):
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    import asgi_app
+    from sensor_ingest import DeviceIngestWorker, SensorIngestWorker
+
+    firebase_stub.set("sensorData", sensor_payload())
+    monkeypatch.setattr(asgi_app, "INGEST_ENABLED", True)
+    monkeypatch.setattr(asgi_app, "ingest_worker", SensorIngestWorker(poll_interval=60))
+    monkeypatch.setattr(asgi_app, "device_worker", DeviceIngestWorker(poll_interval=60))
+    # Shutdown also stops the inference pool; give it one of its own
+    monkeypatch.setattr(asgi_app, "_executor", ThreadPoolExecutor(1))
+
+    async def serve():
+        async with asgi_app.lifespan(asgi_app.app):
+            assert asgi_app.ingest_worker.running and asgi_app.device_worker.running
+
+    asyncio.run(serve())
+    assert not asgi_app.ingest_worker.running
+    assert not asgi_app.device_worker.running
@@ -0,0 +1,72 @@
+"""CompiledForest must reproduce the scikit-learn forest it was built from exactly"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from common import FEATURES, build_synthetic_model, synthetic_readings
+from compiled_forest import CompiledForest
+
+
+@pytest.fixture(scope="module")
+def forest():
+    return build_synthetic_model(n_estimators=25, max_depth=12, seed=1)
+
+
+@pytest.fixture(scope="module")
+def compiled(forest):
+    return CompiledForest.from_sklearn(forest)
+
+
+def assert_equivalent(forest, compiled, X):
+    frame = pd.DataFrame(X, columns=FEATURES)
+    np.testing.assert_array_equal(compiled.predict_proba(X), forest.predict_proba(frame))
+    np.testing.assert_array_equal(compiled.predict(X), forest.predict(frame))
+
+
+def threshold_rows(compiled, values):
+    """One row per internal node, with that node's feature set to values[node]"""
+    internal = np.flatnonzero(np.isfinite(compiled.threshold))
+    X = np.repeat(synthetic_readings(1, seed=7), len(internal), axis=0)
+    X[np.arange(len(internal)), compiled.feature[internal]] = values[internal]
+    return X
+
+
+def test_random_readings(forest, compiled):
+    assert_equivalent(forest, compiled, synthetic_readings(3000, seed=11))
+
+
+def test_exactly_on_thresholds(forest, compiled):
+    assert_equivalent(forest, compiled, threshold_rows(compiled, compiled.threshold))
+
+
+@pytest.mark.parametrize("direction", [np.inf, -np.inf])
+def test_float32_rounding_edge(forest, compiled, direction):
+    # sklearn compares float32(x) against float64 thresholds: the float64
+    # neighbours of a threshold round back onto it, the float32 ones do not
+    threshold = compiled.threshold
+    float64_next = np.nextafter(threshold, direction)
+    float32_next = np.nextafter(threshold.astype(np.float32), np.float32(direction)).astype(np.float64)
+    assert_equivalent(forest, compiled, threshold_rows(compiled, float64_next))
+    assert_equivalent(forest, compiled, threshold_rows(compiled, float32_next))
+
+
+def test_nan_rows(forest, compiled):
+    X = synthetic_readings(500, seed=13)
+    X[::2, 0] = np.nan
+    X[::3, 2] = np.nan
+    X[::7] = np.nan
+    assert_equivalent(forest, compiled, X)
+
+
+def test_nan_rows_with_learned_missing_direction():
+    from sklearn.ensemble import RandomForestClassifier
+
+    X = synthetic_readings(3000, seed=5)
+    X[np.random.default_rng(5).random(X.shape) < 0.1] = np.nan
+    y = np.random.default_rng(6).integers(0, 5, len(X))
+    forest = RandomForestClassifier(n_estimators=15, max_depth=10, random_state=0)
+    forest.fit(pd.DataFrame(X, columns=FEATURES), y)
+    probe = synthetic_readings(1000, seed=8)
+    probe[np.random.default_rng(9).random(probe.shape) < 0.2] = np.nan
+    assert_equivalent(forest, CompiledForest.from_sklearn(forest), probe)
@@ -0,0 +1,87 @@
+"""ModelRegistry routing, counters, cache invalidation and loading"""
+
+import time
+
+import numpy as np
+
+from common import synthetic_readings
+
+
+def counters(version):
+    return version.requests.value, version.rows.value, {k: c.value for k, c in version.classes.items()}
+
+
+def test_internal_scoring_is_not_counted(model_service):
+    version = model_service.registry.get()
+    before = counters(version)
+
+    labels = model_service.predict_classes(synthetic_readings(32, seed=5))
+
+    assert len(labels) == 32
+    assert counters(version) == before
+    assert version.in_flight == 0
+
+
+def test_api_predictions_are_counted(model_service):
+    version = model_service.registry.get()
+    requests, rows, _ = counters(version)
+
+    readings = [dict(zip(model_service.FEATURE_ORDER, row)) for row in synthetic_readings(8, seed=6).tolist()]
+    model_service.predict_batch(readings)
+
+    assert version.requests.value == requests + 1
+    assert version.rows.value == rows + 8
+    assert version.in_flight == 0
+
+
+def test_route_failure_returns_error(model_service, monkeypatch):
+    def failing_route():
+        raise RuntimeError("no version")
+
+    monkeypatch.setattr(model_service.registry, "route", failing_route)
+    result = model_service.predict_disease(dict(zip(model_service.FEATURE_ORDER, np.zeros(5).tolist())))
+
+    assert "error" in result
+
+
+def test_replaced_version_cache_entries_are_purged(model_service, monkeypatch):
+    registry, cache = model_service.registry, model_service.prediction_cache
+    monkeypatch.setattr(cache, "max_size", 1024)
+    reading = dict(zip(model_service.FEATURE_ORDER, synthetic_readings(1, seed=7)[0].tolist()))
+
+    assert registry.load("canary", registry.get().source)
+    registry.set_split("canary", 100)
+    try:
+        canary = registry.get("canary")
+        model_service.predict_disease(reading)
+        assert any(key[0] == canary.id for key in cache._entries)
+        invalidations = cache.invalidations
+
+        assert registry.load("canary", registry.get().source)
+        assert not any(key[0] == canary.id for key in cache._entries)
+        assert cache.invalidations == invalidations + 1
+    finally:
+        registry.set_split("canary", 0)
+        registry.unload("canary")
+
+
+def test_request_waits_for_background_preload(model_service, monkeypatch):
+    registry = model_service.ModelRegistry()
+    source = model_service.registry.get().source
+    load = registry.load
+
+    def slow_load(slot, source):
+        # The request below gets in before the preload thread reaches the load lock
+        time.sleep(0.2)
+        return load(slot, source)
+
+    monkeypatch.setattr(registry, "load", slow_load)
+    # install() publishes the primary as the module-level model; keep the session's
+    monkeypatch.setattr(model_service, "model", model_service.model)
+    thread = registry.load_async(model_service.PRIMARY_SLOT, source)
+    assert registry.status["state"] == "loading"
+
+    assert registry.ensure_loaded() is True
+    thread.join()
+    assert registry.loads.value == 1
+    registry.get().retire()
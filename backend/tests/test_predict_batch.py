@@ -0,0 +1,32 @@
+"""/predict/batch input validation"""
+
+import pytest
+
+
+@pytest.fixture
+def client(model_service):
+    import app as app_module
+
+    return app_module.app.test_client()
+
+
+@pytest.mark.parametrize("body, message", [
+    ([1, 2], "Reading 0 must be an object"),
+    ([{"bvp": 70}, "x"], "Reading 1 must be an object"),
+    ([{"bvp": "fast"}], "Reading 0: 'bvp' must be a number"),
+    ({"bvp": [70, 80], "acc_x": 0.3}, "Column 'acc_x' must be an array"),
+    ({"bvp": [70, 80], "acc_x": [0.3]}, "equal-length"),
+    ({"bvp": [70, "x"]}, "Column 'bvp' must contain only numbers"),
+    ({"device": ["bed-001"]}, "needs at least one of"),
+    ({"readings": 5}, "JSON array of objects"),
+])
+def test_malformed_batches_are_rejected(client, body, message):
+    response = client.post("/predict/batch", json=body)
+    assert response.status_code == 400
+    assert message in response.get_json()["error"]
+
+
+def test_columnar_batch_ignores_other_keys(client):
+    response = client.post("/predict/batch", json={"bvp": [70, 80], "temp": [36.5, 36.9], "device": ["bed-001"]})
+    assert response.status_code == 200
+    assert response.get_json()["count"] == 2
@@ -0,0 +1,57 @@
+"""Shared prediction and diet responses must stay intact under concurrent use"""
+
+import json
+import threading
+
+import pytest
+
+from common import synthetic_readings
+
+
+@pytest.fixture(scope="module")
+def readings(model_service):
+    return [dict(zip(model_service.FEATURE_ORDER, row)) for row in synthetic_readings(64, seed=4).tolist()]
+
+
+def test_shared_responses_are_read_only(model_service, readings):
+    from diet_matrix import DIET_MATRIX
+
+    result = model_service.predict_disease(readings[0])
+    with pytest.raises(TypeError):
+        result["device"] = "bed-001"
+    with pytest.raises(TypeError):
+        result.update(source="cache")
+    with pytest.raises(AttributeError):
+        result["recommendations"].append("Sleep more")
+    with pytest.raises(TypeError):
+        DIET_MATRIX["Vata"][0] = {}
+
+
+def test_concurrent_predictions_match_single_threaded(model_service, readings, monkeypatch):
+    monkeypatch.setattr(model_service.prediction_cache, "max_size", 0)
+    expected = [model_service.prediction_json(model_service.predict_disease(r)) for r in readings]
+    threads, rounds = 16, 100
+    barrier = threading.Barrier(threads)
+    mismatches = []
+
+    def worker(offset):
+        barrier.wait()
+        for i in range(rounds):
+            j = (i + offset) % len(readings)
+            result = model_service.predict_disease(readings[j])
+            # Handlers extend a copy, never the shared response
+            payload = dict(result, device=f"bed-{offset:03d}")
+            if model_service.prediction_json(result) != expected[j] or payload["device"] != f"bed-{offset:03d}":
+                mismatches.append(j)
+
+    workers = [threading.Thread(target=worker, args=(k,)) for k in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    assert mismatches == []
+    # Every shared response still encodes to its pre-serialized bytes
+    for result in model_service.PREDICTION_RESPONSES.values():
+        assert "device" not in result
+        assert json.dumps(result, separators=(",", ":")).encode() == result.json_bytes
@@ -0,0 +1,46 @@
+"""Rollup coarsening and the store's downsampled ranges"""
+
+import numpy as np
+
+from firebase_stub import sensor_payload
+
+
+def hourly(hours):
+    from sensor_rollups import summarize
+
+    ts = np.array([h * 3600 + 60 for h in hours], dtype=np.float64)
+    values = np.tile([62.0, 0.0, 0.0, 0.0, 36.5], (len(ts), 1))
+    return summarize(ts, values, np.zeros(len(ts), dtype=np.int64), 3600)
+
+
+def test_coarsen_merges_on_aligned_boundaries_across_gaps():
+    from sensor_rollups import coarsen
+
+    buckets = hourly(list(range(10)) + list(range(1000, 1010)))
+    merged, size = coarsen(buckets, 4, 3600)
+    width = 3600 * size
+
+    assert len(merged) <= 4
+    assert sum(bucket.count for bucket in merged) == len(buckets)
+    for bucket in merged:
+        assert bucket.start % width == 0
+    for bucket in buckets:
+        assert any(m.start <= bucket.start < m.start + width for m in merged)
+
+
+def test_coarsen_keeps_buckets_that_fit():
+    from sensor_rollups import coarsen
+
+    buckets = hourly(range(3))
+    assert coarsen(buckets, 3, 3600) == (buckets, 1)
+
+
+def test_untimed_keys_fall_back_to_strided_raw_readings(tmp_path):
+    from sensor_store import SensorStore
+
+    store = SensorStore(str(tmp_path / "store.db"))
+    store.ensure_rollups()
+    store.insert({f"-Nreading{i:03d}": sensor_payload(60 + i % 10) for i in range(50)})
+
+    assert store.downsampled_range(max_points=10) == (None, 5, None)
+    assert store.downsampled_range(max_points=50) == (None, 1, None)
@@ -0,0 +1,53 @@
+"""SensorIngestWorker against a local Firebase stub"""
+
+import json
+
+import pytest
+
+from firebase_stub import sensor_payload
+
+
+@pytest.fixture
+def worker(model_service, firebase_stub):
+    from sensor_ingest import SensorIngestWorker
+
+    firebase_stub.set("sensorData", sensor_payload(72, 0.1, -0.2, 0.05, 36.6))
+    return SensorIngestWorker(poll_interval=60, capacity=8)
+
+
+def test_poll_fills_ring_buffer(worker, firebase_stub):
+    assert worker.poll_once() is True
+    assert len(worker.buffer) == 1
+
+    _, payload, prediction = worker.buffer.latest()
+    assert payload == firebase_stub.node("sensorData")
+    assert "raw_prediction" in prediction and "error" not in prediction
+    assert worker.latest_response()["data"] == payload
+
+
+def test_unchanged_payload_is_deduplicated(worker, firebase_stub):
+    assert worker.poll_once() is True
+    assert worker.poll_once() is False
+    assert len(worker.buffer) == 1
+    assert worker.polls == 2
+
+    firebase_stub.set("sensorData", sensor_payload(95, 0.8, 0.4, -0.3, 37.1))
+    assert worker.poll_once() is True
+    assert len(worker.buffer) == 2
+
+
+def test_latest_route_served_from_memory(worker, firebase_stub, monkeypatch):
+    import app as app_module
+
+    worker.poll_once()
+    monkeypatch.setattr(app_module, "INGEST_ENABLED", True)
+    monkeypatch.setattr(app_module, "ingest_worker", worker)
+    # No polling thread: anything not in the buffer would have to come from Firebase
+    monkeypatch.setattr(worker, "start", lambda: None)
+
+    requests_before = firebase_stub.requests
+    response = app_module.app.test_client().get("/api/sensor/latest")
+
+    assert response.status_code == 200
+    assert response.get_json() == json.loads(json.dumps(worker.latest_response()))
+    assert firebase_stub.requests == requests_before
@@ -0,0 +1,41 @@
+"""SleepSummaryEngine retention and background checkpoints"""
+
+import os
+import time
+
+from sleep_summary import SleepSummaryEngine
+
+NIGHT = 86400
+FEATURES = {"bvp": 62.0, "acc_x": 0.0, "acc_y": 0.0, "acc_z": 0.0, "temp": 36.5}
+# 23:00 local time on the first night
+START = time.mktime((2026, 1, 1, 23, 0, 0, 0, 0, -1))
+
+
+def test_only_the_latest_nights_are_kept(tmp_path):
+    path = str(tmp_path / "summaries.json")
+    engine = SleepSummaryEngine(path, checkpoint_interval=3600, max_nights=3)
+    for i in range(5):
+        engine.record("bed-001", START + i * NIGHT, FEATURES, 0)
+    engine.record("bed-002", START, FEATURES, 0)
+
+    kept = engine.nights("bed-001")
+    assert len(kept) == 3 and engine.summary("bed-001")["night"] == kept[-1]
+    assert len(engine.nights("bed-002")) == 1
+    engine.close()
+
+    restored = SleepSummaryEngine(path, checkpoint_interval=3600, max_nights=2)
+    assert restored.nights("bed-001") == kept[1:]
+
+
+def test_record_leaves_checkpoints_to_the_writer_thread(tmp_path):
+    path = str(tmp_path / "summaries.json")
+    engine = SleepSummaryEngine(path, checkpoint_interval=0.1)
+    engine.record("bed-001", START, FEATURES, 0)
+    assert not os.path.exists(path)
+
+    deadline = time.time() + 5
+    while not os.path.exists(path) and time.time() < deadline:
+        time.sleep(0.02)
+    assert os.path.exists(path)
+    engine.close()
+    assert not engine._writer.is_alive()
@@ -0,0 +1,87 @@
+"""UpstreamGate hands every caller its own copy, fresh or stale"""
+
+import asyncio
+
+import pytest
+
+from firebase_service import FirebaseCall, UpstreamGate
+from firebase_stub import sensor_payload
+
+CALL = FirebaseCall("http://firebase.test/sensor_data.json", {"limitToLast": 10}, "history", None, "failed")
+
+
+def history():
+    return {"success": True, "data": {"1767225600": {"bpm": 61.0}, "1767225601": {"bpm": 62.0}}}
+
+
+def mutate(result):
+    result["device"] = "bed-001"
+    result["data"].pop("1767225600")
+
+
+@pytest.mark.parametrize("coalesce", [False, True])
+def test_callers_never_share_the_remembered_result(coalesce):
+    gate = UpstreamGate(max_in_flight=1, stale_ttl=60, stale_entries=8, coalesce=coalesce)
+    mutate(gate.run(CALL, history))
+
+    # Over budget: the stale answer is built from the remembered result
+    gate.max_in_flight = 0
+    first = gate.run(CALL, history)
+    assert first["stale"] is True
+    assert first["data"] == history()["data"] and "device" not in first
+    mutate(first)
+
+    second = gate.run(CALL, history)
+    assert second["data"] == history()["data"] and "device" not in second
+
+
+@pytest.mark.parametrize("coalesce", [False, True])
+def test_async_callers_never_share_the_remembered_result(coalesce):
+    gate = UpstreamGate(max_in_flight=1, stale_ttl=60, stale_entries=8, coalesce=coalesce)
+
+    async def send():
+        return history()
+
+    async def scenario():
+        mutate(await gate.run_async(CALL, send))
+        gate.max_in_flight = 0
+        mutate(await gate.run_async(CALL, send))
+        return await gate.run_async(CALL, send)
+
+    stale = asyncio.run(scenario())
+    assert stale["stale"] is True
+    assert stale["data"] == history()["data"] and "device" not in stale
+
+
+def test_stale_poll_does_not_refresh_ingest(model_service, firebase_stub, monkeypatch):
+    import firebase_service
+    from sensor_ingest import SensorIngestWorker
+
+    monkeypatch.setattr(firebase_service, "upstream_gate", UpstreamGate(max_in_flight=1, stale_ttl=60))
+    firebase_stub.set("sensorData", sensor_payload(72, 0.1, -0.2, 0.05, 36.6))
+    worker = SensorIngestWorker(poll_interval=60, capacity=8)
+    assert worker.poll_once() is True
+    last_success = worker.last_success
+
+    firebase_service.upstream_gate.max_in_flight = 0
+    assert worker.poll_once() is False
+    assert worker.last_success == last_success
+    assert len(worker.buffer) == 1
+
+
+def test_stale_page_does_not_complete_store_sync(firebase_stub, monkeypatch, tmp_path):
+    import firebase_service
+    from firebase_stub import synthetic_history
+    from sensor_store import SensorStore
+
+    monkeypatch.setattr(firebase_service, "upstream_gate", UpstreamGate(max_in_flight=1, stale_ttl=60))
+    firebase_stub.set("sensor_data", synthetic_history(50))
+    assert SensorStore(str(tmp_path / "first.db")).sync()["success"] is True
+
+    # An empty store asks for the same first page, which the gate can only answer from memory
+    firebase_service.upstream_gate.max_in_flight = 0
+    store = SensorStore(str(tmp_path / "second.db"))
+    result = store.sync()
+    assert result["success"] is False and result["stale"] is True
+    assert store.last_sync is None
+    assert store.last_sync_error